@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import psycopg2
+
+from interpolatetion import DB_CONFIG, print_header
+
+# Параметры нагрузки по умолчанию: диапазон совпадает с таблицей поправок
+# calc_temperature_correction, поэтому одна и та же сетка доступна всем способам расчета
+DEFAULT_BENCHMARK = {
+    "min_temperature": 0,
+    "max_temperature": 40,
+    "steps": [1.0, 0.1, 0.01],
+    "height_counts": [1, 3, 9],
+    "repeat": 3,
+    "threshold": 0.10,
+    "timing_mode": "batch"
+}
+
+# Способы расчета:
+# - procedure - процедура calculate_interpolations_for_heights: цикл по высотам и температурам, который
+#   calculate_all_interpolations выполняет между подготовкой таблиц и записью метрик
+#   (замеряется именно он, без подготовки таблиц)
+# - function - прямые вызовы fn_calc_temperature_interpolation одним запросом
+# - c - программа main.c (myapp), интерполяция на стороне клиента
+PATHS = ["procedure", "function", "c"]
+
+# Вычисление, которое выполняет каждый способ расчета: имя нагрузки, описание и зависимость от высоты.
+# Процедура считает температурные отклонения по высотам, функция и программа на C - поправку
+# температуры, которая от высоты не зависит, поэтому для них число высот не перебирается.
+# Способы с разными нагрузками выводятся раздельно и не сравниваются между собой
+WORKLOADS = {
+    "procedure": ("deviation", "температурные отклонения calculate_temperature_deviation, высоты × температуры",
+                  True),
+    "function": ("correction", "поправка температуры fn_calc_temperature_interpolation, только температуры",
+                 False),
+    "c": ("correction", "поправка температуры по calc_temperature_correction на клиенте, только температуры",
+          False)
+}
+
+# Таблица поправок, по которой считает программа на C: та же, что использует fn_calc_temperature_interpolation
+C_CORRECTION_TABLE = "snaart.calc_temperature_correction"
+
+# Допустимое расхождение сумм поправок функции и программы на C в расчете на точку:
+# функция округляет температуру и результат до сотых, программа считает в double
+SUM_TOLERANCE_PER_POINT = 0.01
+
+# Исходный код программы на C
+C_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.c")
+
+# Итоговая строка вывода программы на C
+C_RESULT_RE = re.compile(
+    r"BENCH count=(?P<count>\d+) sum=(?P<sum>\S+) seconds=(?P<seconds>\S+) "
+    r"p50_ns=(?P<p50_ns>\S+) p99_ns=(?P<p99_ns>\S+)"
+)
+
+
+def parse_arguments():
+    """Обработка аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Сравнительный тест производительности способов расчета интерполяции')
+
+    # Параметры базы данных
+    db_group = parser.add_argument_group('Параметры базы данных')
+    db_group.add_argument('--dbname', help='Имя базы данных')
+    db_group.add_argument('--user', help='Имя пользователя')
+    db_group.add_argument('--password', help='Пароль')
+    db_group.add_argument('--host', help='Хост', default='localhost')
+    db_group.add_argument('--port', help='Порт', default='5432')
+
+    # Параметры нагрузки
+    load_group = parser.add_argument_group('Параметры нагрузки')
+    load_group.add_argument('--min-temp', type=float, default=DEFAULT_BENCHMARK["min_temperature"],
+                            help=f'Минимальная температура (по умолчанию: {DEFAULT_BENCHMARK["min_temperature"]})')
+    load_group.add_argument('--max-temp', type=float, default=DEFAULT_BENCHMARK["max_temperature"],
+                            help=f'Максимальная температура (по умолчанию: {DEFAULT_BENCHMARK["max_temperature"]})')
+    load_group.add_argument('--steps', type=float, nargs='+', default=DEFAULT_BENCHMARK["steps"],
+                            help=f'Шаги температуры (по умолчанию: {DEFAULT_BENCHMARK["steps"]})')
+    load_group.add_argument('--heights', type=int, nargs='+', default=DEFAULT_BENCHMARK["height_counts"],
+                            help=f'Количество высот в сетке способа procedure '
+                                 f'(по умолчанию: {DEFAULT_BENCHMARK["height_counts"]})')
+    load_group.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS,
+                            help='Способы расчета (по умолчанию: все)')
+    load_group.add_argument('--timing-mode', choices=['point', 'sample', 'batch'],
+                            default=DEFAULT_BENCHMARK["timing_mode"],
+                            help='Режим замера времени способа procedure: batch - без замера отдельных точек, '
+                                 'point и sample добавляют накладные расходы замера, но дают перцентили '
+                                 f'(по умолчанию: {DEFAULT_BENCHMARK["timing_mode"]})')
+    load_group.add_argument('--repeat', type=int, default=DEFAULT_BENCHMARK["repeat"],
+                            help=f'Количество повторов каждого теста, в результат идет медиана '
+                                 f'(по умолчанию: {DEFAULT_BENCHMARK["repeat"]})')
+    load_group.add_argument('--c-binary',
+                            help='Готовая программа, собранная из main.c (по умолчанию main.c собирается заново)')
+
+    # Параметры вывода
+    out_group = parser.add_argument_group('Параметры вывода')
+    out_group.add_argument('--output', default='benchmark_results.json', help='Файл JSON для сохранения результатов')
+    out_group.add_argument('--compare', help='Файл JSON с базовыми результатами для сравнения')
+    out_group.add_argument('--threshold', type=float, default=DEFAULT_BENCHMARK["threshold"],
+                           help=f'Допустимое снижение пропускной способности относительно базовых результатов '
+                                f'(по умолчанию: {DEFAULT_BENCHMARK["threshold"]})')
+
+    return parser.parse_args()
+
+
+def get_db_config(args):
+    """Конфигурация подключения к базе данных на основе аргументов командной строки"""
+    db_config = DB_CONFIG.copy()
+    if args.dbname: db_config["dbname"] = args.dbname
+    if args.user: db_config["user"] = args.user
+    if args.password: db_config["password"] = args.password
+    if args.host: db_config["host"] = args.host
+    if args.port: db_config["port"] = args.port
+    return db_config
+
+
+def conninfo_string(db_config):
+    """Строка подключения libpq для программы на C"""
+    return " ".join(f"{key}={value}" for key, value in db_config.items() if value)
+
+
+def backend_peak_memory_kb(pid):
+    """
+    Пиковый объем памяти серверного процесса (VmHWM) в КБ
+
+    Доступен только для локального сервера (чтение /proc); в объем входят
+    затронутые процессом страницы общих буферов.
+    """
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def fetch_heights(conn):
+    """Список высот из таблицы температурных отклонений"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT height FROM snaart.temperature_deviations ORDER BY height;")
+    heights = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    cursor.close()
+    return heights
+
+
+def run_procedure_workload(db_config, heights, min_temperature, max_temperature, step, timing_mode="batch"):
+    """
+    Расчет сетки процедурой calculate_interpolations_for_heights
+
+    Выполняется в отдельном соединении внутри транзакции, которая откатывается
+    после замера, поэтому результаты предыдущих расчетов в interpolation_results
+    не затрагиваются. Параметры передаются по именам, чтобы изменение сигнатуры
+    процедуры приводило к ошибке, а не к сдвигу аргументов. Перцентили времени
+    точки берутся из calculation_time и доступны только в режимах point и sample.
+    """
+    conn = psycopg2.connect(**db_config)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET client_min_messages = warning")
+        cursor.execute("CALL snaart.prepare_interpolation_tables(TRUE)")
+
+        start_time = time.perf_counter()
+        cursor.execute("""
+            CALL snaart.calculate_interpolations_for_heights(
+                p_heights => %(heights)s,
+                p_min_temperature => %(min)s,
+                p_max_temperature => %(max)s,
+                p_temperature_step => %(step)s,
+                p_resume => FALSE,
+                p_timing_mode => %(timing_mode)s,
+                p_sample_rate => 100
+            )
+        """, {"heights": heights, "min": min_temperature, "max": max_temperature, "step": step,
+              "timing_mode": timing_mode})
+        points = cursor.fetchone()[0]
+        seconds = time.perf_counter() - start_time
+
+        p50_ms = p99_ms = None
+        if timing_mode != 'batch':
+            cursor.execute("""
+                SELECT percentile_cont(ARRAY[0.5, 0.99]) WITHIN GROUP (ORDER BY calculation_time)
+                FROM snaart.interpolation_results
+            """)
+            p50_ms, p99_ms = cursor.fetchone()[0]
+
+        return {
+            "points": points,
+            "seconds": seconds,
+            "p50_ms": p50_ms,
+            "p99_ms": p99_ms,
+            "peak_memory_kb": backend_peak_memory_kb(conn.get_backend_pid())
+        }
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def run_function_workload(db_config, heights, min_temperature, max_temperature, step):
+    """
+    Прямые вызовы fn_calc_temperature_interpolation для каждой температуры сетки
+
+    Все вызовы выполняются одним запросом; время точки измеряется
+    clock_timestamp() до и после вызова функции. Функция не зависит от
+    высоты, поэтому heights не используется. Сумма поправок сравнивается
+    с суммой программы на C.
+    """
+    conn = psycopg2.connect(**db_config)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET client_min_messages = warning")
+
+        start_time = time.perf_counter()
+        cursor.execute("""
+            WITH grid AS (
+                SELECT %(min)s + i * %(step)s AS temperature
+                FROM generate_series(0, FLOOR((%(max)s - %(min)s) / %(step)s)::INTEGER) AS i
+            ),
+            timed AS (
+                SELECT
+                    clock_timestamp() AS started,
+                    snaart.fn_calc_temperature_interpolation(temperature) AS value,
+                    clock_timestamp() AS finished
+                FROM grid
+            )
+            SELECT
+                COUNT(*),
+                SUM(value),
+                percentile_cont(ARRAY[0.5, 0.99]) WITHIN GROUP (
+                    ORDER BY EXTRACT(EPOCH FROM (finished - started)) * 1000
+                )
+            FROM timed
+        """, {
+            "min": Decimal(str(min_temperature)),
+            "max": Decimal(str(max_temperature)),
+            "step": Decimal(str(step))
+        })
+        points, total, (p50_ms, p99_ms) = cursor.fetchone()
+        seconds = time.perf_counter() - start_time
+
+        return {
+            "points": points,
+            "sum": float(total) if total is not None else None,
+            "seconds": seconds,
+            "p50_ms": p50_ms,
+            "p99_ms": p99_ms,
+            "peak_memory_kb": backend_peak_memory_kb(conn.get_backend_pid())
+        }
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def build_c_benchmark(build_dir):
+    """Сборка main.c; флаги libpq берутся из pg_config или pkg-config"""
+    compiler = os.environ.get("CC") or shutil.which("cc") or "gcc"
+    flags = []
+    try:
+        if shutil.which("pg_config"):
+            include_dir = subprocess.run(["pg_config", "--includedir"], capture_output=True, text=True,
+                                         check=True).stdout.strip()
+            lib_dir = subprocess.run(["pg_config", "--libdir"], capture_output=True, text=True,
+                                     check=True).stdout.strip()
+            flags = [f"-I{include_dir}", f"-L{lib_dir}"]
+        elif shutil.which("pkg-config"):
+            flags = subprocess.run(["pkg-config", "--cflags", "--libs-only-L", "libpq"], capture_output=True,
+                                   text=True, check=True).stdout.split()
+    except subprocess.CalledProcessError:
+        flags = []
+
+    binary = os.path.join(build_dir, "myapp")
+    command = [compiler, "-O2", "-o", binary, C_SOURCE, *flags, "-lpq", "-lm"]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"✗ Не удалось собрать {C_SOURCE}: {result.stderr.strip()}")
+        return None
+
+    print(f"✓ Программа собрана: {' '.join(command)}")
+    return binary
+
+
+def run_c_workload(binary, db_config, heights, min_temperature, max_temperature, step):
+    """
+    Расчет сетки программой на C
+
+    Время и перцентили берутся из итоговой строки программы (без учета
+    подключения и загрузки таблицы), пиковая память - из rusage процесса.
+    Поправка не зависит от высоты, поэтому heights не используется и сетка
+    температур рассчитывается один раз.
+    """
+    process = subprocess.Popen(
+        [binary, conninfo_string(db_config), str(min_temperature), str(max_temperature), str(step),
+         "1", C_CORRECTION_TABLE],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    output = process.stdout.read()
+    process.stdout.close()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    match = C_RESULT_RE.search(output)
+    if process.returncode != 0 or not match:
+        raise RuntimeError(output.strip() or f"код завершения {process.returncode}")
+
+    # ru_maxrss в macOS указывается в байтах, в Linux - в килобайтах
+    peak_memory_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+
+    return {
+        "points": int(match.group("count")),
+        "sum": float(match.group("sum")),
+        "seconds": float(match.group("seconds")),
+        "p50_ms": float(match.group("p50_ns")) / 1e6,
+        "p99_ms": float(match.group("p99_ns")) / 1e6,
+        "peak_memory_kb": peak_memory_kb
+    }
+
+
+def summarize_runs(path, step, heights_count, runs):
+    """Итог теста: медианный по пропускной способности повтор и все повторы"""
+    for run in runs:
+        run["throughput"] = run["points"] / run["seconds"] if run["seconds"] > 0 else None
+        for key in ("p50_ms", "p99_ms"):
+            run[key] = float(run[key]) if run[key] is not None else None
+
+    ordered = sorted(runs, key=lambda run: run["throughput"] or 0)
+    median = ordered[len(ordered) // 2]
+    return {
+        "path": path,
+        "workload": WORKLOADS[path][0],
+        "step": step,
+        "heights": heights_count,
+        "points": median["points"],
+        "sum": median.get("sum"),
+        "throughput": median["throughput"],
+        "seconds": median["seconds"],
+        "p50_ms": median["p50_ms"],
+        "p99_ms": median["p99_ms"],
+        "peak_memory_kb": max((run["peak_memory_kb"] or 0 for run in runs), default=None) or None,
+        "runs": runs
+    }
+
+
+def print_result(result):
+    """Вывод итога одного теста"""
+    def latency(value):
+        return f"{value * 1000:.3f} мкс" if value is not None else "н/д"
+
+    memory = f"{result['peak_memory_kb'] / 1024:.1f} МБ" if result['peak_memory_kb'] else "н/д"
+    heights = result['heights'] if result['heights'] is not None else "—"
+    print(f"  {result['path']:<10} шаг {result['step']:<5g} высот {heights:<3} "
+          f"точек {result['points']:<7} {result['throughput']:>12.0f} точек/с  "
+          f"p50 {latency(result['p50_ms'])}, p99 {latency(result['p99_ms'])}, память {memory}")
+
+
+def check_correction_sums(results):
+    """
+    Сверка сумм поправок функции и программы на C при одинаковом шаге
+
+    Обе считают поправку по calc_temperature_correction для одной и той же
+    сетки температур, поэтому расхождение сумм означает ошибку в одном из
+    способов, а не разницу в нагрузке. Возвращает True при расхождении.
+    """
+    sums = {}
+    for result in results:
+        if result["path"] in ("function", "c") and result.get("sum") is not None:
+            sums.setdefault(result["step"], {})[result["path"]] = result
+
+    mismatch = False
+    for step, by_path in sorted(sums.items()):
+        if len(by_path) < 2:
+            continue
+        function_result, c_result = by_path["function"], by_path["c"]
+        if function_result["points"] != c_result["points"]:
+            print(f"✗ Шаг {step:g}: число точек функции {function_result['points']} "
+                  f"и программы на C {c_result['points']} не совпадает")
+            mismatch = True
+            continue
+
+        difference = abs(function_result["sum"] - c_result["sum"])
+        tolerance = SUM_TOLERANCE_PER_POINT * function_result["points"]
+        if difference > tolerance:
+            print(f"✗ Шаг {step:g}: сумма поправок функции {function_result['sum']:.4f} "
+                  f"и программы на C {c_result['sum']:.4f} расходится на {difference:.4f} "
+                  f"(допустимо {tolerance:.4f})")
+            mismatch = True
+        else:
+            print(f"✓ Шаг {step:g}: суммы поправок функции и программы на C совпадают "
+                  f"({function_result['sum']:.4f} и {c_result['sum']:.4f})")
+
+    return mismatch
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Сравнение пропускной способности с базовыми результатами
+
+    Возвращает список тестов, в которых пропускная способность снизилась
+    больше чем на threshold (доля).
+    """
+    print_header("СРАВНЕНИЕ С БАЗОВЫМИ РЕЗУЛЬТАТАМИ")
+
+    baseline_index = {
+        (item["path"], item["step"], item["heights"]): item
+        for item in baseline.get("results", [])
+    }
+
+    regressions = []
+    for result in results:
+        base = baseline_index.get((result["path"], result["step"], result["heights"]))
+        if not base or not base.get("throughput") or not result["throughput"]:
+            continue
+
+        change = result["throughput"] / base["throughput"] - 1
+        failed = change < -threshold
+        if failed:
+            regressions.append({**result, "baseline_throughput": base["throughput"], "change": change})
+
+        heights = result['heights'] if result['heights'] is not None else "—"
+        print(f"{'✗' if failed else '✓'} {result['path']:<10} шаг {result['step']:<5g} высот {heights:<3} "
+              f"{base['throughput']:>12.0f} -> {result['throughput']:>12.0f} точек/с ({change * 100:+.1f}%)")
+
+    if regressions:
+        print(f"\n✗ Снижение пропускной способности более чем на {threshold * 100:.0f}%: {len(regressions)} тестов")
+    else:
+        print(f"\n✓ Снижения пропускной способности более чем на {threshold * 100:.0f}% не обнаружено")
+    return regressions
+
+
+def main():
+    """Основная функция сравнительного теста"""
+    args = parse_arguments()
+    db_config = get_db_config(args)
+
+    print_header("СРАВНИТЕЛЬНЫЙ ТЕСТ ПРОИЗВОДИТЕЛЬНОСТИ ИНТЕРПОЛЯЦИИ")
+    print(f"Способы расчета: {', '.join(args.paths)}")
+    print(f"Диапазон температур: от {args.min_temp} до {args.max_temp} °C")
+    print(f"Шаги: {', '.join(f'{step:g}' for step in args.steps)}")
+    print(f"Количество высот (procedure): {', '.join(str(count) for count in args.heights)}")
+    print(f"Замер времени (procedure): {args.timing_mode}")
+    print(f"Повторов: {args.repeat}")
+
+    try:
+        conn = psycopg2.connect(**db_config)
+    except psycopg2.Error as e:
+        print(f"✗ Ошибка подключения к базе данных: {e}")
+        return 1
+
+    all_heights = fetch_heights(conn)
+    server_version = conn.server_version
+    conn.close()
+
+    # Программа на C собирается один раз во временном каталоге
+    build_dir = None
+    binary = args.c_binary
+    if "c" in args.paths and not binary:
+        build_dir = tempfile.mkdtemp(prefix="interpolation_benchmark_")
+        binary = build_c_benchmark(build_dir)
+
+    workloads = {
+        "procedure": lambda *workload: run_procedure_workload(*workload, timing_mode=args.timing_mode),
+        "function": run_function_workload,
+        "c": lambda *workload: run_c_workload(binary, *workload)
+    }
+
+    print_header("ВЫПОЛНЕНИЕ ТЕСТОВ")
+    results = []
+    try:
+        for path in args.paths:
+            if path == "c" and not binary:
+                print("✗ Программа на C недоступна, тесты c пропущены")
+                continue
+
+            _, description, by_height = WORKLOADS[path]
+            print(f"\n{path}: {description}")
+            for step in args.steps:
+                for heights_count in (args.heights if by_height else [None]):
+                    heights = all_heights[:heights_count] if by_height else None
+                    label = f"высот {len(heights)}" if by_height else "без высот"
+                    try:
+                        runs = [
+                            workloads[path](db_config, heights, args.min_temp, args.max_temp, step)
+                            for _ in range(args.repeat)
+                        ]
+                    except (psycopg2.Error, RuntimeError, OSError) as e:
+                        print(f"✗ {path}, шаг {step:g}, {label}: {str(e).strip()}")
+                        continue
+
+                    result = summarize_runs(path, step, len(heights) if by_height else None, runs)
+                    results.append(result)
+                    print_result(result)
+    finally:
+        if build_dir:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "settings": {
+            "min_temperature": args.min_temp,
+            "max_temperature": args.max_temp,
+            "steps": args.steps,
+            "heights": args.heights,
+            "paths": args.paths,
+            "workloads": {path: {"name": WORKLOADS[path][0], "description": WORKLOADS[path][1]}
+                          for path in args.paths},
+            "timing_mode": args.timing_mode,
+            "repeat": args.repeat
+        },
+        "environment": {
+            "server_version": server_version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "results": results
+    }
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"\n✓ Результаты сохранены в {args.output}")
+
+    sums_mismatch = check_correction_sums(results)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if compare_results(results, baseline, args.threshold):
+            return 1
+
+    return 1 if sums_mismatch else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
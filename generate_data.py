@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import psycopg2
+
+from interpolatetion import (
+    COPY_BINARY_HEADER, COPY_BINARY_TRAILER, DB_CONFIG, CopyStream, encode_copy_binary, print_header
+)
+
+# Распределения значений по умолчанию - как в блоке генерации тестовых данных fsqlnew
+DEFAULT_DISTRIBUTIONS = {
+    "height": "int:0:600",
+    "temperature": "int:0:50",
+    "pressure": "int:500:850",
+    "wind_direction": "int:0:59",
+    "wind_speed": "int:0:59"
+}
+
+# Виды распределений: int - равномерное целое (границы включаются),
+# uniform - равномерное, normal - нормальное (среднее, отклонение)
+DISTRIBUTION_KINDS = ["int", "uniform", "normal"]
+
+# Параметры генерации по умолчанию
+DEFAULT_GENERATION = {
+    "employees": 5,
+    "measurements": 1000000,
+    "seed": 1,
+    "chunk_size": 100000,
+    "started_from": "2025-02-01 00:00",
+    "started_to": "2025-02-05 00:00",
+    "birthday_from": "1978-01-01",
+    "birthday_to": "2000-01-01"
+}
+
+# Символы имени: fn_get_random_text(25) берет символы 10..50 списка по умолчанию
+NAME_ALPHABET = ("АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+                 "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_0123456789")[9:50]
+NAME_LENGTH = 25
+
+# Столбцы двоичного COPY: имя, тип, знаков после запятой
+MEASUREMENT_COLUMNS = [
+    ("id", "int4", None),
+    ("measurment_type_id", "int4", None),
+    ("height", "numeric", 2),
+    ("temperature", "numeric", 2),
+    ("pressure", "numeric", 2),
+    ("wind_direction", "numeric", 2),
+    ("wind_speed", "numeric", 2)
+]
+BATH_COLUMNS = [
+    ("id", "int4", None),
+    ("emploee_id", "int4", None),
+    ("measurment_input_param_id", "int4", None),
+    ("started", "timestamp", None)
+]
+
+# Начало отсчета timestamp в двоичном формате PostgreSQL
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+
+
+def parse_distribution(text):
+    """Разбор распределения вида «вид:a:b» (int:0:600, uniform:-10:50, normal:15:8)"""
+    parts = text.split(":")
+    if len(parts) != 3 or parts[0] not in DISTRIBUTION_KINDS:
+        raise argparse.ArgumentTypeError(
+            f"ожидается вид:a:b, вид - один из {', '.join(DISTRIBUTION_KINDS)}: {text}")
+    try:
+        a, b = float(parts[1]), float(parts[2])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"границы распределения должны быть числами: {text}")
+    if parts[0] != "normal" and b < a:
+        raise argparse.ArgumentTypeError(f"верхняя граница меньше нижней: {text}")
+    return parts[0], a, b
+
+
+def parse_timestamp(text):
+    """Разбор даты и времени в формате ISO"""
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается дата в формате ГГГГ-ММ-ДД [ЧЧ:ММ]: {text}")
+
+
+def sample_values(rng, distribution, size):
+    """Значения NUMERIC(8,2) по распределению (округление до сотых)"""
+    kind, a, b = distribution
+    if kind == "int":
+        return rng.integers(int(a), int(b), size=size, endpoint=True).astype(np.float64)
+    if kind == "uniform":
+        values = rng.uniform(a, b, size=size)
+    else:
+        values = rng.normal(a, b, size=size)
+    return np.round(values, 2)
+
+
+def sample_microseconds(rng, start, end, size):
+    """Случайные моменты из [start, end) в микросекундах от 2000-01-01"""
+    low = int((start - POSTGRES_EPOCH).total_seconds() * 1000000)
+    high = int((end - POSTGRES_EPOCH).total_seconds() * 1000000)
+    return rng.integers(low, max(high, low + 1), size=size)
+
+
+def reserve_ids(conn, truncate):
+    """
+    Блокировка таблиц и первые свободные идентификаторы
+
+    Идентификаторы назначаются на клиенте, поэтому таблицы блокируются
+    от параллельной вставки до конца транзакции; при truncate таблицы
+    измерений предварительно очищаются.
+    """
+    cursor = conn.cursor()
+    cursor.execute("LOCK TABLE snaart.employees, snaart.measurment_input_params, snaart.measurment_baths "
+                   "IN SHARE ROW EXCLUSIVE MODE;")
+    if truncate:
+        cursor.execute("TRUNCATE snaart.measurment_baths, snaart.measurment_input_params;")
+
+    start_ids = {}
+    for table in ["employees", "measurment_input_params", "measurment_baths"]:
+        cursor.execute(f"SELECT COALESCE(max(id), 0) + 1 FROM snaart.{table};")
+        start_ids[table] = cursor.fetchone()[0]
+    cursor.close()
+    return start_ids
+
+
+def update_sequences(conn, next_ids):
+    """Сдвиг последовательностей за назначенные на клиенте идентификаторы"""
+    cursor = conn.cursor()
+    for table, next_id in next_ids.items():
+        sequence = f"snaart.{table}_seq"
+        cursor.execute(f"SELECT setval('{sequence}', GREATEST(%s, (SELECT last_value FROM {sequence})));",
+                       (next_id - 1,))
+    cursor.close()
+
+
+def drop_indexes(conn, tables):
+    """
+    Удаление индексов и ограничений таблиц перед массовой загрузкой
+
+    Построчная проверка внешнего ключа и обновление индексов обходятся
+    дороже самой записи, поэтому индексы строятся заново после COPY, а внешние
+    ключи проверяются одним запросом при восстановлении. Все выполняется в
+    транзакции загрузки: при ошибке откат возвращает исходную схему.
+    Возвращает команды восстановления в порядке выполнения.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype IN ('p', 'u', 'f')
+          AND (conrelid = ANY(%(tables)s::regclass[]) OR confrelid = ANY(%(tables)s::regclass[]))
+        ORDER BY contype = 'f' DESC;
+    """, {"tables": tables})
+    constraints = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+        FROM pg_index AS i
+        WHERE i.indrelid = ANY(%s::regclass[])
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint AS c WHERE c.conindid = i.indexrelid);
+    """, (tables,))
+    indexes = cursor.fetchall()
+
+    # Сначала внешние ключи (они зависят от первичных ключей), затем ключи и индексы
+    for table, name, _, _ in constraints:
+        cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}";')
+    for name, _ in indexes:
+        cursor.execute(f"DROP INDEX {name};")
+    cursor.close()
+
+    restore = [f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition};'
+               for table, name, kind, definition in constraints if kind != 'f']
+    restore += [f"{definition};" for _, definition in indexes]
+    restore += [f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition};'
+                for table, name, kind, definition in constraints if kind == 'f']
+    return restore
+
+
+def restore_indexes(conn, restore):
+    """Построение индексов и проверка ограничений после загрузки"""
+    cursor = conn.cursor()
+    for statement in restore:
+        cursor.execute(statement)
+    cursor.close()
+
+
+def copy_employees(conn, rng, count, first_id, birthday_from, birthday_to):
+    """Сотрудники через текстовый COPY; возвращает идентификаторы"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT min(id), max(id) FROM snaart.military_ranks;")
+    min_rank, max_rank = cursor.fetchone()
+    if min_rank is None:
+        raise ValueError("Справочник military_ranks пуст")
+
+    ids = np.arange(first_id, first_id + count)
+    letters = np.array(list(NAME_ALPHABET))
+    names = ["".join(row) for row in letters[rng.integers(0, len(NAME_ALPHABET), size=(count, NAME_LENGTH))]]
+    birthdays = sample_microseconds(rng, birthday_from, birthday_to, count)
+    ranks = rng.integers(min_rank, max_rank, size=count, endpoint=True)
+
+    lines = [
+        f"{employee_id}\t{name}\t{POSTGRES_EPOCH + timedelta(microseconds=birthday)}\t{rank}\n"
+        for employee_id, name, birthday, rank in zip(ids.tolist(), names, birthdays.tolist(), ranks.tolist())
+    ]
+    stream = CopyStream([line.encode("utf-8") for line in lines])
+    cursor.copy_expert("COPY snaart.employees (id, name, birthday, military_rank_id) FROM STDIN", stream)
+    cursor.close()
+    return ids
+
+
+def copy_chunks(conn, table, result_columns, chunks):
+    """Потоковая запись порций через двоичный COPY; возвращает (строк, байт, секунд)"""
+    stats = {"rows": 0}
+
+    def encoded_chunks():
+        yield COPY_BINARY_HEADER
+        for chunk in chunks:
+            stats["rows"] += len(chunk["id"])
+            yield encode_copy_binary(chunk, result_columns)
+        yield COPY_BINARY_TRAILER
+
+    columns = ", ".join(name for name, _, _ in result_columns)
+    stream = CopyStream(encoded_chunks())
+    cursor = conn.cursor()
+    start_time = time.perf_counter()
+    cursor.copy_expert(f"COPY snaart.{table} ({columns}) FROM STDIN WITH (FORMAT binary)", stream, size=1 << 20)
+    elapsed = time.perf_counter() - start_time
+    cursor.close()
+    return stats["rows"], stream.bytes_written, elapsed
+
+
+def generate_measurements(seed, count, first_id, distributions, chunk_size):
+    """Порции measurment_input_params; тип устройства - 1 или 2, как в fsqlnew"""
+    rng = np.random.default_rng([seed, 1])
+    for offset in range(0, count, chunk_size):
+        size = min(chunk_size, count - offset)
+        chunk = {
+            "id": np.arange(first_id + offset, first_id + offset + size),
+            "measurment_type_id": rng.integers(1, 2, size=size, endpoint=True)
+        }
+        for column, distribution in distributions.items():
+            chunk[column] = sample_values(rng, distribution, size)
+        yield chunk
+
+
+def generate_baths(seed, count, first_id, first_measurement_id, employee_ids, started_from, started_to, chunk_size):
+    """Порции measurment_baths: по одной записи на измерение, сотрудник выбирается случайно"""
+    rng = np.random.default_rng([seed, 2])
+    for offset in range(0, count, chunk_size):
+        size = min(chunk_size, count - offset)
+        yield {
+            "id": np.arange(first_id + offset, first_id + offset + size),
+            "emploee_id": employee_ids[rng.integers(0, len(employee_ids), size=size)],
+            "measurment_input_param_id": np.arange(first_measurement_id + offset,
+                                                   first_measurement_id + offset + size),
+            "started": sample_microseconds(rng, started_from, started_to, size)
+        }
+
+
+def print_copy_result(title, rows, size, elapsed):
+    """Вывод скорости записи таблицы"""
+    rate = rows / elapsed if elapsed > 0 else 0
+    print(f"✓ {title}: {rows} строк за {elapsed:.2f} с, {rate:.0f} строк/с, "
+          f"{size / 1024 / 1024 / elapsed if elapsed > 0 else 0:.1f} МБ/с")
+
+
+def parse_arguments():
+    """Обработка аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Генерация тестовых измерений для проверки на больших объемах')
+
+    # Параметры базы данных
+    db_group = parser.add_argument_group('Параметры базы данных')
+    db_group.add_argument('--dbname', help='Имя базы данных')
+    db_group.add_argument('--user', help='Имя пользователя')
+    db_group.add_argument('--password', help='Пароль')
+    db_group.add_argument('--host', help='Хост', default='localhost')
+    db_group.add_argument('--port', help='Порт', default='5432')
+
+    # Параметры генерации
+    gen_group = parser.add_argument_group('Параметры генерации')
+    gen_group.add_argument('--employees', type=int, default=DEFAULT_GENERATION["employees"],
+                           help='Новых сотрудников; 0 - распределить измерения между существующими '
+                                f'(по умолчанию: {DEFAULT_GENERATION["employees"]})')
+    gen_group.add_argument('--measurements', type=int, default=DEFAULT_GENERATION["measurements"],
+                           help=f'Измерений (и записей measurment_baths) '
+                                f'(по умолчанию: {DEFAULT_GENERATION["measurements"]})')
+    gen_group.add_argument('--seed', type=int, default=DEFAULT_GENERATION["seed"],
+                           help='Начальное значение генератора: при том же значении и размере порции '
+                                f'данные повторяются (по умолчанию: {DEFAULT_GENERATION["seed"]})')
+    gen_group.add_argument('--chunk-size', type=int, default=DEFAULT_GENERATION["chunk_size"],
+                           help=f'Строк в порции (по умолчанию: {DEFAULT_GENERATION["chunk_size"]})')
+    gen_group.add_argument('--truncate', action='store_true',
+                           help='Очистить measurment_input_params и measurment_baths перед генерацией')
+    gen_group.add_argument('--keep-indexes', action='store_true',
+                           help='Не удалять индексы и ограничения на время загрузки '
+                                '(для небольших добавлений к большим таблицам)')
+    gen_group.add_argument('--started-from', type=parse_timestamp,
+                           default=parse_timestamp(DEFAULT_GENERATION["started_from"]),
+                           help=f'Начало периода измерений (по умолчанию: {DEFAULT_GENERATION["started_from"]})')
+    gen_group.add_argument('--started-to', type=parse_timestamp,
+                           default=parse_timestamp(DEFAULT_GENERATION["started_to"]),
+                           help=f'Конец периода измерений (по умолчанию: {DEFAULT_GENERATION["started_to"]})')
+
+    # Распределения значений
+    dist_group = parser.add_argument_group('Распределения значений (вид:a:b, вид - int, uniform или normal)')
+    for column, default in DEFAULT_DISTRIBUTIONS.items():
+        dist_group.add_argument(f'--{column.replace("_", "-")}', type=parse_distribution,
+                                default=parse_distribution(default),
+                                help=f'Распределение {column} (по умолчанию: {default})')
+
+    return parser.parse_args()
+
+
+def main():
+    """Генерация и запись тестовых данных"""
+    args = parse_arguments()
+
+    db_config = DB_CONFIG.copy()
+    if args.dbname: db_config["dbname"] = args.dbname
+    if args.user: db_config["user"] = args.user
+    if args.password: db_config["password"] = args.password
+    if args.host: db_config["host"] = args.host
+    if args.port: db_config["port"] = args.port
+
+    print_header("ГЕНЕРАЦИЯ ТЕСТОВЫХ ДАННЫХ")
+    distributions = {column: getattr(args, column) for column in DEFAULT_DISTRIBUTIONS}
+    print(f"Сотрудников: {args.employees}, измерений: {args.measurements}, seed: {args.seed}")
+    for column, (kind, a, b) in distributions.items():
+        print(f"  {column}: {kind}({a:g}, {b:g})")
+
+    conn = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        start_time = time.perf_counter()
+        start_ids = reserve_ids(conn, args.truncate)
+
+        rng = np.random.default_rng([args.seed, 0])
+        if args.employees > 0:
+            employee_ids = copy_employees(conn, rng, args.employees, start_ids["employees"],
+                                          parse_timestamp(DEFAULT_GENERATION["birthday_from"]),
+                                          parse_timestamp(DEFAULT_GENERATION["birthday_to"]))
+            print(f"✓ Сотрудники: {len(employee_ids)} (id {employee_ids[0]}..{employee_ids[-1]})")
+        else:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM snaart.employees ORDER BY id;")
+            employee_ids = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+            cursor.close()
+            if len(employee_ids) == 0:
+                raise ValueError("Нет сотрудников для распределения измерений, укажите --employees")
+
+        restore = []
+        if not args.keep_indexes:
+            restore = drop_indexes(conn, ["snaart.measurment_input_params", "snaart.measurment_baths"])
+
+        measurement_rows, measurement_bytes, measurement_time = copy_chunks(
+            conn, "measurment_input_params", MEASUREMENT_COLUMNS,
+            generate_measurements(args.seed, args.measurements, start_ids["measurment_input_params"],
+                                  distributions, args.chunk_size))
+        print_copy_result("measurment_input_params", measurement_rows, measurement_bytes, measurement_time)
+
+        bath_rows, bath_bytes, bath_time = copy_chunks(
+            conn, "measurment_baths", BATH_COLUMNS,
+            generate_baths(args.seed, args.measurements, start_ids["measurment_baths"],
+                           start_ids["measurment_input_params"], employee_ids,
+                           args.started_from, args.started_to, args.chunk_size))
+        print_copy_result("measurment_baths", bath_rows, bath_bytes, bath_time)
+
+        if restore:
+            index_start = time.perf_counter()
+            restore_indexes(conn, restore)
+            print(f"✓ Индексы и ограничения восстановлены ({len(restore)}) за "
+                  f"{time.perf_counter() - index_start:.2f} с")
+
+        update_sequences(conn, {
+            "employees": start_ids["employees"] + max(args.employees, 0),
+            "measurment_input_params": start_ids["measurment_input_params"] + args.measurements,
+            "measurment_baths": start_ids["measurment_baths"] + args.measurements
+        })
+        conn.commit()
+        elapsed = time.perf_counter() - start_time
+
+        total_rows = measurement_rows + bath_rows + max(args.employees, 0)
+        print(f"\n✓ Всего {total_rows} строк за {elapsed:.2f} с (с фиксацией транзакции), "
+              f"{total_rows / elapsed:.0f} строк/с")
+    except (psycopg2.Error, ValueError) as e:
+        print(f"✗ Ошибка генерации данных: {e}")
+        if conn:
+            conn.rollback()
+        return 1
+    finally:
+        if conn:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,61 +1,113 @@
 /**
- * Хранимая процедура для расчета всех вариантов интерполяции температур
- * 
- * Выполняет расчет интерполяции для всех комбинаций:
- * - высот из таблицы temperature_deviations
- * - температур в заданном диапазоне с указанным шагом
- * 
- * Результаты сохраняются в таблицу interpolation_results
- * Метрики производительности сохраняются в таблицу interpolation_performance
+ * Режим хранения таблицы interpolation_results (см. prepare_interpolation_tables)
+ *
+ * Определяется по каталогу: секционированная таблица - partitioned,
+ * нежурналируемая - unlogged, с индексом BRIN - brin, иначе default.
+ * Возвращает NULL, если таблицы нет.
  */
-CREATE OR REPLACE PROCEDURE public.calculate_all_interpolations(
-    p_min_temperature NUMERIC DEFAULT -50,
-    p_max_temperature NUMERIC DEFAULT 40,
-    p_temperature_step NUMERIC DEFAULT 0.5,
-    p_clear_previous_results BOOLEAN DEFAULT TRUE
+CREATE OR REPLACE FUNCTION public.interpolation_storage_mode()
+RETURNS TEXT
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT CASE
+        WHEN c.relkind = 'p' THEN 'partitioned'
+        WHEN c.relpersistence = 'u' THEN 'unlogged'
+        WHEN EXISTS (
+            SELECT 1
+            FROM pg_index AS i
+            JOIN pg_class AS ic ON ic.oid = i.indexrelid
+            JOIN pg_am AS a ON a.oid = ic.relam
+            WHERE i.indrelid = c.oid
+              AND a.amname = 'brin'
+        ) THEN 'brin'
+        ELSE 'default'
+    END
+    FROM pg_class AS c
+    WHERE c.oid = to_regclass('public.interpolation_results');
+$$;
+
+/**
+ * Процедура подготовки таблиц для хранения результатов интерполяции
+ *
+ * Используется как хранимой процедурой calculate_all_interpolations,
+ * так и клиентскими движками расчета (interpolatetion.py --engine ...)
+ *
+ * p_storage_mode - режим хранения таблицы interpolation_results:
+ * - default - обычная таблица, индексы создаются до загрузки
+ * - unlogged - нежурналируемая таблица (запись без WAL, после сбоя сервера
+ *   таблица очищается - результаты нужно рассчитать заново); индексы новой
+ *   таблицы строятся после загрузки процедурой finish_interpolation_tables
+ * - partitioned - таблица секционирована по высоте (LIST): секция на каждую
+ *   высоту temperature_deviations и секция DEFAULT для новых высот, поэтому
+ *   удаление и пересчет одной высоты затрагивают только ее секцию
+ * - brin - индекс BRIN вместо B-дерева по температуре
+ * Режим существующей таблицы можно сменить только с очисткой предыдущих результатов.
+ */
+DROP PROCEDURE IF EXISTS public.prepare_interpolation_tables(BOOLEAN);
+
+CREATE OR REPLACE PROCEDURE public.prepare_interpolation_tables(
+    p_clear_previous_results BOOLEAN DEFAULT TRUE,
+    p_storage_mode TEXT DEFAULT 'default'
 )
 LANGUAGE plpgsql
 AS $$
 DECLARE
+    v_current_mode TEXT;
     v_height INTEGER;
-    v_temp NUMERIC;
-    v_start_time TIMESTAMP;
-    v_end_time TIMESTAMP;
-    v_total_calculations INTEGER := 0;
-    v_successful_calculations INTEGER := 0;
-    v_heights INTEGER[];
-    v_calculation_result NUMERIC[];
-    v_calc_start TIMESTAMP;
-    v_calc_end TIMESTAMP;
-    v_calc_time NUMERIC;
-    v_error_msg TEXT;
 BEGIN
-    -- Фиксируем время начала выполнения
-    RAISE NOTICE 'Начало расчета интерполяций';
-    RAISE NOTICE 'Параметры: мин. температура = %, макс. температура = %, шаг = %', 
-                 p_min_temperature, p_max_temperature, p_temperature_step;
-    
+    IF p_storage_mode NOT IN ('default', 'unlogged', 'partitioned', 'brin') THEN
+        RAISE EXCEPTION 'Неизвестный режим хранения результатов: %', p_storage_mode;
+    END IF;
+
     -- Если требуется, очищаем предыдущие результаты
     IF p_clear_previous_results THEN
         DROP TABLE IF EXISTS public.interpolation_results;
         DROP TABLE IF EXISTS public.interpolation_performance;
+        DROP TABLE IF EXISTS public.interpolation_checkpoints;
     END IF;
-    
-    -- Создаем таблицу для хранения результатов
-    CREATE TABLE IF NOT EXISTS public.interpolation_results (
-        id SERIAL PRIMARY KEY,
-        height INTEGER NOT NULL,
-        temperature NUMERIC(8,2) NOT NULL,
-        tens_value INTEGER,
-        ones_value INTEGER,
-        dev_tens NUMERIC,
-        dev_ones NUMERIC,
-        result_value NUMERIC,
-        calculation_time NUMERIC(10,3), -- в миллисекундах
-        error_message TEXT DEFAULT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    
+
+    v_current_mode := public.interpolation_storage_mode();
+    IF v_current_mode <> p_storage_mode THEN
+        RAISE EXCEPTION 'Таблица interpolation_results хранится в режиме %, для перехода в режим % нужна очистка предыдущих результатов',
+                        v_current_mode, p_storage_mode;
+    END IF;
+
+    -- Создаем таблицу для хранения результатов (ключ секционированной таблицы включает высоту)
+    IF v_current_mode IS NULL THEN
+        EXECUTE format(
+            'CREATE %s TABLE public.interpolation_results (
+                id SERIAL,
+                height INTEGER NOT NULL,
+                temperature NUMERIC(8,2) NOT NULL,
+                tens_value INTEGER,
+                ones_value INTEGER,
+                dev_tens NUMERIC,
+                dev_ones NUMERIC,
+                result_value NUMERIC,
+                calculation_time NUMERIC(10,3), -- в миллисекундах
+                error_message TEXT DEFAULT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (%s)
+            ) %s',
+            CASE WHEN p_storage_mode = 'unlogged' THEN 'UNLOGGED' ELSE '' END,
+            CASE WHEN p_storage_mode = 'partitioned' THEN 'id, height' ELSE 'id' END,
+            CASE WHEN p_storage_mode = 'partitioned' THEN 'PARTITION BY LIST (height)' ELSE '' END
+        );
+
+        IF p_storage_mode = 'partitioned' THEN
+            FOR v_height IN SELECT height FROM public.temperature_deviations ORDER BY height LOOP
+                EXECUTE format(
+                    'CREATE TABLE public.%I PARTITION OF public.interpolation_results FOR VALUES IN (%s)',
+                    'interpolation_results_h' || replace(v_height::TEXT, '-', 'm'),
+                    v_height
+                );
+            END LOOP;
+            CREATE TABLE public.interpolation_results_default
+                PARTITION OF public.interpolation_results DEFAULT;
+        END IF;
+    END IF;
+
     -- Создаем таблицу для метрик производительности
     CREATE TABLE IF NOT EXISTS public.interpolation_performance (
         id SERIAL PRIMARY KEY,
@@ -66,34 +118,250 @@ BEGIN
         min_calculation_time_ms NUMERIC(10,3),
         max_calculation_time_ms NUMERIC(10,3),
         parameters JSONB,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        latency_histogram INTEGER[] -- см. latency_histogram_bucket
     );
+
+    -- Таблицы, созданные до появления гистограммы времени расчета
+    ALTER TABLE public.interpolation_performance ADD COLUMN IF NOT EXISTS latency_histogram INTEGER[];
+
+    -- Создаем таблицу контрольных точек: высота считается рассчитанной
+    -- для диапазона и шага, если для них есть запись
+    CREATE TABLE IF NOT EXISTS public.interpolation_checkpoints (
+        height INTEGER NOT NULL,
+        min_temperature NUMERIC NOT NULL,
+        max_temperature NUMERIC NOT NULL,
+        temperature_step NUMERIC NOT NULL,
+        total_calculations INTEGER,
+        successful_calculations INTEGER,
+        skipped_calculations INTEGER,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (height, min_temperature, max_temperature, temperature_step)
+    );
+
+    -- Создаем таблицу истории запусков: только добавление записей,
+    -- при очистке предыдущих результатов не удаляется
+    CREATE TABLE IF NOT EXISTS public.interpolation_run_history (
+        id SERIAL PRIMARY KEY,
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        engine TEXT,
+        min_temperature NUMERIC,
+        max_temperature NUMERIC,
+        temperature_step NUMERIC,
+        heights_count INTEGER,
+        timing_mode TEXT,
+        workers INTEGER,
+        total_time_ms NUMERIC,
+        total_calculations INTEGER,
+        successful_calculations INTEGER,
+        points_per_second NUMERIC,
+        latency_histogram INTEGER[],
+        parameters JSONB,
+        git_revision TEXT,
+        server_version TEXT,
+        server_settings JSONB
+    );
+
+    -- Индексы новой нежурналируемой таблицы строятся после загрузки
+    IF p_storage_mode <> 'unlogged' OR v_current_mode IS NOT NULL THEN
+        CALL public.finish_interpolation_tables(p_storage_mode);
+    END IF;
+END;
+$$;
+
+/**
+ * Построение индексов interpolation_results
+ *
+ * Вызывается процедурой prepare_interpolation_tables и после загрузки
+ * результатов (в режиме unlogged индексы новой таблицы строятся здесь
+ * одним проходом вместо обновления при каждой вставке). Существующие
+ * индексы не пересоздаются.
+ */
+CREATE OR REPLACE PROCEDURE public.finish_interpolation_tables(
+    p_storage_mode TEXT DEFAULT 'default'
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Оптимизация: создаем индексы для ускорения выборки
+    CREATE INDEX IF NOT EXISTS idx_interpolation_results_height ON public.interpolation_results(height);
+    IF p_storage_mode = 'brin' THEN
+        CREATE INDEX IF NOT EXISTS idx_interpolation_results_temp ON public.interpolation_results USING brin (temperature);
+    ELSE
+        CREATE INDEX IF NOT EXISTS idx_interpolation_results_temp ON public.interpolation_results(temperature);
+    END IF;
+
+    -- Уникальный ключ точки сетки: повторная запись рассчитанной точки не создает дубликат.
+    -- Таблицы, накопленные до появления ключа или загруженные без индексов,
+    -- могут содержать дубликаты - оставляем первый расчет
+    IF to_regclass('public.idx_interpolation_results_point') IS NULL THEN
+        DELETE FROM public.interpolation_results AS r
+        USING public.interpolation_results AS d
+        WHERE d.height = r.height
+          AND d.temperature = r.temperature
+          AND d.id < r.id;
+
+        CREATE UNIQUE INDEX idx_interpolation_results_point
+            ON public.interpolation_results(height, temperature);
+    END IF;
+END;
+$$;
+
+/**
+ * Номер корзины логарифмической гистограммы времени расчета точки
+ *
+ * Гистограмма хранится массивом INTEGER[100] (interpolation_performance.latency_histogram):
+ * - корзина 1 - время меньше 1 мкс
+ * - корзина k >= 2 - время от 2^((k-2)/4) до 2^((k-1)/4) мкс (4 корзины на каждое
+ *   удвоение времени, относительная погрешность не больше 19%)
+ * - в корзину 100 попадает все время больше ~21 с
+ */
+CREATE OR REPLACE FUNCTION public.latency_histogram_bucket(p_time_ms NUMERIC)
+RETURNS INTEGER
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN p_time_ms < 0.001 THEN 1
+        ELSE LEAST(FLOOR(4 * ln(p_time_ms::DOUBLE PRECISION * 1000) / ln(2))::INTEGER + 2, 100)
+    END;
+$$;
+
+/**
+ * Процедура расчета интерполяций для заданного подмножества высот
+ *
+ * Не очищает и не создает таблицы и не записывает метрики производительности,
+ * поэтому несколько вызовов с непересекающимися наборами высот могут
+ * выполняться параллельно в разных соединениях.
+ * После каждой высоты записывается контрольная точка в interpolation_checkpoints.
+ *
+ * В режиме продолжения (p_resume):
+ * - высоты с контрольной точкой для того же диапазона и шага пропускаются
+ * - рассчитываются только точки, отсутствующие в interpolation_results
+ * - после каждой высоты выполняется COMMIT, поэтому прерванный расчет
+ *   не теряет уже рассчитанные высоты (процедура должна вызываться через CALL
+ *   вне явной транзакции)
+ *
+ * Режим замера времени (p_timing_mode):
+ * - point - время каждой точки (два вызова clock_timestamp() на точку)
+ * - sample - время каждой p_sample_rate-й точки, у остальных calculation_time не заполняется
+ * - batch - время расчета высоты целиком (вместе с записью результатов),
+ *   в гистограмму попадает среднее время точки с весом числа точек высоты;
+ *   calculation_time не заполняется
+ *
+ * Возвращает количество расчетов, успешных расчетов, время выполнения (мс),
+ * количество пропущенных (уже рассчитанных) точек и гистограмму времени
+ * расчета точки (см. latency_histogram_bucket).
+ */
+DROP PROCEDURE IF EXISTS public.calculate_interpolations_for_heights(
+    INTEGER[], NUMERIC, NUMERIC, NUMERIC, INTEGER, INTEGER, NUMERIC
+);
+DROP PROCEDURE IF EXISTS public.calculate_interpolations_for_heights(
+    INTEGER[], NUMERIC, NUMERIC, NUMERIC, BOOLEAN, INTEGER, INTEGER, NUMERIC, INTEGER
+);
+
+CREATE OR REPLACE PROCEDURE public.calculate_interpolations_for_heights(
+    p_heights INTEGER[],
+    p_min_temperature NUMERIC,
+    p_max_temperature NUMERIC,
+    p_temperature_step NUMERIC,
+    p_resume BOOLEAN DEFAULT FALSE,
+    p_timing_mode TEXT DEFAULT 'point',
+    p_sample_rate INTEGER DEFAULT 100,
+    INOUT p_total_calculations INTEGER DEFAULT NULL,
+    INOUT p_successful_calculations INTEGER DEFAULT NULL,
+    INOUT p_total_time_ms NUMERIC DEFAULT NULL,
+    INOUT p_skipped_calculations INTEGER DEFAULT NULL,
+    INOUT p_latency_histogram INTEGER[] DEFAULT NULL
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_height INTEGER;
+    v_temp NUMERIC;
+    v_start_time TIMESTAMP;
+    v_total_calculations INTEGER := 0;
+    v_successful_calculations INTEGER := 0;
+    v_skipped_calculations INTEGER := 0;
+    v_height_total INTEGER;
+    v_height_successful INTEGER;
+    v_height_skipped INTEGER;
+    v_calculation_result NUMERIC[];
+    v_calc_start TIMESTAMP;
+    v_calc_end TIMESTAMP;
+    v_calc_time NUMERIC;
+    v_error_msg TEXT;
+    v_timed BOOLEAN;
+    v_bucket INTEGER;
+    v_histogram INTEGER[] := array_fill(0, ARRAY[100]);
+    v_batch_start TIMESTAMP;
+BEGIN
+    IF p_timing_mode NOT IN ('point', 'sample', 'batch') THEN
+        RAISE EXCEPTION 'Неизвестный режим замера времени: %', p_timing_mode;
+    END IF;
     
-    -- Фиксируем время начала
-    v_start_time := clock_timestamp();
-    
-    -- Получаем список всех высот
-    SELECT array_agg(height ORDER BY height) 
-    INTO v_heights 
-    FROM public.temperature_deviations;
-    
-    RAISE NOTICE 'Найдено % различных высот для расчета', array_length(v_heights, 1);
+    IF p_timing_mode = 'sample' AND COALESCE(p_sample_rate, 0) < 1 THEN
+        RAISE EXCEPTION 'Частота выборки должна быть положительной: %', p_sample_rate;
+    END IF;
     
-    -- Оптимизация: создаем индексы для ускорения вставки
-    CREATE INDEX IF NOT EXISTS idx_interpolation_results_height ON public.interpolation_results(height);
-    CREATE INDEX IF NOT EXISTS idx_interpolation_results_temp ON public.interpolation_results(temperature);
+    v_start_time := clock_timestamp();
     
     -- Для каждой высоты и температуры выполняем расчет
-    FOREACH v_height IN ARRAY v_heights LOOP
+    FOREACH v_height IN ARRAY p_heights LOOP
+        -- В режиме продолжения пропускаем высоты, уже рассчитанные для этого диапазона и шага
+        IF p_resume THEN
+            SELECT total_calculations + skipped_calculations
+            INTO v_height_skipped
+            FROM public.interpolation_checkpoints
+            WHERE height = v_height
+              AND min_temperature = p_min_temperature
+              AND max_temperature = p_max_temperature
+              AND temperature_step = p_temperature_step;
+            
+            IF FOUND THEN
+                RAISE NOTICE 'Высота % м уже рассчитана, пропуск', v_height;
+                v_skipped_calculations := v_skipped_calculations + v_height_skipped;
+                CONTINUE;
+            END IF;
+        END IF;
+        
+        -- Уведомление о начале расчета после проверки контрольной точки:
+        -- по нему клиент считает рассчитанные высоты и скорость расчета
         RAISE NOTICE 'Обработка высоты: % м', v_height;
         
+        v_height_total := 0;
+        v_height_successful := 0;
+        v_height_skipped := 0;
+        
+        IF p_timing_mode = 'batch' THEN
+            v_batch_start := clock_timestamp();
+        END IF;
+        
         -- Перебираем температуры с заданным шагом
         v_temp := p_min_temperature;
         WHILE v_temp <= p_max_temperature LOOP
-            v_total_calculations := v_total_calculations + 1;
+            -- В режиме продолжения пропускаем точки, уже сохраненные в результатах
+            IF p_resume AND EXISTS (
+                SELECT 1
+                FROM public.interpolation_results
+                WHERE height = v_height
+                  AND temperature = v_temp::NUMERIC(8,2)
+            ) THEN
+                v_height_skipped := v_height_skipped + 1;
+                v_temp := v_temp + p_temperature_step;
+                CONTINUE;
+            END IF;
             
-            -- Замеряем время расчета
-            v_calc_start := clock_timestamp();
+            v_height_total := v_height_total + 1;
+            
+            -- Замеряем время расчета (в режиме sample - каждой p_sample_rate-й точки)
+            v_timed := p_timing_mode = 'point'
+                OR (p_timing_mode = 'sample'
+                    AND (v_total_calculations + v_height_total - 1) % p_sample_rate = 0);
+            
+            IF v_timed THEN
+                v_calc_start := clock_timestamp();
+            END IF;
             
             -- Выполняем расчет с обработкой ошибок
             BEGIN
@@ -102,7 +370,7 @@ BEGIN
                 
                 -- Если расчет успешный, увеличиваем счетчик
                 IF v_calculation_result IS NOT NULL THEN
-                    v_successful_calculations := v_successful_calculations + 1;
+                    v_height_successful := v_height_successful + 1;
                 END IF;
             EXCEPTION 
                 WHEN OTHERS THEN
@@ -110,8 +378,14 @@ BEGIN
                     v_error_msg := SQLERRM;
             END;
             
-            v_calc_end := clock_timestamp();
-            v_calc_time := EXTRACT(EPOCH FROM (v_calc_end - v_calc_start)) * 1000; -- в миллисекундах
+            IF v_timed THEN
+                v_calc_end := clock_timestamp();
+                v_calc_time := EXTRACT(EPOCH FROM (v_calc_end - v_calc_start)) * 1000; -- в миллисекундах
+                v_bucket := public.latency_histogram_bucket(v_calc_time);
+                v_histogram[v_bucket] := v_histogram[v_bucket] + 1;
+            ELSE
+                v_calc_time := NULL;
+            END IF;
             
             -- Сохраняем результат расчета
             INSERT INTO public.interpolation_results (
@@ -135,13 +409,161 @@ BEGIN
                 CASE WHEN v_calculation_result IS NOT NULL THEN v_calculation_result[5] ELSE NULL END,
                 v_calc_time,
                 v_error_msg
-            );
+            )
+            -- Без указания ключа: в режиме unlogged таблица заполняется до
+            -- построения уникального индекса (height, temperature)
+            ON CONFLICT DO NOTHING;
             
             -- Переходим к следующей температуре
             v_temp := v_temp + p_temperature_step;
         END LOOP;
+        
+        -- В режиме batch в гистограмму попадает среднее время точки высоты
+        IF p_timing_mode = 'batch' AND v_height_total > 0 THEN
+            v_calc_time := EXTRACT(EPOCH FROM (clock_timestamp() - v_batch_start)) * 1000 / v_height_total;
+            v_bucket := public.latency_histogram_bucket(v_calc_time);
+            v_histogram[v_bucket] := v_histogram[v_bucket] + v_height_total;
+        END IF;
+        
+        v_total_calculations := v_total_calculations + v_height_total;
+        v_successful_calculations := v_successful_calculations + v_height_successful;
+        v_skipped_calculations := v_skipped_calculations + v_height_skipped;
+        
+        -- Контрольная точка: высота рассчитана для диапазона и шага
+        INSERT INTO public.interpolation_checkpoints (
+            height,
+            min_temperature,
+            max_temperature,
+            temperature_step,
+            total_calculations,
+            successful_calculations,
+            skipped_calculations
+        )
+        VALUES (
+            v_height,
+            p_min_temperature,
+            p_max_temperature,
+            p_temperature_step,
+            v_height_total,
+            v_height_successful,
+            v_height_skipped
+        )
+        ON CONFLICT (height, min_temperature, max_temperature, temperature_step) DO UPDATE
+        SET total_calculations = EXCLUDED.total_calculations,
+            successful_calculations = EXCLUDED.successful_calculations,
+            skipped_calculations = EXCLUDED.skipped_calculations,
+            completed_at = CURRENT_TIMESTAMP;
+        
+        IF p_resume THEN
+            COMMIT;
+        END IF;
     END LOOP;
     
+    p_total_calculations := v_total_calculations;
+    p_successful_calculations := v_successful_calculations;
+    p_total_time_ms := EXTRACT(EPOCH FROM (clock_timestamp() - v_start_time)) * 1000;
+    p_skipped_calculations := v_skipped_calculations;
+    p_latency_histogram := v_histogram;
+END;
+$$;
+
+/**
+ * Хранимая процедура для расчета всех вариантов интерполяции температур
+ * 
+ * Выполняет расчет интерполяции для всех комбинаций:
+ * - высот из таблицы temperature_deviations
+ * - температур в заданном диапазоне с указанным шагом
+ * 
+ * Результаты сохраняются в таблицу interpolation_results
+ * Метрики производительности сохраняются в таблицу interpolation_performance
+ *
+ * p_resume - продолжение прерванного или расширение предыдущего расчета:
+ * предыдущие результаты не очищаются, рассчитываются только отсутствующие
+ * точки, после каждой высоты фиксируется транзакция
+ *
+ * p_timing_mode, p_sample_rate - режим замера времени расчета точки
+ * (см. calculate_interpolations_for_heights); гистограмма времени
+ * сохраняется в interpolation_performance.latency_histogram
+ *
+ * p_storage_mode - режим хранения interpolation_results (см. prepare_interpolation_tables)
+ */
+-- Функция-обертка с сигнатурой (NUMERIC, NUMERIC, NUMERIC, BOOLEAN) не создается:
+-- при параметрах процедуры со значениями по умолчанию любой вызов с четырьмя
+-- аргументами (и CALL, и SELECT) становится неоднозначным, а продолжение расчета
+-- фиксирует транзакцию после каждой высоты, что внутри функции невозможно.
+-- Прежний вызов CALL public.calculate_all_interpolations(мин, макс, шаг, очистка)
+-- выполняется процедурой.
+DROP FUNCTION IF EXISTS public.calculate_all_interpolations(NUMERIC, NUMERIC, NUMERIC, BOOLEAN);
+DROP PROCEDURE IF EXISTS public.calculate_all_interpolations(NUMERIC, NUMERIC, NUMERIC, BOOLEAN);
+DROP PROCEDURE IF EXISTS public.calculate_all_interpolations(NUMERIC, NUMERIC, NUMERIC, BOOLEAN, BOOLEAN);
+DROP PROCEDURE IF EXISTS public.calculate_all_interpolations(NUMERIC, NUMERIC, NUMERIC, BOOLEAN, BOOLEAN, TEXT, INTEGER);
+
+CREATE OR REPLACE PROCEDURE public.calculate_all_interpolations(
+    p_min_temperature NUMERIC DEFAULT -50,
+    p_max_temperature NUMERIC DEFAULT 40,
+    p_temperature_step NUMERIC DEFAULT 0.5,
+    p_clear_previous_results BOOLEAN DEFAULT TRUE,
+    p_resume BOOLEAN DEFAULT FALSE,
+    p_timing_mode TEXT DEFAULT 'point',
+    p_sample_rate INTEGER DEFAULT 100,
+    p_storage_mode TEXT DEFAULT 'default'
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_start_time TIMESTAMP;
+    v_end_time TIMESTAMP;
+    v_total_calculations INTEGER := 0;
+    v_successful_calculations INTEGER := 0;
+    v_skipped_calculations INTEGER := 0;
+    v_heights INTEGER[];
+    v_calculation_time_ms NUMERIC;
+    v_latency_histogram INTEGER[];
+    v_first_result_id INTEGER;
+BEGIN
+    -- Фиксируем время начала выполнения
+    RAISE NOTICE 'Начало расчета интерполяций';
+    RAISE NOTICE 'Параметры: мин. температура = %, макс. температура = %, шаг = %', 
+                 p_min_temperature, p_max_temperature, p_temperature_step;
+    
+    -- Готовим таблицы результатов (с очисткой предыдущих, если требуется)
+    CALL public.prepare_interpolation_tables(p_clear_previous_results AND NOT p_resume, p_storage_mode);
+    
+    -- Строки этого запуска получают id больше текущего наибольшего: по ним
+    -- считаются агрегаты времени, без результатов предыдущих запусков
+    SELECT COALESCE(MAX(id), 0)
+    INTO v_first_result_id
+    FROM public.interpolation_results;
+    
+    -- Фиксируем время начала
+    v_start_time := clock_timestamp();
+    
+    -- Получаем список всех высот
+    SELECT array_agg(height ORDER BY height) 
+    INTO v_heights 
+    FROM public.temperature_deviations;
+    
+    RAISE NOTICE 'Найдено % различных высот для расчета', array_length(v_heights, 1);
+    
+    -- Для каждой высоты и температуры выполняем расчет
+    CALL public.calculate_interpolations_for_heights(
+        v_heights,
+        p_min_temperature,
+        p_max_temperature,
+        p_temperature_step,
+        p_resume,
+        p_timing_mode,
+        p_sample_rate,
+        v_total_calculations,
+        v_successful_calculations,
+        v_calculation_time_ms,
+        v_skipped_calculations,
+        v_latency_histogram
+    );
+    
+    -- Индексы, отложенные до окончания загрузки (режим unlogged)
+    CALL public.finish_interpolation_tables(p_storage_mode);
+    
     -- Фиксируем время окончания
     v_end_time := clock_timestamp();
     
@@ -153,7 +575,8 @@ BEGIN
         avg_calculation_time_ms,
         min_calculation_time_ms,
         max_calculation_time_ms,
-        parameters
+        parameters,
+        latency_histogram
     )
     SELECT
         EXTRACT(EPOCH FROM (v_end_time - v_start_time)) * 1000,
@@ -167,32 +590,487 @@ BEGIN
             'max_temperature', p_max_temperature,
             'temperature_step', p_temperature_step,
             'heights_count', array_length(v_heights, 1),
+            'resume', p_resume,
+            'skipped_calculations', v_skipped_calculations,
+            'timing_mode', p_timing_mode,
+            'sample_rate', CASE WHEN p_timing_mode = 'sample' THEN p_sample_rate END,
+            'storage_mode', p_storage_mode,
             'calculation_date', NOW()::TEXT
-        )
+        ),
+        v_latency_histogram
     FROM
-        public.interpolation_results;
+        public.interpolation_results
+    WHERE
+        id > v_first_result_id;
     
     -- Выводим сводную информацию
     RAISE NOTICE 'Расчет интерполяций завершен:';
     RAISE NOTICE '  Всего выполнено расчетов: %', v_total_calculations;
     RAISE NOTICE '  Успешных расчетов: %', v_successful_calculations;
+    RAISE NOTICE '  Пропущено уже рассчитанных точек: %', v_skipped_calculations;
     RAISE NOTICE '  Общее время выполнения: % мс', EXTRACT(EPOCH FROM (v_end_time - v_start_time)) * 1000;
 END;
 $$;
 
--- Создаем функцию в схеме public для обеспечения совместимости
-CREATE OR REPLACE FUNCTION public.calculate_all_interpolations(
+/**
+ * Множественная (set-based) версия расчета всех вариантов интерполяции
+ *
+ * Логика расчета совпадает с calculate_temperature_deviation, но вместо цикла
+ * с вызовом функции и подтранзакцией на каждую точку вся сетка строится одним
+ * запросом:
+ * - температуры генерируются generate_series и перемножаются с высотами
+ *   из таблицы temperature_deviations
+ * - значения отклонений для десятков и единиц находятся соединением
+ *   с развернутыми столбцами dev_N таблиц отклонений
+ * - результаты каждой высоты записываются одним INSERT ... SELECT
+ *
+ * Время расчета отдельной точки при таком подходе не измеряется, поэтому
+ * calculation_time в interpolation_results не заполняется, а в
+ * interpolation_performance записывается только среднее время на точку
+ * (минимум, максимум и гистограмма времени не заполняются).
+ *
+ * p_resume - предыдущие результаты не очищаются, в запрос попадают только
+ * точки сетки, отсутствующие в interpolation_results; после каждой высоты
+ * выполняется COMMIT, поэтому прерванный расчет не теряет записанные высоты
+ * (процедура должна вызываться через CALL вне явной транзакции).
+ *
+ * p_storage_mode - режим хранения interpolation_results (см. prepare_interpolation_tables)
+ */
+DROP PROCEDURE IF EXISTS public.calculate_all_interpolations_set(NUMERIC, NUMERIC, NUMERIC, BOOLEAN);
+DROP PROCEDURE IF EXISTS public.calculate_all_interpolations_set(NUMERIC, NUMERIC, NUMERIC, BOOLEAN, BOOLEAN);
+
+CREATE OR REPLACE PROCEDURE public.calculate_all_interpolations_set(
     p_min_temperature NUMERIC DEFAULT -50,
     p_max_temperature NUMERIC DEFAULT 40,
     p_temperature_step NUMERIC DEFAULT 0.5,
+    p_clear_previous_results BOOLEAN DEFAULT TRUE,
+    p_resume BOOLEAN DEFAULT FALSE,
+    p_storage_mode TEXT DEFAULT 'default'
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_start_time TIMESTAMP;
+    v_end_time TIMESTAMP;
+    v_total_calculations INTEGER := 0;
+    v_successful_calculations INTEGER := 0;
+    v_height_total INTEGER;
+    v_height_successful INTEGER;
+    v_height INTEGER;
+    v_heights_count INTEGER;
+    v_total_time_ms NUMERIC;
+    v_point_time_ms NUMERIC;
+BEGIN
+    RAISE NOTICE 'Начало множественного расчета интерполяций';
+    RAISE NOTICE 'Параметры: мин. температура = %, макс. температура = %, шаг = %',
+                 p_min_temperature, p_max_temperature, p_temperature_step;
+
+    IF p_temperature_step <= 0 THEN
+        RAISE EXCEPTION 'Шаг температуры должен быть положительным: %', p_temperature_step;
+    END IF;
+
+    -- Готовим таблицы результатов (с очисткой предыдущих, если требуется)
+    CALL public.prepare_interpolation_tables(p_clear_previous_results AND NOT p_resume, p_storage_mode);
+
+    -- Фиксируем время начала
+    v_start_time := clock_timestamp();
+
+    SELECT COUNT(*)
+    INTO v_heights_count
+    FROM public.temperature_deviations;
+
+    RAISE NOTICE 'Найдено % различных высот для расчета', v_heights_count;
+
+    -- Высоты рассчитываются по одной: в режиме продолжения каждая фиксируется отдельно
+    FOR v_height IN SELECT height FROM public.temperature_deviations ORDER BY height LOOP
+        WITH deviation_points AS (
+            -- Столбцы dev_N таблиц отклонений высоты в виде строк (высота, знак, значение, отклонение)
+            SELECT d.height, FALSE AS is_positive, v.value, v.deviation
+            FROM public.temperature_deviations AS d
+            CROSS JOIN LATERAL (VALUES
+                (1, d.dev_1), (2, d.dev_2), (3, d.dev_3), (4, d.dev_4), (5, d.dev_5),
+                (6, d.dev_6), (7, d.dev_7), (8, d.dev_8), (9, d.dev_9), (10, d.dev_10),
+                (20, d.dev_20), (30, d.dev_30), (40, d.dev_40), (50, d.dev_50)
+            ) AS v(value, deviation)
+            WHERE d.height = v_height
+            UNION ALL
+            -- Для положительных температур значения 40 и 50 не используются
+            SELECT p.height, TRUE AS is_positive, v.value, v.deviation
+            FROM public.temperature_deviations_plus AS p
+            CROSS JOIN LATERAL (VALUES
+                (1, p.dev_1), (2, p.dev_2), (3, p.dev_3), (4, p.dev_4), (5, p.dev_5),
+                (6, p.dev_6), (7, p.dev_7), (8, p.dev_8), (9, p.dev_9), (10, p.dev_10),
+                (20, p.dev_20), (30, p.dev_30)
+            ) AS v(value, deviation)
+            WHERE p.height = v_height
+        ),
+        grid AS (
+            -- Сетка температур высоты
+            SELECT
+                h.height,
+                t.temperature,
+                t.temperature >= 0 AS is_positive,
+                CASE
+                    WHEN t.temperature < 0 THEN GREATEST(FLOOR(t.temperature / 10) * 10, -50)
+                    ELSE FLOOR(t.temperature / 10) * 10
+                END::INTEGER AS tens
+            FROM public.temperature_deviations AS h
+            CROSS JOIN LATERAL (
+                SELECT p_min_temperature + i * p_temperature_step AS temperature
+                FROM generate_series(
+                    0,
+                    FLOOR((p_max_temperature - p_min_temperature) / p_temperature_step)::INTEGER
+                ) AS i
+            ) AS t
+            WHERE h.height = v_height
+              -- В режиме продолжения рассчитываются только отсутствующие точки
+              AND (NOT p_resume
+                   OR NOT EXISTS (
+                        SELECT 1
+                        FROM public.interpolation_results AS r
+                        WHERE r.height = h.height
+                          AND r.temperature = t.temperature::NUMERIC(8,2)
+                   ))
+        ),
+        parts AS (
+            -- Разложение температуры на десятки и единицы
+            SELECT
+                g.height,
+                g.temperature,
+                g.is_positive,
+                ABS(g.tens) AS tens_value,
+                ABS(g.temperature - g.tens)::INTEGER AS ones_value
+            FROM grid AS g
+        ),
+        calculated AS (
+            SELECT
+                p.height,
+                p.temperature,
+                p.tens_value,
+                p.ones_value,
+                dt.deviation AS dev_tens,
+                d1.deviation AS dev_ones,
+                CASE
+                    WHEN p.is_positive THEN dt.deviation + d1.deviation
+                    ELSE ABS(dt.deviation + d1.deviation) + 50
+                END AS result_value
+            FROM parts AS p
+            LEFT JOIN deviation_points AS dt
+                ON dt.height = p.height AND dt.is_positive = p.is_positive AND dt.value = p.tens_value
+            LEFT JOIN deviation_points AS d1
+                ON d1.height = p.height AND d1.is_positive = p.is_positive AND d1.value = p.ones_value
+        ),
+        inserted AS (
+            INSERT INTO public.interpolation_results (
+                height,
+                temperature,
+                tens_value,
+                ones_value,
+                dev_tens,
+                dev_ones,
+                result_value
+            )
+            SELECT
+                c.height,
+                c.temperature,
+                CASE WHEN c.result_value IS NOT NULL THEN c.tens_value END,
+                CASE WHEN c.result_value IS NOT NULL THEN c.ones_value END,
+                CASE WHEN c.result_value IS NOT NULL THEN c.dev_tens END,
+                CASE WHEN c.result_value IS NOT NULL THEN c.dev_ones END,
+                c.result_value
+            FROM calculated AS c
+            ORDER BY c.height, c.temperature
+            ON CONFLICT DO NOTHING
+            RETURNING result_value
+        )
+        SELECT COUNT(*), COUNT(result_value)
+        INTO v_height_total, v_height_successful
+        FROM inserted;
+
+        v_total_calculations := v_total_calculations + v_height_total;
+        v_successful_calculations := v_successful_calculations + v_height_successful;
+
+        IF p_resume THEN
+            COMMIT;
+        END IF;
+    END LOOP;
+
+    -- Индексы, отложенные до окончания загрузки (режим unlogged)
+    CALL public.finish_interpolation_tables(p_storage_mode);
+
+    -- Фиксируем время окончания
+    v_end_time := clock_timestamp();
+    v_total_time_ms := EXTRACT(EPOCH FROM (v_end_time - v_start_time)) * 1000;
+    v_point_time_ms := v_total_time_ms / NULLIF(v_total_calculations, 0);
+
+    -- Записываем метрики производительности
+    INSERT INTO public.interpolation_performance (
+        total_time_ms,
+        total_calculations,
+        successful_calculations,
+        avg_calculation_time_ms,
+        min_calculation_time_ms,
+        max_calculation_time_ms,
+        parameters,
+        latency_histogram
+    )
+    VALUES (
+        v_total_time_ms,
+        v_total_calculations,
+        v_successful_calculations,
+        v_point_time_ms,
+        NULL,
+        NULL,
+        jsonb_build_object(
+            'min_temperature', p_min_temperature,
+            'max_temperature', p_max_temperature,
+            'temperature_step', p_temperature_step,
+            'heights_count', v_heights_count,
+            'engine', 'sql-set',
+            'resume', p_resume,
+            'timing_mode', 'batch',
+            'storage_mode', p_storage_mode,
+            'calculation_date', NOW()::TEXT
+        ),
+        NULL
+    );
+
+    -- Выводим сводную информацию
+    RAISE NOTICE 'Множественный расчет интерполяций завершен:';
+    RAISE NOTICE '  Всего выполнено расчетов: %', v_total_calculations;
+    RAISE NOTICE '  Успешных расчетов: %', v_successful_calculations;
+    RAISE NOTICE '  Общее время выполнения: % мс', v_total_time_ms;
+END;
+$$;
+
+/**
+ * Удаление результатов одной высоты
+ *
+ * Если у высоты есть собственная секция (режим partitioned), секция
+ * очищается TRUNCATE без построчного удаления, иначе строки удаляются
+ * DELETE. Возвращает количество удаленных строк.
+ */
+CREATE OR REPLACE FUNCTION public.clear_interpolation_height(p_height INTEGER)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_partition REGCLASS;
+    v_deleted BIGINT;
+BEGIN
+    SELECT t.relid
+    INTO v_partition
+    FROM pg_partition_tree('public.interpolation_results') AS t
+    JOIN pg_class AS c ON c.oid = t.relid
+    WHERE t.isleaf
+      AND t.level > 0
+      AND pg_get_expr(c.relpartbound, c.oid) = format('FOR VALUES IN (%s)', p_height);
+
+    IF v_partition IS NULL THEN
+        DELETE FROM public.interpolation_results WHERE height = p_height;
+        GET DIAGNOSTICS v_deleted = ROW_COUNT;
+        RETURN v_deleted;
+    END IF;
+
+    EXECUTE format('SELECT COUNT(*) FROM %s', v_partition) INTO v_deleted;
+    EXECUTE format('TRUNCATE %s', v_partition);
+    RETURN v_deleted;
+END;
+$$;
+
+/**
+ * Уведомление об изменении таблиц температурных отклонений (режим watch)
+ *
+ * Отправляет в канал temperature_deviation_changes JSON с таблицей, операцией,
+ * старой и новой высотой и списком изменившихся столбцов dev_N (только для UPDATE).
+ * Изменения, не затрагивающие высоту и столбцы dev_N (например, updated_at),
+ * не отправляются. TRUNCATE отправляется без высот - затронуты все высоты.
+ */
+CREATE OR REPLACE FUNCTION public.notify_temperature_deviation_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_old_height INTEGER;
+    v_new_height INTEGER;
+    v_columns TEXT[];
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_old_height := OLD.height;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_new_height := NEW.height;
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(n.key ORDER BY n.key)
+        INTO v_columns
+        FROM jsonb_each(to_jsonb(NEW)) AS n
+        INNER JOIN jsonb_each(to_jsonb(OLD)) AS o ON o.key = n.key
+        WHERE n.key LIKE 'dev\_%'
+          AND n.value IS DISTINCT FROM o.value;
+
+        IF v_columns IS NULL AND v_old_height = v_new_height THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    PERFORM pg_notify('temperature_deviation_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'old_height', v_old_height,
+        'new_height', v_new_height,
+        'columns', v_columns,
+        'sent_at', clock_timestamp()
+    )::TEXT);
+    RETURN NULL;
+END;
+$$;
+
+/**
+ * Установка триггеров уведомлений на таблицы температурных отклонений
+ *
+ * Вызывается режимом watch (interpolatetion.py watch) при запуске; повторный
+ * вызов пересоздает триггеры.
+ */
+CREATE OR REPLACE PROCEDURE public.install_temperature_deviation_watch()
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    CREATE OR REPLACE TRIGGER temperature_deviations_watch
+        AFTER INSERT OR UPDATE OR DELETE ON public.temperature_deviations
+        FOR EACH ROW EXECUTE FUNCTION public.notify_temperature_deviation_change();
+    CREATE OR REPLACE TRIGGER temperature_deviations_watch_truncate
+        AFTER TRUNCATE ON public.temperature_deviations
+        FOR EACH STATEMENT EXECUTE FUNCTION public.notify_temperature_deviation_change();
+
+    CREATE OR REPLACE TRIGGER temperature_deviations_plus_watch
+        AFTER INSERT OR UPDATE OR DELETE ON public.temperature_deviations_plus
+        FOR EACH ROW EXECUTE FUNCTION public.notify_temperature_deviation_change();
+    CREATE OR REPLACE TRIGGER temperature_deviations_plus_watch_truncate
+        AFTER TRUNCATE ON public.temperature_deviations_plus
+        FOR EACH STATEMENT EXECUTE FUNCTION public.notify_temperature_deviation_change();
+END;
+$$;
+
+/**
+ * Процедура подготовки таблиц перебора параметров процедур поправок (sweep.py)
+ *
+ * sweep_results - результат каждого вызова перебора: поправки по высотам
+ * массивами в порядке, возвращаемом процедурой; calculation_time не заполняется
+ * для значений, взятых из кеша повторяющихся входных данных.
+ * sweep_performance повторяет interpolation_performance и при очистке
+ * результатов не удаляется.
+ */
+CREATE OR REPLACE PROCEDURE public.prepare_sweep_tables(
     p_clear_previous_results BOOLEAN DEFAULT TRUE
-) RETURNS VOID AS $$
+)
+LANGUAGE plpgsql
+AS $$
 BEGIN
-    CALL public.calculate_all_interpolations(
-        p_min_temperature,
-        p_max_temperature,
-        p_temperature_step,
-        p_clear_previous_results
+    CREATE TABLE IF NOT EXISTS public.sweep_performance (
+        id SERIAL PRIMARY KEY,
+        total_time_ms NUMERIC(10,3),
+        total_calculations INTEGER,
+        successful_calculations INTEGER,
+        avg_calculation_time_ms NUMERIC(10,3),
+        min_calculation_time_ms NUMERIC(10,3),
+        max_calculation_time_ms NUMERIC(10,3),
+        parameters JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        latency_histogram INTEGER[] -- см. latency_histogram_bucket
+    );
+
+    CREATE TABLE IF NOT EXISTS public.sweep_results (
+        sweep_id INTEGER NOT NULL,
+        measurement_type_id INTEGER,
+        parameter NUMERIC(10,2),
+        heights INTEGER[],
+        deviations INTEGER[],
+        wind_deviations INTEGER[],
+        calculation_time NUMERIC(10,3), -- в миллисекундах
+        cached BOOLEAN NOT NULL DEFAULT FALSE,
+        error_message TEXT DEFAULT NULL
     );
+
+    CREATE INDEX IF NOT EXISTS idx_sweep_results_sweep ON public.sweep_results(sweep_id);
+
+    IF p_clear_previous_results THEN
+        TRUNCATE public.sweep_results;
+    END IF;
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$;
+
+/**
+ * Пакетный вызов процедуры поправок для перебора параметров
+ *
+ * p_target - temperature (sp_calc_temperature_deviation, параметр -
+ * поправка к температуре) или wind (sp_calc_wind_speed_deviation, параметр -
+ * дальность до разрыва); параметры и типы устройств передаются массивами
+ * одинаковой длины, процедура вызывается для каждой пары.
+ * Для каждого вызова возвращается его номер (с 1), поправки по высотам,
+ * время вызова (мс) и текст ошибки. Таблицы процедур выводятся через
+ * RAISE NOTICE, поэтому на время функции уведомления отключены.
+ */
+CREATE OR REPLACE FUNCTION public.sweep_correction_procedure(
+    p_target TEXT,
+    p_parameters NUMERIC[],
+    p_measurement_type_ids INTEGER[]
+)
+RETURNS TABLE (
+    ordinal INTEGER,
+    heights INTEGER[],
+    deviations INTEGER[],
+    wind_deviations INTEGER[],
+    calculation_time NUMERIC,
+    error_message TEXT
+)
+LANGUAGE plpgsql
+SET client_min_messages = warning
+AS $$
+DECLARE
+    v_temperature public.temperature_correction[];
+    v_wind public.wind_direction_correction[];
+    v_calc_start TIMESTAMP;
+BEGIN
+    IF p_target NOT IN ('temperature', 'wind') THEN
+        RAISE EXCEPTION 'Неизвестная процедура перебора: %', p_target;
+    END IF;
+
+    FOR i IN 1 .. COALESCE(array_length(p_parameters, 1), 0) LOOP
+        ordinal := i;
+        heights := NULL;
+        deviations := NULL;
+        wind_deviations := NULL;
+        error_message := NULL;
+        v_temperature := NULL;
+        v_wind := NULL;
+
+        v_calc_start := clock_timestamp();
+        BEGIN
+            IF p_target = 'temperature' THEN
+                CALL public.sp_calc_temperature_deviation(p_parameters[i], p_measurement_type_ids[i], v_temperature);
+            ELSE
+                CALL public.sp_calc_wind_speed_deviation(p_parameters[i], p_measurement_type_ids[i], v_wind);
+            END IF;
+        EXCEPTION
+            WHEN OTHERS THEN
+                error_message := SQLERRM;
+        END;
+        calculation_time := EXTRACT(EPOCH FROM (clock_timestamp() - v_calc_start)) * 1000; -- в миллисекундах
+
+        IF p_target = 'temperature' THEN
+            SELECT array_agg(c.height ORDER BY c.n), array_agg(c.temperature_deviation ORDER BY c.n)
+            INTO heights, deviations
+            FROM unnest(v_temperature) WITH ORDINALITY AS c(calc_height_id, height, temperature_deviation, n);
+        ELSE
+            SELECT array_agg(c.height ORDER BY c.n), array_agg(c.wind_speed_deviation ORDER BY c.n),
+                   array_agg(c.wind_deviation ORDER BY c.n)
+            INTO heights, deviations, wind_deviations
+            FROM unnest(v_wind) WITH ORDINALITY AS c(calc_height_id, height, wind_speed_deviation, wind_deviation, n);
+        END IF;
+
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
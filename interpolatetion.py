@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import psycopg2
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
 import time
+
+# Момент запуска приложения (NumPy, pandas и matplotlib импортируются при первом использовании)
+START_TIME = time.perf_counter()
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
 import os
+import hashlib
 import json
+import re
+import select
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 import argparse
 import sys
 
@@ -26,13 +36,142 @@ DEFAULT_SETTINGS = {
     "min_temperature": -20,  # Ограничим для демонстрации
     "max_temperature": 20,
     "temperature_step": 1.0,
-    "clear_previous_results": True
+    "clear_previous_results": True,
+    "resume": False,
+    "engine": "procedure",
+    "copy_format": "binary",
+    "workers": 1,
+    "instrument": False,
+    "timing_mode": "point",
+    "sample_rate": 100,
+    "storage_mode": "default",
+    "measure_storage": False
+}
+
+# Доступные движки расчета интерполяций
+ENGINES = ["procedure", "numpy", "sql-set"]
+
+# Режимы замера времени расчета точки процедурой (см. calculate_interpolations_for_heights)
+TIMING_MODES = ["point", "sample", "batch"]
+
+# Движки, не измеряющие время расчета отдельной точки: гистограмма времени не сохраняется,
+# перцентили не выводятся, сравнение времени точки в истории не выполняется
+UNTIMED_ENGINES = ["numpy", "sql-set"]
+
+# Режимы хранения таблицы interpolation_results (см. prepare_interpolation_tables)
+STORAGE_MODES = ["default", "unlogged", "partitioned", "brin"]
+
+# Запросы анализа, время выполнения которых на сервере замеряется после расчета
+# для сравнения режимов хранения: имя -> (описание, запрос)
+STORAGE_QUERIES = {
+    "height": ("выборка одной высоты",
+               "SELECT COUNT(*), AVG(result_value) FROM snaart.interpolation_results WHERE height = %(height)s"),
+    "temperature": ("диапазон температур",
+                    "SELECT COUNT(*), AVG(result_value) FROM snaart.interpolation_results "
+                    "WHERE temperature BETWEEN %(low)s AND %(high)s"),
+    "aggregate": ("агрегаты по высотам",
+                  "SELECT height, COUNT(*), AVG(calculation_time) FROM snaart.interpolation_results GROUP BY height")
+}
+STORAGE_QUERY_REPEATS = 5
+
+# Логарифмическая гистограмма времени расчета точки (см. latency_histogram_bucket):
+# корзина 1 - меньше 1 мкс, далее по 4 корзины на каждое удвоение времени
+LATENCY_HISTOGRAM_SIZE = 100
+LATENCY_BUCKETS_PER_OCTAVE = 4
+
+# Хранимые процедуры, реализующие серверные движки расчета
+ENGINE_PROCEDURES = {
+    "procedure": "calculate_all_interpolations",
+    "sql-set": "calculate_all_interpolations_set"
+}
+
+# Уведомления процедуры, по которым отслеживается ход расчета
+HEIGHTS_NOTICE_RE = re.compile(r"Найдено (\d+) различных высот")
+HEIGHT_NOTICE_RE = re.compile(r"Обработка высоты: (-?\d+) м")
+SKIPPED_HEIGHT_NOTICE_RE = re.compile(r"Высота (-?\d+) м уже рассчитана")
+
+# Столбцы interpolation_results для потокового чтения: выражение SQL и тип массива NumPy.
+# Столбцы, допускающие NULL, читаются как float64 (NULL -> NaN)
+READER_COLUMNS = {
+    "id": ("id", "int32"),
+    "height": ("height", "int32"),
+    "temperature": ("temperature::float8", "float64"),
+    "tens_value": ("tens_value::float8", "float64"),
+    "ones_value": ("ones_value::float8", "float64"),
+    "dev_tens": ("dev_tens::float8", "float64"),
+    "dev_ones": ("dev_ones::float8", "float64"),
+    "result_value": ("result_value::float8", "float64"),
+    "calculation_time": ("calculation_time::float8", "float64")
 }
 
+# Размер порции при потоковом чтении результатов
+DEFAULT_CHUNK_SIZE = 100000
+
+# Локальный кеш результатов для повторного анализа без запросов к базе данных (см. result_cache.py)
+DEFAULT_RESULT_CACHE_DIR = "result_cache"
+DEFAULT_RESULT_CACHE_SIZE_MB = 1024
+
+# Перцентили времени расчета точки
+TIME_PERCENTILES = [50, 90, 99, 99.9]
+
+# Команды приложения: расчет с анализом, просмотр истории запусков, отчеты об ошибках измерений,
+# пакетный расчет заголовков метео приближенного и пересчет по изменениям таблиц отклонений
+COMMANDS = ["run", "history", "report", "headers", "watch"]
+
+# Настройки сервера, сохраняемые в истории запусков
+HISTORY_SERVER_SETTINGS = [
+    "shared_buffers", "work_mem", "effective_cache_size", "max_parallel_workers_per_gather",
+    "jit", "synchronous_commit", "fsync", "wal_level", "random_page_cost"
+]
+
+# Параметры анализа истории запусков по умолчанию
+DEFAULT_HISTORY_LIMIT = 50
+DEFAULT_SIGNIFICANCE = 0.01
+DEFAULT_MIN_SLOWDOWN = 0.10
+
+# Проверки fn_check_input_params: столбец и ключи границ в measurment_settings
+REPORT_CHECKS = [
+    ("temperature", "min_temperature", "max_temperature"),
+    ("pressure", "min_pressure", "max_pressure"),
+    ("height", "min_height", "max_height"),
+    ("wind_direction", "min_wind_direction", "max_wind_direction")
+]
+
+# Ошибка fn_check_input_params для температуры вне диапазона (format() со спецификатором '% ')
+REPORT_CHECK_FORMAT_ERROR = 'unrecognized format() type specifier " "'
+
+# Столбцы результата пакетного расчета заголовков (команда headers)
+HEADER_COLUMNS = [
+    ("measurment_input_param_id", "INTEGER"),
+    ("pressure_deviation", "NUMERIC(8,2)"),
+    ("temperature_deviation", "NUMERIC(8,2)"),
+    ("header", "TEXT"),
+    ("temperature_error", "TEXT"),
+    ("header_error", "TEXT")
+]
+
+# Таблица результата команды headers по умолчанию
+DEFAULT_HEADERS_TABLE = "snaart.meteo_avg_headers"
+DEFAULT_HEADERS_VERIFY = 200
+
+# Канал уведомлений об изменении таблиц отклонений (команда watch)
+WATCH_CHANNEL = "temperature_deviation_changes"
+
+# Ожидание следующих уведомлений той же пачки изменений, с
+WATCH_DEBOUNCE_SECONDS = 0.05
+
+# Значения температур, для которых в таблицах отклонений есть столбцы dev_N
+DEVIATION_COLUMNS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 20, 30, 40, 50]
+
 
 def parse_arguments():
     """Обработка аргументов командной строки"""
     parser = argparse.ArgumentParser(description='Анализ производительности интерполяций метеоданных')
+    parser.add_argument('command', nargs='?', choices=COMMANDS, default='run',
+                        help='run - расчет и анализ (по умолчанию), history - история запусков и поиск замедлений, '
+                             'report - отчеты об ошибках измерений, '
+                             'headers - заголовки метео приближенного по всем измерениям, '
+                             'watch - пересчет результатов при изменении таблиц отклонений')
 
     # Параметры базы данных
     db_group = parser.add_argument_group('Параметры базы данных')
@@ -51,18 +190,92 @@ def parse_arguments():
     calc_group.add_argument('--step', type=float,
                             help=f'Шаг температуры (по умолчанию: {DEFAULT_SETTINGS["temperature_step"]})')
     calc_group.add_argument('--keep-previous', action='store_true', help='Сохранять предыдущие результаты')
+    calc_group.add_argument('--resume', action='store_true',
+                            help='Продолжить прерванный или расширить предыдущий расчет: рассчитываются только '
+                                 'отсутствующие точки, предыдущие результаты сохраняются')
+    calc_group.add_argument('--engine', choices=ENGINES,
+                            help=f'Движок расчета (по умолчанию: {DEFAULT_SETTINGS["engine"]})')
+    calc_group.add_argument('--workers', type=int,
+                            help='Количество параллельных соединений для процедуры расчета, '
+                                 f'высоты делятся между ними (по умолчанию: {DEFAULT_SETTINGS["workers"]})')
+    calc_group.add_argument('--timing-mode', choices=TIMING_MODES,
+                            help='Замер времени процедурой: point - каждая точка, sample - каждая N-я точка, '
+                                 f'batch - высота целиком (по умолчанию: {DEFAULT_SETTINGS["timing_mode"]})')
+    calc_group.add_argument('--sample-rate', type=int,
+                            help=f'N для режима замера sample (по умолчанию: {DEFAULT_SETTINGS["sample_rate"]})')
+    calc_group.add_argument('--instrument', action='store_true',
+                            help='Снимать статистику сервера (pg_stat_statements, pg_stat_database, pg_stat_wal, '
+                                 'pg_statio_user_tables) до и после расчета и сохранять разницу')
+    calc_group.add_argument('--copy-format', choices=['binary', 'text'],
+                            help=f'Формат COPY при массовой записи результатов '
+                                 f'(по умолчанию: {DEFAULT_SETTINGS["copy_format"]})')
+    calc_group.add_argument('--storage-mode', choices=STORAGE_MODES,
+                            help='Хранение interpolation_results: default - индексы B-дерева до загрузки, '
+                                 'unlogged - нежурналируемая таблица с построением индексов после загрузки, '
+                                 'partitioned - секции по высотам, brin - индекс BRIN по температуре; '
+                                 'смена режима требует очистки результатов '
+                                 f'(по умолчанию: {DEFAULT_SETTINGS["storage_mode"]})')
+    calc_group.add_argument('--measure-storage', action='store_true',
+                            help='После расчета замерить размер interpolation_results, объем WAL и время '
+                                 'запросов анализа (ANALYZE и EXPLAIN ANALYZE); включается и явным --storage-mode')
 
     # Параметры вывода
     vis_group = parser.add_argument_group('Параметры вывода')
     vis_group.add_argument('--output-dir', default='performance_results', help='Директория для сохранения результатов')
     vis_group.add_argument('--no-plots', action='store_true', help='Не создавать графики')
     vis_group.add_argument('--dpi', type=int, default=300, help='DPI для сохранения графиков')
+    vis_group.add_argument('--percentiles', action='store_true',
+                           help='Рассчитать точные перцентили времени расчета по всем результатам')
+    vis_group.add_argument('--export-csv', help='Потоковая выгрузка interpolation_results в CSV-файл')
+    vis_group.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                           help=f'Размер порции строк при потоковом чтении результатов '
+                                f'(по умолчанию: {DEFAULT_CHUNK_SIZE})')
+    vis_group.add_argument('--progress-log',
+                           help='Файл JSON-lines для записи хода расчета (скорость, ETA по высотам)')
+    vis_group.add_argument('--result-cache', action='store_true',
+                           help='Сохранять результаты и агрегаты в локальный кеш для повторного анализа '
+                                '(при первом запуске - дополнительное чтение результатов и запись на диск)')
+    vis_group.add_argument('--result-cache-dir', default=DEFAULT_RESULT_CACHE_DIR,
+                           help=f'Каталог локального кеша результатов (по умолчанию: {DEFAULT_RESULT_CACHE_DIR})')
+    vis_group.add_argument('--result-cache-size', type=int, default=DEFAULT_RESULT_CACHE_SIZE_MB,
+                           help='Ограничение размера кеша результатов, МБ; давно не использованные записи '
+                                f'удаляются (по умолчанию: {DEFAULT_RESULT_CACHE_SIZE_MB})')
+
+    # Параметры истории запусков
+    history_group = parser.add_argument_group('Параметры истории запусков (команда history)')
+    history_group.add_argument('--history-limit', type=int, default=DEFAULT_HISTORY_LIMIT,
+                               help=f'Количество последних запусков для анализа (по умолчанию: {DEFAULT_HISTORY_LIMIT})')
+    history_group.add_argument('--significance', type=float, default=DEFAULT_SIGNIFICANCE,
+                               help=f'Уровень значимости теста Уэлча (по умолчанию: {DEFAULT_SIGNIFICANCE})')
+    history_group.add_argument('--min-slowdown', type=float, default=DEFAULT_MIN_SLOWDOWN,
+                               help=f'Минимальное замедление (доля), считающееся регрессией '
+                                    f'(по умолчанию: {DEFAULT_MIN_SLOWDOWN})')
+
+    # Параметры пакетного расчета заголовков
+    headers_group = parser.add_argument_group('Параметры расчета заголовков (команда headers)')
+    headers_group.add_argument('--headers-table', default=DEFAULT_HEADERS_TABLE,
+                               help=f'Таблица для записи заголовков через COPY (по умолчанию: {DEFAULT_HEADERS_TABLE}); '
+                                    'с --keep-previous строки добавляются к имеющимся')
+    headers_group.add_argument('--headers-file', help='Записать заголовки в CSV-файл вместо таблицы')
+    headers_group.add_argument('--headers-verify', type=int, default=DEFAULT_HEADERS_VERIFY,
+                               help='Случайных строк для сверки с функциями fn_calc_header_*; 0 - без сверки '
+                                    f'(по умолчанию: {DEFAULT_HEADERS_VERIFY})')
+
+    # Параметры отслеживания изменений
+    watch_group = parser.add_argument_group('Параметры отслеживания изменений (команда watch)')
+    watch_group.add_argument('--watch-duration', type=float, default=0,
+                             help='Длительность отслеживания, с; 0 - до прерывания (по умолчанию: 0). '
+                                  'Пересчеты записываются в --progress-log, если он указан')
 
     # Дополнительные параметры
     parser.add_argument('--skip-calculation', action='store_true', help='Пропустить расчет, только визуализация')
     parser.add_argument('--verbose', action='store_true', help='Подробный вывод')
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    # Высоты между соединениями делит только процедура; другие движки работают в одном соединении
+    if args.workers and args.workers > 1 and (args.engine or DEFAULT_SETTINGS["engine"]) != 'procedure':
+        parser.error(f"--workers поддерживается только движком procedure, не {args.engine}")
+    return args
 
 
 def get_config(args):
@@ -81,10 +294,31 @@ def get_config(args):
     if args.max_temp is not None: calc_settings["max_temperature"] = args.max_temp
     if args.step is not None: calc_settings["temperature_step"] = args.step
     if args.keep_previous: calc_settings["clear_previous_results"] = False
+    if args.resume:
+        calc_settings["resume"] = True
+        calc_settings["clear_previous_results"] = False
+    if args.engine: calc_settings["engine"] = args.engine
+    if args.copy_format: calc_settings["copy_format"] = args.copy_format
+    if args.workers: calc_settings["workers"] = max(args.workers, 1)
+    if args.instrument: calc_settings["instrument"] = True
+    if args.timing_mode: calc_settings["timing_mode"] = args.timing_mode
+    if args.sample_rate: calc_settings["sample_rate"] = max(args.sample_rate, 1)
+    if args.storage_mode: calc_settings["storage_mode"] = args.storage_mode
+    # Замер хранения дорогой (ANALYZE и повторные запросы по всей таблице) - только по запросу
+    if args.measure_storage or args.storage_mode: calc_settings["measure_storage"] = True
 
     return db_config, calc_settings
 
 
+def load_parameters(raw):
+    """Разбор JSON-параметров расчета (psycopg2 может вернуть уже разобранный dict)"""
+    if not raw:
+        return {}
+    if isinstance(raw, dict):
+        return raw
+    return json.loads(raw)
+
+
 def print_header(title):
     """Печать красивого заголовка в консоль"""
     width = 80
@@ -107,72 +341,1325 @@ def connect_to_db(config):
         return None
 
 
-def run_interpolation_procedure(conn, settings, verbose=False):
-    """Запуск хранимой процедуры для расчета интерполяций"""
-    print_header("РАСЧЕТ ИНТЕРПОЛЯЦИЙ")
-
+def print_calculation_settings(settings):
+    """Вывод параметров расчета интерполяций"""
     print("Параметры расчета:")
+    print(f"- Движок расчета: {settings['engine']}")
     print(f"- Диапазон температур: от {settings['min_temperature']} до {settings['max_temperature']} °C")
     print(f"- Шаг расчета: {settings['temperature_step']} °C")
     print(f"- Очистка предыдущих результатов: {'Да' if settings['clear_previous_results'] else 'Нет'}")
+    if settings['resume']:
+        print("- Режим продолжения: рассчитываются только отсутствующие точки")
+    if settings['workers'] > 1:
+        print(f"- Параллельных соединений: {settings['workers']}")
+    if settings['storage_mode'] != 'default':
+        print(f"- Хранение результатов: {settings['storage_mode']}")
+    if settings['engine'] == 'procedure':
+        timing = {
+            "point": "каждая точка",
+            "sample": f"каждая {settings['sample_rate']}-я точка",
+            "batch": "высота целиком"
+        }[settings['timing_mode']]
+        print(f"- Замер времени: {timing}")
+
+
+class ProgressTracker:
+    """
+    Отслеживание хода расчета по уведомлениям процедуры
+
+    Процедура сообщает через RAISE NOTICE количество высот, начало обработки
+    каждой высоты и пропуск высот, уже рассчитанных в режиме продолжения.
+    По этим уведомлениям оцениваются число рассчитанных точек, скорость и
+    оставшееся время; пропущенные высоты в оценку не входят. Если задан
+    log_path, показатели каждой завершенной высоты пишутся в файл JSON-lines,
+    чтобы видеть, замедляется ли расчет по мере роста таблицы.
+    """
+
+    def __init__(self, points_per_height, log_path=None):
+        self.points_per_height = points_per_height
+        self.heights_total = None
+        self.heights_started = 0
+        self.heights_skipped = 0
+        self.current_height = None
+        self.finished = False
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+        self.log_file = open(log_path, "a", encoding="utf-8") if log_path else None
+
+    def handle_notice(self, notice):
+        """Разбор уведомления процедуры"""
+        match = HEIGHTS_NOTICE_RE.search(notice)
+        if match:
+            self.heights_total = int(match.group(1))
+            return
+
+        match = HEIGHT_NOTICE_RE.search(notice)
+        if match:
+            self.heights_started += 1
+            if self.heights_started > 1:
+                self._log_height_done()
+            self.current_height = int(match.group(1))
+            return
+
+        if SKIPPED_HEIGHT_NOTICE_RE.search(notice):
+            self.heights_skipped += 1
+
+    @property
+    def heights_done(self):
+        if self.finished:
+            return self.heights_started
+        return max(self.heights_started - 1, 0)
+
+    def snapshot(self):
+        """Текущие показатели: точки, скорость и оценка оставшегося времени"""
+        elapsed = time.perf_counter() - self.start_time
+        points_done = self.heights_done * self.points_per_height
+        points_per_second = points_done / elapsed if elapsed > 0 and points_done else None
+
+        eta_seconds = None
+        if points_per_second and self.heights_total:
+            points_left = (self.heights_total - self.heights_skipped - self.heights_done) * self.points_per_height
+            eta_seconds = points_left / points_per_second
+
+        return {
+            "elapsed_seconds": elapsed,
+            "heights_done": self.heights_done,
+            "heights_total": self.heights_total,
+            "heights_skipped": self.heights_skipped,
+            "points_done": points_done,
+            "points_per_second": points_per_second,
+            "eta_seconds": eta_seconds
+        }
+
+    def status_line(self):
+        """Строка состояния для вывода в консоль"""
+        stats = self.snapshot()
+        if not self.heights_total:
+            return f"Выполнение... {stats['elapsed_seconds']:.1f} с"
+
+        line = f"Высота {stats['heights_done']}/{stats['heights_total']}, {stats['points_done']} точек"
+        if stats['heights_skipped']:
+            line += f", пропущено высот {stats['heights_skipped']}"
+        if stats['points_per_second']:
+            line += f", {stats['points_per_second']:.0f} точек/с, осталось ~{stats['eta_seconds']:.1f} с"
+        return line
+
+    def _log_height_done(self):
+        now = time.perf_counter()
+        if self.log_file:
+            record = self.snapshot()
+            record.update({
+                "timestamp": datetime.now().isoformat(),
+                "height": self.current_height,
+                "height_seconds": now - self.last_time,
+                "height_points_per_second": self.points_per_height / (now - self.last_time)
+                if now > self.last_time else None
+            })
+            self.log_file.write(json.dumps(record) + "\n")
+            self.log_file.flush()
+        self.last_time = now
+
+    def finish(self, completed=True):
+        """Учет последней высоты (если расчет завершен) и закрытие журнала"""
+        if self.finished:
+            return
+        if completed and self.heights_started:
+            self.finished = True
+            self._log_height_done()
+        self.finished = True
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
+
+class ProgressNotices(list):
+    """Список уведомлений соединения, передающий каждое уведомление в ProgressTracker"""
+
+    def __init__(self, tracker):
+        super().__init__()
+        self.tracker = tracker
+
+    def append(self, notice):
+        super().append(notice)
+        self.tracker.handle_notice(notice)
+
+
+def wait_async(conn, on_tick=None, interval=0.1):
+    """
+    Ожидание асинхронного запроса с периодическим вызовом on_tick
+
+    При Ctrl+C на сервер отправляется отмена запроса, после чего ожидание
+    продолжается до ответа сервера (psycopg2.extensions.QueryCanceledError).
+    """
+    cancelled = False
+    last_tick = 0.0
+    while True:
+        try:
+            state = conn.poll()
+            if state == psycopg2.extensions.POLL_OK:
+                return
+            if state == psycopg2.extensions.POLL_READ:
+                select.select([conn.fileno()], [], [], interval)
+            elif state == psycopg2.extensions.POLL_WRITE:
+                select.select([], [conn.fileno()], [], interval)
+
+            # Поток уведомлений будит select часто, поэтому вывод ограничен интервалом
+            now = time.perf_counter()
+            if on_tick and now - last_tick >= interval:
+                last_tick = now
+                on_tick()
+        except KeyboardInterrupt:
+            if cancelled:
+                raise
+            cancelled = True
+            sys.stdout.write("\r" + " " * 100 + "\r")
+            print("Прерывание: отправка отмены запроса на сервер...")
+            conn.cancel()
+
+
+def run_interpolation_procedure(db_config, settings, verbose=False, progress_log=None, backend_pids=None):
+    """
+    Запуск хранимой процедуры для расчета интерполяций
+
+    Процедура выполняется в отдельном асинхронном соединении, поэтому во время
+    расчета можно выводить ход выполнения по уведомлениям процедуры, а Ctrl+C
+    отменяет запрос на сервере, а не только в клиенте.
+    backend_pids - необязательный список, в который добавляется PID серверного
+    процесса расчета (см. wait_for_stats_flush).
+    """
+    print_header("РАСЧЕТ ИНТЕРПОЛЯЦИЙ")
+
+    print_calculation_settings(settings)
 
+    temps_scaled, _ = build_temperature_grid(settings)
+    tracker = ProgressTracker(len(temps_scaled), progress_log)
+
+    aconn = None
     try:
-        cursor = conn.cursor()
+        # Асинхронное соединение работает в режиме autocommit: CALL фиксируется сам
+        aconn = psycopg2.connect(async_=1, **db_config)
+        wait_async(aconn)
+        if backend_pids is not None:
+            backend_pids.append(aconn.get_backend_pid())
+        aconn.notices = ProgressNotices(tracker)
+        cursor = aconn.cursor()
 
-        # Анимация процесса выполнения
         print("\nЗапуск процедуры расчета...")
-        print("Это может занять некоторое время. Пожалуйста, подождите...\n")
+        print("Для отмены нажмите Ctrl+C\n")
 
         animation = "|/-\\"
         idx = 0
         start_time = time.time()
 
-        # Запускаем процедуру
+        def show_progress():
+            nonlocal idx
+            sys.stdout.write(f"\r{animation[idx % len(animation)]} {tracker.status_line()}".ljust(100))
+            sys.stdout.flush()
+            idx += 1
+
+        # Запускаем процедуру выбранного движка; режим замера времени есть только у процедуры
+        procedure = ENGINE_PROCEDURES[settings['engine']]
+        arguments = [
+            settings['min_temperature'],
+            settings['max_temperature'],
+            settings['temperature_step'],
+            settings['clear_previous_results'],
+            settings['resume']
+        ]
+        if settings['engine'] == 'procedure':
+            arguments += [settings['timing_mode'], settings['sample_rate']]
+        arguments.append(settings['storage_mode'])
+        cursor.execute(
+            f"CALL snaart.{procedure}({', '.join(['%s'] * len(arguments))})",
+            arguments
+        )
+        wait_async(aconn, show_progress)
+        tracker.finish()
+        end_time = time.time()
+
+        # Очищаем строку прогресса
+        sys.stdout.write("\r" + " " * 100 + "\r")
+
+        print(f"✓ Процедура успешно выполнена за {end_time - start_time:.2f} секунд")
+        # Множественный движок не сообщает о ходе расчета по высотам
+        stats = tracker.snapshot()
+        if stats['points_per_second']:
+            print(f"  Средняя скорость: {stats['points_per_second']:.0f} точек/с")
+        if progress_log:
+            print(f"  Ход расчета записан в {progress_log}")
+
+        # Вывод уведомлений, если включен подробный режим
+        if verbose and aconn.notices:
+            print("\nУведомления:")
+            for notice in aconn.notices:
+                print(f"  {notice.strip()}")
+
+        cursor.close()
+        return True
+    except psycopg2.extensions.QueryCanceledError:
+        sys.stdout.write("\r" + " " * 100 + "\r")
+        print("✗ Расчет отменен, запрос на сервере остановлен")
+        return False
+    except psycopg2.Error as e:
+        sys.stdout.write("\r" + " " * 100 + "\r")
+        print(f"✗ Ошибка выполнения процедуры: {e}")
+        return False
+    finally:
+        tracker.finish(completed=False)
+        if aconn:
+            aconn.close()
+
+
+def split_heights(heights, workers):
+    """Разбиение высот на шарды по кругу, чтобы нагрузка распределялась равномерно"""
+    return [heights[index::workers] for index in range(min(workers, len(heights)))]
+
+
+def _run_interpolation_shard(pool, heights, settings, backend_pids=None):
+    """Расчет шарда высот в отдельном соединении из пула"""
+    conn = pool.getconn()
+    if backend_pids is not None:
+        backend_pids.append(conn.get_backend_pid())
+    try:
+        # CALL вне явной транзакции, чтобы в режиме продолжения процедура
+        # могла фиксировать каждую рассчитанную высоту
+        conn.autocommit = True
+        cursor = conn.cursor()
+        start_time = time.perf_counter()
+
         cursor.execute(
             """
-            CALL snaart.calculate_all_interpolations(
-                %s, %s, %s, %s
+            CALL snaart.calculate_interpolations_for_heights(
+                %s, %s, %s, %s, %s, %s, %s, NULL, NULL, NULL, NULL, NULL
             )
             """,
             (
+                heights,
                 settings['min_temperature'],
                 settings['max_temperature'],
                 settings['temperature_step'],
-                settings['clear_previous_results']
+                settings['resume'],
+                settings['timing_mode'],
+                settings['sample_rate']
             )
         )
+        total_calculations, successful_calculations, server_time_ms, skipped_calculations, histogram = \
+            cursor.fetchone()
 
-        # Простая анимация во время выполнения
-        while cursor.connection and not cursor.closed:
-            sys.stdout.write(f"\rВыполнение... {animation[idx % len(animation)]}")
-            sys.stdout.flush()
-            idx += 1
-            time.sleep(0.1)
+        time_ms = (time.perf_counter() - start_time) * 1000
+        cursor.close()
 
-            # Проверяем статус запроса
-            if not cursor.connection.is_busy():
-                break
+        return {
+            "heights": heights,
+            "total_calculations": total_calculations,
+            "successful_calculations": successful_calculations,
+            "skipped_calculations": skipped_calculations,
+            "time_ms": time_ms,
+            "server_time_ms": float(server_time_ms),
+            "points_per_second": total_calculations / time_ms * 1000 if time_ms > 0 else None,
+            "latency_histogram": histogram
+        }
+    finally:
+        pool.putconn(conn)
 
-        conn.commit()
-        end_time = time.time()
 
-        # Очищаем строку анимации
-        sys.stdout.write("\r" + " " * 30 + "\r")
+def run_parallel_interpolation(conn, db_config, settings, verbose=False, backend_pids=None):
+    """
+    Параллельный расчет интерполяций хранимой процедурой
 
-        print(f"✓ Процедура успешно выполнена за {end_time - start_time:.2f} секунд")
+    Высоты делятся на шарды, каждый шард рассчитывается процедурой
+    calculate_interpolations_for_heights в собственном соединении из пула
+    (отдельный backend PostgreSQL). По завершении записывается одна общая
+    запись interpolation_performance со временем каждого шарда.
+    """
+    print_header("ПАРАЛЛЕЛЬНЫЙ РАСЧЕТ ИНТЕРПОЛЯЦИЙ")
 
-        # Вывод уведомлений, если включен подробный режим
-        if verbose and conn.notices:
-            print("\nУведомления:")
-            for notice in conn.notices:
-                print(f"  {notice.strip()}")
+    print_calculation_settings(settings)
 
+    pool = None
+    try:
+        cursor = conn.cursor()
+
+        cursor.execute("CALL snaart.prepare_interpolation_tables(%s, %s)",
+                       (settings['clear_previous_results'], settings['storage_mode']))
+        cursor.execute("SELECT height FROM snaart.temperature_deviations ORDER BY height;")
+        heights = [row[0] for row in cursor.fetchall()]
+        first_result_id = last_result_id(cursor)
+        conn.commit()
+
+        shards = split_heights(heights, settings['workers'])
+        print(f"\nВысот: {len(heights)}, шардов: {len(shards)}")
+
+        pool = psycopg2.pool.ThreadedConnectionPool(1, max(len(shards), 1), **db_config)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(len(shards), 1)) as executor:
+            futures = [executor.submit(_run_interpolation_shard, pool, shard, settings, backend_pids)
+                       for shard in shards]
+            shard_stats = [future.result() for future in futures]
+        # Индексы, отложенные до окончания загрузки (режим unlogged)
+        cursor.execute("CALL snaart.finish_interpolation_tables(%s)", (settings['storage_mode'],))
+        conn.commit()
+        wall_time_ms = (time.perf_counter() - start_time) * 1000
+
+        for index, stats in enumerate(shard_stats, 1):
+            rate = f"{stats['points_per_second']:.0f} точек/с" if stats['points_per_second'] else "н/д"
+            print(f"  Шард {index}: {len(stats['heights'])} высот, {stats['total_calculations']} точек "
+                  f"за {stats['time_ms']:.2f} мс ({rate})")
+            if verbose:
+                print(f"    Высоты: {', '.join(str(height) for height in stats['heights'])}")
+
+        total_calculations = sum(stats['total_calculations'] for stats in shard_stats)
+        successful_calculations = sum(stats['successful_calculations'] for stats in shard_stats)
+        skipped_calculations = sum(stats['skipped_calculations'] for stats in shard_stats)
+        if settings['resume']:
+            print(f"  Пропущено уже рассчитанных точек: {skipped_calculations}")
+
+        # Гистограммы шардов складываются, в параметрах шардов не дублируются
+        histogram = merge_latency_histograms(stats.pop('latency_histogram') for stats in shard_stats)
+
+        save_performance_metrics(cursor, wall_time_ms, total_calculations, successful_calculations, {
+            "min_temperature": settings['min_temperature'],
+            "max_temperature": settings['max_temperature'],
+            "temperature_step": settings['temperature_step'],
+            "heights_count": len(heights),
+            "engine": "procedure",
+            "resume": settings['resume'],
+            "skipped_calculations": skipped_calculations,
+            "timing_mode": settings['timing_mode'],
+            "sample_rate": settings['sample_rate'] if settings['timing_mode'] == 'sample' else None,
+            "workers": len(shards),
+            "storage_mode": settings['storage_mode'],
+            "wall_time_ms": wall_time_ms,
+            "shards": shard_stats
+        }, histogram, first_result_id)
+        conn.commit()
         cursor.close()
+
+        print(f"✓ Параллельный расчет выполнен за {wall_time_ms / 1000:.2f} секунд")
         return True
     except psycopg2.Error as e:
-        print(f"✗ Ошибка выполнения процедуры: {e}")
+        print(f"✗ Ошибка параллельного расчета: {e}")
         conn.rollback()
         return False
+    finally:
+        if pool:
+            pool.closeall()
+
+
+def load_deviation_tables(conn, heights=None):
+    """
+    Загрузка таблиц температурных отклонений в массивы NumPy
+
+    Возвращает словарь с отсортированным массивом высот (как v_heights в процедуре)
+    и двумя матрицами отклонений «высота × столбец dev_N» для отрицательных
+    (temperature_deviations) и положительных (temperature_deviations_plus) температур.
+    Отсутствующие значения представлены как NaN.
+    heights - необязательный список высот для загрузки (по умолчанию все).
+    """
+    import numpy as np
+
+    negative_columns = ", ".join(f"d.dev_{value}" for value in DEVIATION_COLUMNS)
+    positive_columns = ", ".join(f"p.dev_{value}" for value in DEVIATION_COLUMNS)
+
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT d.height, {negative_columns}, {positive_columns}
+        FROM snaart.temperature_deviations AS d
+        LEFT JOIN snaart.temperature_deviations_plus AS p ON p.height = d.height
+        WHERE %(heights)s::INTEGER[] IS NULL OR d.height = ANY(%(heights)s::INTEGER[])
+        ORDER BY d.height;
+    """, {"heights": heights})
+    rows = cursor.fetchall()
+    cursor.close()
+
+    columns_count = len(DEVIATION_COLUMNS)
+    data = np.array(
+        [[np.nan if value is None else float(value) for value in row] for row in rows],
+        dtype=np.float64
+    ).reshape(len(rows), 1 + 2 * columns_count)
+
+    positive = data[:, columns_count + 1:].copy()
+    # get_temperature_deviation_value не использует dev_40 и dev_50 для положительных температур
+    positive[:, DEVIATION_COLUMNS.index(40):] = np.nan
+
+    return {
+        "heights": data[:, 0].astype(np.int32),
+        "negative": data[:, 1:columns_count + 1],
+        "positive": positive
+    }
+
+
+def build_temperature_grid(settings):
+    """
+    Построение сетки температур, совпадающей с циклом WHILE процедуры
+
+    Температуры возвращаются целыми числами в единицах 1/scale, что позволяет
+    повторить точную арифметику NUMERIC без накопления ошибок float.
+    """
+    import numpy as np
+
+    min_temp = Decimal(str(settings['min_temperature']))
+    max_temp = Decimal(str(settings['max_temperature']))
+    step = Decimal(str(settings['temperature_step']))
+
+    if step <= 0:
+        raise ValueError("Шаг температуры должен быть положительным")
+
+    exponent = min(value.as_tuple().exponent for value in (min_temp, max_temp, step))
+    scale = 10 ** max(-exponent, 0)
+    count = int((max_temp - min_temp) // step) + 1 if max_temp >= min_temp else 0
+
+    temps_scaled = int(min_temp * scale) + np.arange(count, dtype=np.int64) * int(step * scale)
+    return temps_scaled, scale
+
+
+def stored_temperatures(temps_scaled, scale):
+    """
+    Температуры сетки в сотых долях градуса, как они сохраняются в NUMERIC(8,2)
+
+    Округление половины от нуля выполняется в целых числах, чтобы результат
+    совпадал с приведением типа в процедуре независимо от погрешности float.
+    """
+    import numpy as np
+
+    if scale <= 100:
+        return temps_scaled * (100 // scale)
+    divisor = scale // 100
+    return np.sign(temps_scaled) * ((np.abs(temps_scaled) + divisor // 2) // divisor)
+
+
+def split_temperatures(temps_scaled, scale):
+    """
+    Знак, десятки и единицы температур, как в calculate_temperature_deviation
+
+    Десятки - ABS(FLOOR(t / 10) * 10), для отрицательных значений не ниже -50;
+    единицы - ABS(t - десятки) с приведением к INTEGER (округление половины от нуля).
+    Десятки и единицы - номера столбцов dev_N, из которых берутся отклонения.
+    """
+    import numpy as np
+
+    is_positive = temps_scaled >= 0
+    tens = np.floor_divide(temps_scaled, 10 * scale) * 10
+    tens = np.where(is_positive, tens, np.maximum(tens, -50))
+
+    ones_scaled = np.abs(temps_scaled - tens * scale)
+    ones = (2 * ones_scaled + scale) // (2 * scale)
+    return is_positive, np.abs(tens), ones
+
+
+def compute_temperature_deviations(tables, temps_scaled, scale):
+    """
+    Векторный расчет температурных отклонений по логике calculate_temperature_deviation
+
+    Сетка «высоты × температуры» вычисляется без циклов по точкам: температура
+    раскладывается на десятки и единицы, а столбец dev_N для каждого значения
+    находится бинарным поиском по отсортированному массиву DEVIATION_COLUMNS.
+    Возвращает словарь матриц (высоты × температуры) со значениями столбцов
+    interpolation_results; для неуспешных расчетов все значения равны NaN.
+    """
+    import numpy as np
+
+    columns = np.asarray(DEVIATION_COLUMNS, dtype=np.int64)
+    is_positive, tens, ones = split_temperatures(temps_scaled, scale)
+
+    def lookup(values):
+        # Бинарный поиск столбца dev_N; значения без столбца дают NaN
+        index = np.minimum(np.searchsorted(columns, values), len(columns) - 1)
+        found = columns[index] == values
+        deviation = np.where(is_positive, tables["positive"][:, index], tables["negative"][:, index])
+        return np.where(found, deviation, np.nan)
+
+    dev_tens = lookup(tens)
+    dev_ones = lookup(ones)
+
+    # Итоговое отклонение с корректировкой для отрицательных температур
+    result = dev_tens + dev_ones
+    result = np.where(is_positive, result, np.abs(result) + 50)
+
+    failed = np.isnan(result)
+    return {
+        "tens_value": np.where(failed, np.nan, tens),
+        "ones_value": np.where(failed, np.nan, ones),
+        "dev_tens": np.where(failed, np.nan, dev_tens),
+        "dev_ones": np.where(failed, np.nan, dev_ones),
+        "result_value": result
+    }
+
+
+def latency_histogram_bucket(time_ms):
+    """Номер корзины (с 1) гистограммы времени, как в функции latency_histogram_bucket"""
+    import math
+
+    if time_ms < 0.001:
+        return 1
+    bucket = math.floor(LATENCY_BUCKETS_PER_OCTAVE * math.log(time_ms * 1000) / math.log(2)) + 2
+    return min(bucket, LATENCY_HISTOGRAM_SIZE)
+
+
+def merge_latency_histograms(histograms):
+    """Поэлементная сумма гистограмм времени (пустые значения пропускаются)"""
+    merged = [0] * LATENCY_HISTOGRAM_SIZE
+    for histogram in histograms:
+        for index, count in enumerate(histogram or []):
+            merged[index] += count or 0
+    return merged
+
+
+def latency_bucket_bounds(bucket):
+    """Границы корзины гистограммы времени в мс"""
+    if bucket == 1:
+        return 0.0, 0.001
+    lower = 2 ** ((bucket - 2) / LATENCY_BUCKETS_PER_OCTAVE) / 1000
+    upper = 2 ** ((bucket - 1) / LATENCY_BUCKETS_PER_OCTAVE) / 1000
+    return lower, upper
+
+
+def histogram_percentiles(histogram, percentiles=None):
+    """
+    Оценка перцентилей времени расчета точки по гистограмме
+
+    Внутри корзины значения считаются распределенными равномерно.
+    Возвращает словарь {перцентиль: мс} и количество учтенных значений.
+    """
+    percentiles = percentiles or TIME_PERCENTILES
+    counts = [count or 0 for count in (histogram or [])]
+    total = sum(counts)
+    if not total:
+        return {}, 0
+
+    result = {}
+    for percentile in percentiles:
+        rank = percentile / 100 * total
+        cumulative = 0
+        for bucket, count in enumerate(counts, 1):
+            if count and cumulative + count >= rank:
+                lower, upper = latency_bucket_bounds(bucket)
+                result[percentile] = lower + (upper - lower) * (rank - cumulative) / count
+                break
+            cumulative += count
+    return result, total
+
+
+def last_result_id(cursor):
+    """Наибольший id в interpolation_results (0 для пустой таблицы) - граница строк следующего запуска"""
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM snaart.interpolation_results;")
+    return cursor.fetchone()[0]
+
+
+def save_performance_metrics(cursor, total_time_ms, total_calculations, successful_calculations, parameters,
+                             latency_histogram=None, first_result_id=0):
+    """
+    Запись метрик производительности в interpolation_performance
+
+    Агрегаты времени расчета считаются по строкам interpolation_results,
+    записанным этим запуском (id больше first_result_id), так же, как это
+    делает процедура calculate_all_interpolations. Движки UNTIMED_ENGINES
+    время точки не измеряют: среднее - время расчета на точку, минимум
+    и максимум не заполняются, как у calculate_all_interpolations_set.
+    """
+    if parameters.get("engine") in UNTIMED_ENGINES:
+        point_time_ms = parameters["compute_time_ms"] / total_calculations if total_calculations else None
+        cursor.execute(
+            """
+            INSERT INTO snaart.interpolation_performance (
+                total_time_ms,
+                total_calculations,
+                successful_calculations,
+                avg_calculation_time_ms,
+                min_calculation_time_ms,
+                max_calculation_time_ms,
+                parameters
+            )
+            VALUES (%s, %s, %s, %s, NULL, NULL, %s::jsonb || jsonb_build_object('calculation_date', NOW()::TEXT));
+            """,
+            (total_time_ms, total_calculations, successful_calculations, point_time_ms, json.dumps(parameters))
+        )
+        return
+
+    cursor.execute(
+        """
+        INSERT INTO snaart.interpolation_performance (
+            total_time_ms,
+            total_calculations,
+            successful_calculations,
+            avg_calculation_time_ms,
+            min_calculation_time_ms,
+            max_calculation_time_ms,
+            parameters,
+            latency_histogram
+        )
+        SELECT
+            %s, %s, %s,
+            AVG(calculation_time),
+            MIN(calculation_time),
+            MAX(calculation_time),
+            %s::jsonb || jsonb_build_object('calculation_date', NOW()::TEXT),
+            %s
+        FROM snaart.interpolation_results
+        WHERE id > %s;
+        """,
+        (total_time_ms, total_calculations, successful_calculations, json.dumps(parameters), latency_histogram,
+         first_result_id)
+    )
+
+
+# Столбцы interpolation_results, заполняемые массовой загрузкой, и их типы
+# в формате COPY: int4 или numeric с заданным числом знаков после запятой
+RESULT_COLUMNS = [
+    ("height", "int4", None),
+    ("temperature", "numeric", 2),
+    ("tens_value", "int4", None),
+    ("ones_value", "int4", None),
+    ("dev_tens", "numeric", 2),
+    ("dev_ones", "numeric", 2),
+    ("result_value", "numeric", 2),
+    ("calculation_time", "numeric", 3)
+]
+
+# Заголовок и завершающий маркер двоичного формата COPY
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_BINARY_TRAILER = struct.pack(">h", -1)
+
+# Целочисленные типы двоичного формата COPY (timestamp - микросекунды от 2000-01-01)
+BINARY_FIELD_TYPES = {"int4": ">i4", "timestamp": ">i8"}
+
+# Ограничение модуля значения numeric в двоичной записи (3 группы по 4 цифры)
+COPY_NUMERIC_LIMIT = 10 ** 12
+
+
+class CopyStream:
+    """
+    Файлоподобный объект для COPY ... FROM STDIN
+
+    Читает байты из генератора по мере того, как их запрашивает psycopg2,
+    поэтому в памяти находится только текущая порция данных.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+        self._position = 0
+        self.bytes_written = 0
+
+    def read(self, size=-1):
+        parts = []
+        remaining = size
+        while size < 0 or remaining > 0:
+            if self._position >= len(self._buffer):
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._buffer = memoryview(chunk)
+                self._position = 0
+
+            end = len(self._buffer) if size < 0 else min(len(self._buffer), self._position + remaining)
+            parts.append(self._buffer[self._position:end])
+            remaining -= end - self._position
+            self._position = end
+
+        data = b"".join(parts)
+        self.bytes_written += len(data)
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def _encode_numeric(values, scale):
+    """
+    Векторное кодирование значений в двоичный формат numeric
+
+    Каждое значение записывается фиксированными 4 группами по 4 десятичные цифры
+    (3 целые группы и 1 дробная), PostgreSQL нормализует запись при приеме.
+    Возвращает матрицу int16 из 8 элементов на значение.
+    """
+    import numpy as np
+
+    magnitude = np.abs(values)
+    if np.any(magnitude >= COPY_NUMERIC_LIMIT):
+        raise ValueError(f"Значение вне диапазона двоичной записи numeric (|x| < {COPY_NUMERIC_LIMIT})")
+
+    # Округление половины от нуля, как при приведении к NUMERIC
+    scaled = np.floor(magnitude * 10 ** scale + 0.5).astype(np.int64)
+    integer, fraction = np.divmod(scaled, 10 ** scale)
+
+    encoded = np.empty((len(values), 8), dtype=np.int64)
+    encoded[:, 0] = 4                                           # ndigits
+    encoded[:, 1] = 2                                           # weight первой группы
+    encoded[:, 2] = np.where(values < 0, 0x4000, 0x0000)        # sign
+    encoded[:, 3] = np.where(fraction == 0, 0, scale)           # dscale
+    encoded[:, 4] = integer // 10 ** 8
+    encoded[:, 5] = integer // 10 ** 4 % 10 ** 4
+    encoded[:, 6] = integer % 10 ** 4
+    encoded[:, 7] = fraction * 10 ** (4 - scale)
+    return encoded.astype(">i2")
+
+
+def encode_copy_binary(chunk, result_columns=RESULT_COLUMNS):
+    """
+    Кодирование порции строк в двоичный формат COPY
+
+    chunk - словарь «столбец -> массив NumPy» (NaN означает NULL),
+    result_columns - описание столбцов (имя, тип int4/numeric/timestamp, знаков
+    после запятой); timestamp задается в микросекундах от 2000-01-01.
+    Строки группируются по набору NULL-столбцов, для каждой группы строится
+    структурированный массив фиксированной длины, поэтому кодирование
+    выполняется без цикла по строкам.
+    """
+    import numpy as np
+
+    columns = [np.asarray(chunk[name], dtype=np.float64) for name, _, _ in result_columns]
+
+    # Битовая маска NULL-столбцов для каждой строки
+    masks = np.zeros(len(columns[0]), dtype=np.int64)
+    for index, column in enumerate(columns):
+        masks |= np.isnan(column).astype(np.int64) << index
+
+    parts = []
+    for mask in np.unique(masks):
+        rows = np.flatnonzero(masks == mask)
+        pattern = [bool(mask >> index & 1) for index in range(len(result_columns))]
+
+        fields = [("count", ">i2")]
+        for index, (name, kind, _) in enumerate(result_columns):
+            fields.append((f"{name}_length", ">i4"))
+            if not pattern[index]:
+                fields.append((name, BINARY_FIELD_TYPES[kind]) if kind in BINARY_FIELD_TYPES
+                              else (name, ">i2", (8,)))
+
+        records = np.empty(len(rows), dtype=np.dtype(fields))
+        records["count"] = len(result_columns)
+        for index, (name, kind, scale) in enumerate(result_columns):
+            if pattern[index]:
+                records[f"{name}_length"] = -1
+            elif kind in BINARY_FIELD_TYPES:
+                records[f"{name}_length"] = np.dtype(BINARY_FIELD_TYPES[kind]).itemsize
+                records[name] = columns[index][rows].astype(np.int64)
+            else:
+                records[f"{name}_length"] = 16
+                records[name] = _encode_numeric(columns[index][rows], scale)
+
+        parts.append(records.tobytes())
+
+    return b"".join(parts)
+
+
+def encode_copy_text(chunk):
+    """Кодирование порции результатов в текстовый формат COPY"""
+    import numpy as np
+
+    formatted = []
+    for name, kind, scale in RESULT_COLUMNS:
+        column = np.asarray(chunk[name], dtype=np.float64).tolist()
+        if kind == "int4":
+            formatted.append(["\\N" if value != value else str(int(value)) for value in column])
+        else:
+            # Целые значения без дробной части, как в двоичном формате
+            formatted.append([
+                "\\N" if value != value else
+                str(int(value)) if value == int(value) else
+                f"{value:.{scale}f}"
+                for value in column
+            ])
+
+    return "".join(f"{line}\n" for line in map("\t".join, zip(*formatted))).encode("utf-8")
+
+
+def copy_interpolation_results(conn, chunks, copy_format="binary", table="snaart.interpolation_results"):
+    """
+    Потоковая запись результатов в interpolation_results через COPY ... FROM STDIN
+
+    chunks - генератор (или список) словарей «столбец -> массив NumPy» с
+    одинаковой длиной массивов. Порции кодируются и передаются по мере чтения,
+    полный набор результатов в памяти не собирается.
+    table - таблица назначения.
+    Возвращает статистику записи: число строк, байт, время и скорость.
+    """
+    stats = {"format": copy_format, "rows": 0}
+    encode = encode_copy_binary if copy_format == "binary" else encode_copy_text
+
+    def encoded_chunks():
+        if copy_format == "binary":
+            yield COPY_BINARY_HEADER
+        for chunk in chunks:
+            stats["rows"] += len(chunk["height"])
+            yield encode(chunk)
+        if copy_format == "binary":
+            yield COPY_BINARY_TRAILER
+
+    columns = ", ".join(name for name, _, _ in RESULT_COLUMNS)
+    options = "FORMAT binary" if copy_format == "binary" else "FORMAT text"
+    stream = CopyStream(encoded_chunks())
+
+    cursor = conn.cursor()
+    start_time = time.perf_counter()
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH ({options})", stream, size=1 << 16)
+    elapsed = time.perf_counter() - start_time
+    cursor.close()
+
+    stats["bytes"] = stream.bytes_written
+    stats["time_ms"] = elapsed * 1000
+    stats["rows_per_second"] = stats["rows"] / elapsed if elapsed > 0 else None
+    return stats
+
+
+def print_copy_stats(stats):
+    """Вывод статистики массовой записи результатов"""
+    rate = f"{stats['rows_per_second']:.0f} строк/с" if stats['rows_per_second'] else "н/д"
+    print(f"✓ Записано {stats['rows']} строк ({stats['bytes'] / 1024 / 1024:.2f} МБ, формат {stats['format']}) "
+          f"за {stats['time_ms']:.2f} мс, {rate}")
+
+
+def load_stored_temperatures(conn, height):
+    """Температуры высоты, уже сохраненные в interpolation_results, в сотых долях градуса"""
+    import numpy as np
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT (temperature * 100)::BIGINT FROM snaart.interpolation_results "
+                   "WHERE height = %s ORDER BY temperature;", (height,))
+    temperatures = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+    cursor.close()
+    return temperatures
+
+
+def combine_copy_stats(total, stats):
+    """Сложение статистики нескольких COPY (запись по высотам)"""
+    if total is None:
+        return stats
+    combined = {
+        "format": stats["format"],
+        "rows": total["rows"] + stats["rows"],
+        "bytes": total["bytes"] + stats["bytes"],
+        "time_ms": total["time_ms"] + stats["time_ms"]
+    }
+    combined["rows_per_second"] = combined["rows"] / combined["time_ms"] * 1000 if combined["time_ms"] > 0 else None
+    return combined
+
+
+def run_numpy_interpolation(conn, settings, verbose=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Расчет интерполяций на стороне клиента с помощью NumPy
+
+    Сетка рассчитывается и записывается через COPY по высотам, порциями не
+    больше chunk_size температур, поэтому в памяти находится одна порция
+    результатов. Если предыдущие результаты сохраняются, для каждой высоты
+    сначала читаются уже сохраненные температуры и рассчитываются только
+    отсутствующие точки. Транзакция фиксируется после каждой высоты.
+    В метрики попадают только записанные точки.
+    """
+    import numpy as np
+
+    print_header("РАСЧЕТ ИНТЕРПОЛЯЦИЙ (NUMPY)")
+
+    print_calculation_settings(settings)
+
+    try:
+        cursor = conn.cursor()
+        start_time = time.perf_counter()
+
+        cursor.execute("CALL snaart.prepare_interpolation_tables(%s, %s)",
+                       (settings['clear_previous_results'], settings['storage_mode']))
+
+        # Загружаем справочники один раз
+        tables = load_deviation_tables(conn)
+        temps_scaled, scale = build_temperature_grid(settings)
+        heights = tables["heights"]
+        print(f"\nЗагружено высот: {len(heights)}, температур в сетке: {len(temps_scaled)}")
+
+        # При шаге мельче 0.01 соседние точки сетки совпадают после округления
+        # до NUMERIC(8,2); как и процедура, сохраняем первую из них
+        stored = stored_temperatures(temps_scaled, scale)
+        keep = np.ones(len(stored), dtype=bool)
+        keep[1:] = stored[1:] != stored[:-1]
+        grid_scaled = temps_scaled[keep]
+        grid_stored = stored[keep]
+
+        counters = {"total": 0, "successful": 0, "skipped": 0, "compute_ms": 0.0}
+
+        def height_chunks(index, height, selected):
+            # Отклонения одной высоты: срез таблиц без копирования остальных высот
+            height_tables = {
+                "negative": tables["negative"][index:index + 1],
+                "positive": tables["positive"][index:index + 1]
+            }
+            for offset in range(0, len(selected), chunk_size):
+                part = selected[offset:offset + chunk_size]
+                calc_start = time.perf_counter()
+                results = compute_temperature_deviations(height_tables, grid_scaled[part], scale)
+                calc_time_ms = (time.perf_counter() - calc_start) * 1000
+
+                counters["compute_ms"] += calc_time_ms
+                counters["total"] += len(part)
+                ok = int(np.count_nonzero(~np.isnan(results["result_value"][0])))
+                counters["successful"] += ok
+                if verbose:
+                    print(f"  Высота {height} м: успешных расчетов {ok} из {len(part)}")
+
+                yield {
+                    "height": np.full(len(part), height),
+                    "temperature": grid_stored[part] / 100,
+                    "tens_value": results["tens_value"][0],
+                    "ones_value": results["ones_value"][0],
+                    "dev_tens": results["dev_tens"][0],
+                    "dev_ones": results["dev_ones"][0],
+                    "result_value": results["result_value"][0],
+                    # Время отдельных точек не измеряется (NULL), как у calculate_all_interpolations_set
+                    "calculation_time": np.full(len(part), np.nan)
+                }
+
+        # COPY занимает соединение, поэтому сохраненные температуры высоты
+        # читаются до начала ее записи
+        copy_stats = None
+        for index, height in enumerate(heights):
+            selected = np.arange(len(grid_stored))
+            if not settings['clear_previous_results']:
+                missing = ~np.isin(grid_stored, load_stored_temperatures(conn, int(height)))
+                counters["skipped"] += len(selected) - int(np.count_nonzero(missing))
+                selected = selected[missing]
+            if not len(selected):
+                continue
+            stats = copy_interpolation_results(conn, height_chunks(index, height, selected),
+                                               settings['copy_format'])
+            copy_stats = combine_copy_stats(copy_stats, stats)
+            # Как и процедура в режиме продолжения, фиксируем каждую высоту:
+            # прерванный расчет продолжается с --resume без потери записанных высот
+            conn.commit()
+
+        if copy_stats:
+            print(f"✓ Расчет {counters['total']} точек выполнен за {counters['compute_ms']:.2f} мс")
+            print_copy_stats(copy_stats)
+        if settings['resume'] or not settings['clear_previous_results']:
+            print(f"  Пропущено уже рассчитанных точек: {counters['skipped']}")
+
+        # Индексы, отложенные до окончания загрузки (режим unlogged)
+        cursor.execute("CALL snaart.finish_interpolation_tables(%s)", (settings['storage_mode'],))
+
+        total_time_ms = (time.perf_counter() - start_time) * 1000
+
+        save_performance_metrics(cursor, total_time_ms, counters["total"], counters["successful"], {
+            "min_temperature": settings['min_temperature'],
+            "max_temperature": settings['max_temperature'],
+            "temperature_step": settings['temperature_step'],
+            "heights_count": len(heights),
+            "engine": "numpy",
+            "resume": settings['resume'],
+            "skipped_calculations": counters["skipped"],
+            "timing_mode": "batch",
+            "storage_mode": settings['storage_mode'],
+            "compute_time_ms": counters["compute_ms"],
+            "copy": copy_stats
+        })
+
+        conn.commit()
+        cursor.close()
+
+        print(f"✓ Расчет успешно выполнен за {total_time_ms / 1000:.2f} секунд")
+        return True
+    except (psycopg2.Error, ValueError) as e:
+        print(f"✗ Ошибка расчета интерполяций: {e}")
+        conn.rollback()
+        return False
+
+
+# Количество запросов pg_stat_statements, сохраняемых в разбивке по времени
+INSTRUMENT_TOP_STATEMENTS = 10
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _numeric_delta(before, after):
+    """Разница числовых полей двух строк статистики (словарей)"""
+    return {
+        key: after[key] - before.get(key, 0)
+        for key in after
+        if _is_number(after[key]) and _is_number(before.get(key, 0))
+    }
+
+
+def take_server_snapshot(conn):
+    """
+    Снимок накопительной статистики сервера
+
+    Строки представлений читаются через to_jsonb, поэтому набор столбцов
+    не зависит от версии PostgreSQL. pg_stat_statements используется, только
+    если расширение установлено (запросы внутри PL/pgSQL учитываются
+    при pg_stat_statements.track = 'all').
+    """
+    cursor = conn.cursor()
+
+    # Статистика кэшируется до конца транзакции, поэтому читаем свежий снимок
+    cursor.execute("SELECT pg_stat_clear_snapshot()")
+
+    snapshot = {"time": time.perf_counter(), "backend_pid": conn.get_backend_pid()}
+
+    cursor.execute("""
+        SELECT to_jsonb(d)
+        FROM pg_stat_database AS d
+        WHERE datname = current_database()
+    """)
+    snapshot["database"] = cursor.fetchone()[0]
+
+    cursor.execute("SELECT to_regclass('pg_catalog.pg_stat_wal') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute("SELECT to_jsonb(w) FROM pg_stat_wal AS w")
+        snapshot["wal"] = cursor.fetchone()[0]
+
+    cursor.execute("""
+        SELECT relname, to_jsonb(t)
+        FROM pg_statio_user_tables AS t
+        WHERE schemaname = 'snaart'
+    """)
+    snapshot["tables"] = {relname: row for relname, row in cursor.fetchall()}
+
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements')")
+    if cursor.fetchone()[0]:
+        cursor.execute("""
+            SELECT queryid, to_jsonb(s)
+            FROM pg_stat_statements AS s
+            WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+        """)
+        snapshot["statements"] = {queryid: row for queryid, row in cursor.fetchall()}
+
+    conn.commit()
+    cursor.close()
+    return snapshot
+
+
+def wait_for_stats_flush(conn, backend_pids, timeout=5.0):
+    """
+    Ожидание завершения соединений расчета
+
+    Серверный процесс сбрасывает накопленную статистику при завершении,
+    поэтому снимок «после» снимается, когда соединения расчета (backend_pids -
+    асинхронное соединение процедуры или соединения шардов) закрыты.
+    Другие клиенты базы данных не ожидаются. Статистика текущего соединения
+    (движок numpy) сбрасывается принудительно при переходе в режим ожидания
+    (PostgreSQL 15+).
+    """
+    cursor = conn.cursor()
+    if conn.server_version >= 150000:
+        cursor.execute("SELECT pg_stat_force_next_flush()")
+        conn.commit()
+
+    deadline = time.perf_counter() + timeout
+    while True:
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM pg_stat_activity
+            WHERE pid = ANY(%s)
+        """, (list(set(backend_pids)),))
+        pending = cursor.fetchone()[0]
+        conn.commit()
+        if not pending or time.perf_counter() > deadline:
+            break
+        time.sleep(0.05)
+    cursor.close()
+
+
+def diff_server_snapshots(before, after):
+    """Разница снимков статистики: вызовы, время запросов, буферы, WAL и временные файлы"""
+    database = _numeric_delta(before["database"], after["database"])
+    result = {
+        "wall_time_ms": (after["time"] - before["time"]) * 1000,
+        "database": {
+            key: database.get(key)
+            for key in ("xact_commit", "xact_rollback", "blks_hit", "blks_read", "tup_inserted",
+                        "tup_updated", "tup_deleted", "temp_files", "temp_bytes",
+                        "blk_read_time", "blk_write_time")
+            if key in database
+        }
+    }
+
+    if "wal" in before and "wal" in after:
+        result["wal"] = _numeric_delta(before["wal"], after["wal"])
+
+    tables = {}
+    for relname, row in after["tables"].items():
+        # Таблица, пересозданная во время расчета, сравнивается с нулевой статистикой
+        previous = before["tables"].get(relname, {})
+        if previous.get("relid") != row.get("relid"):
+            previous = {}
+        delta = _numeric_delta(previous, row)
+        delta.pop("relid", None)
+        if any(delta.values()):
+            tables[relname] = delta
+    result["tables"] = tables
+
+    if "statements" in after:
+        statements = []
+        for queryid, row in after["statements"].items():
+            delta = _numeric_delta(before.get("statements", {}).get(queryid, {}), row)
+            if not delta.get("calls"):
+                continue
+            statements.append({
+                "query": " ".join(row["query"].split())[:200],
+                "calls": delta["calls"],
+                # До PostgreSQL 13 время выполнения хранится в total_time
+                "total_exec_time": delta.get("total_exec_time", delta.get("total_time", 0)),
+                "rows": delta.get("rows", 0),
+                "shared_blks_hit": delta.get("shared_blks_hit", 0),
+                "shared_blks_read": delta.get("shared_blks_read", 0),
+                "wal_bytes": delta.get("wal_bytes", 0),
+                "temp_blks_written": delta.get("temp_blks_written", 0)
+            })
+        statements.sort(key=lambda item: item["total_exec_time"], reverse=True)
+        result["statements"] = statements[:INSTRUMENT_TOP_STATEMENTS]
+
+    return result
+
+
+def save_instrumentation(conn, instrumentation):
+    """Сохранение статистики сервера в parameters последней записи interpolation_performance"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE snaart.interpolation_performance
+        SET parameters = COALESCE(parameters, '{}'::jsonb) || jsonb_build_object('instrumentation', %s::jsonb)
+        WHERE id = (SELECT MAX(id) FROM snaart.interpolation_performance)
+    """, (json.dumps(instrumentation, default=float),))
+    conn.commit()
+    cursor.close()
+
+
+def print_instrumentation(instrumentation, total_time_ms):
+    """Вывод разбивки затрат сервера: время запросов, ввод-вывод, WAL"""
+    database = instrumentation.get("database", {})
+    wal = instrumentation.get("wal", {})
+
+    print(f"\nЗатраты сервера:")
+
+    statements = instrumentation.get("statements")
+    if statements:
+        print(f"- Время по запросам (pg_stat_statements):")
+        for item in statements:
+            share = item['total_exec_time'] / total_time_ms * 100 if total_time_ms else 0
+            print(f"  {item['total_exec_time']:10.2f} мс ({share:5.1f}%), вызовов {item['calls']}: {item['query'][:70]}")
+    elif statements is None:
+        print(f"- pg_stat_statements не установлен, разбивка по запросам недоступна")
+
+    hits = database.get("blks_hit", 0)
+    reads = database.get("blks_read", 0)
+    ratio = hits / (hits + reads) * 100 if hits + reads else 0
+    print(f"- Буферы: попаданий {hits}, чтений {reads} (попадания {ratio:.2f}%)")
+    print(f"- Строк: добавлено {database.get('tup_inserted', 0)}, изменено {database.get('tup_updated', 0)}, "
+          f"удалено {database.get('tup_deleted', 0)}")
+    print(f"- Временные файлы: {database.get('temp_files', 0)} ({database.get('temp_bytes', 0) / 1024 / 1024:.2f} МБ)")
+    if wal:
+        print(f"- WAL: записей {wal.get('wal_records', 0)}, {wal.get('wal_bytes', 0) / 1024 / 1024:.2f} МБ, "
+              f"полных страниц {wal.get('wal_fpi', 0)}, переполнений буфера {wal.get('wal_buffers_full', 0)}")
+
+    tables = instrumentation.get("tables", {})
+    for relname, delta in sorted(tables.items()):
+        print(f"  {relname}: heap попаданий/чтений {delta.get('heap_blks_hit', 0)}/{delta.get('heap_blks_read', 0)}, "
+              f"индексы {delta.get('idx_blks_hit', 0)}/{delta.get('idx_blks_read', 0)}")
+
+    # Время ввода-вывода измеряется только при track_io_timing / track_wal_io_timing
+    read_time = database.get("blk_read_time", 0)
+    write_time = database.get("blk_write_time", 0)
+    wal_time = wal.get("wal_write_time", 0) + wal.get("wal_sync_time", 0)
+    if total_time_ms and (read_time or write_time or wal_time):
+        other_time = max(total_time_ms - read_time - write_time - wal_time, 0)
+        print(f"- Распределение времени расчета:")
+        print(f"  чтение блоков: {read_time:.2f} мс ({read_time / total_time_ms * 100:.1f}%)")
+        print(f"  запись блоков: {write_time:.2f} мс ({write_time / total_time_ms * 100:.1f}%)")
+        print(f"  запись и синхронизация WAL: {wal_time:.2f} мс ({wal_time / total_time_ms * 100:.1f}%)")
+        print(f"  вычисления (PL/pgSQL, SQL): {other_time:.2f} мс ({other_time / total_time_ms * 100:.1f}%)")
+    else:
+        print(f"- Время ввода-вывода не измерялось (включите track_io_timing и track_wal_io_timing)")
+
+
+def current_wal_lsn(conn):
+    """Текущая позиция записи WAL (для объема WAL, записанного расчетом)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_current_wal_insert_lsn()::TEXT;")
+    lsn = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return lsn
+
+
+def explain_execution_time(cursor, query, params):
+    """Время выполнения запроса на сервере по EXPLAIN ANALYZE, мс"""
+    cursor.execute(f"EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) {query}", params)
+    return float(cursor.fetchone()[0][0]["Execution Time"])
+
+
+def measure_storage(conn, settings, wal_start=None, repeats=STORAGE_QUERY_REPEATS):
+    """
+    Размер interpolation_results и время запросов анализа для сравнения режимов хранения
+
+    Размеры суммируются по секциям (pg_partition_tree; у самой
+    секционированной таблицы и ее индексов данных нет). Перед замером
+    собирается статистика таблицы (ANALYZE), как после автоочистки, время
+    каждого запроса STORAGE_QUERIES - лучшее из repeats выполнений.
+    wal_start - позиция WAL перед расчетом; объем WAL включает и другие
+    сеансы сервера.
+    """
+    cursor = conn.cursor()
+    storage = {"mode": settings['storage_mode']}
+
+    if wal_start:
+        cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s::pg_lsn);", (wal_start,))
+        storage["wal_bytes"] = int(cursor.fetchone()[0])
+
+    cursor.execute("""
+        SELECT
+            COALESCE(SUM(pg_table_size(relid)), 0),
+            COALESCE(SUM(pg_indexes_size(relid)), 0),
+            (SELECT percentile_disc(0.5) WITHIN GROUP (ORDER BY height) FROM snaart.temperature_deviations)
+        FROM (
+            SELECT relid FROM pg_partition_tree('snaart.interpolation_results')
+            UNION
+            SELECT 'snaart.interpolation_results'::REGCLASS
+        ) AS t;
+    """)
+    table_bytes, index_bytes, height = cursor.fetchone()
+    storage["table_bytes"] = int(table_bytes)
+    storage["index_bytes"] = int(index_bytes)
+
+    cursor.execute("ANALYZE snaart.interpolation_results;")
+
+    # Диапазон температур - 5% сетки в ее середине
+    middle = (settings['min_temperature'] + settings['max_temperature']) / 2
+    width = (settings['max_temperature'] - settings['min_temperature']) * 0.05
+    params = {"height": height, "low": middle - width / 2, "high": middle + width / 2}
+    storage["queries"] = {
+        name: min(explain_execution_time(cursor, query, params) for _ in range(repeats))
+        for name, (_, query) in STORAGE_QUERIES.items()
+    }
+    storage["query_repeats"] = repeats
+
+    conn.commit()
+    cursor.close()
+    return storage
+
+
+def save_storage_metrics(conn, storage):
+    """Сохранение замеров режима хранения в parameters последней записи interpolation_performance"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE snaart.interpolation_performance
+        SET parameters = COALESCE(parameters, '{}'::jsonb) || jsonb_build_object('storage', %s::jsonb)
+        WHERE id = (SELECT MAX(id) FROM snaart.interpolation_performance)
+    """, (json.dumps(storage),))
+    conn.commit()
+    cursor.close()
+
+
+def print_storage_metrics(storage, total_time_ms):
+    """Вывод замеров режима хранения: загрузка, размер таблицы, время запросов анализа"""
+    print(f"\nХранение результатов (режим {storage['mode']}):")
+    print(f"- Загрузка (расчет, запись и построение индексов): {total_time_ms:.2f} мс")
+    print(f"- Размер таблицы: {storage['table_bytes'] / 1024 / 1024:.2f} МБ, "
+          f"индексов: {storage['index_bytes'] / 1024 / 1024:.2f} МБ")
+    if "wal_bytes" in storage:
+        print(f"- Записано WAL за расчет: {storage['wal_bytes'] / 1024 / 1024:.2f} МБ")
+    print(f"- Время запросов анализа на сервере (лучшее из {storage['query_repeats']}):")
+    for name, (label, _) in STORAGE_QUERIES.items():
+        if name in storage["queries"]:
+            print(f"  {label}: {storage['queries'][name]:.3f} мс")
 
 
 def fetch_performance_metrics(conn):
@@ -194,8 +1681,10 @@ def fetch_performance_metrics(conn):
                 min_calculation_time_ms,
                 max_calculation_time_ms,
                 parameters,
-                created_at
-            FROM snaart.interpolation_performance 
+                created_at,
+                -- Через to_jsonb, чтобы читались и таблицы, созданные до появления гистограммы
+                to_jsonb(p) -> 'latency_histogram' AS latency_histogram
+            FROM snaart.interpolation_performance AS p
             ORDER BY created_at DESC 
             LIMIT 1;
         """)
@@ -207,53 +1696,48 @@ def fetch_performance_metrics(conn):
 
         print(f"✓ Основные метрики получены")
 
-        # Статистика по высотам
-        print("Получение статистики по высотам...")
+        # Статистика по высотам, диапазонам температур и данные для тепловой карты
+        # собираются за один проход по interpolation_results (GROUPING SETS)
+        print("Получение статистики по высотам и температурам...")
         cursor.execute("""
             SELECT 
-                height, 
+                GROUPING(height, temp_range, temp_group) as grouping_id,
+                height,
+                temp_range,
+                temp_group,
                 COUNT(*) as count, 
                 AVG(calculation_time) as avg_time,
                 MIN(calculation_time) as min_time,
                 MAX(calculation_time) as max_time,
                 COUNT(*) FILTER (WHERE result_value IS NULL) as error_count
-            FROM snaart.interpolation_results
-            GROUP BY height
-            ORDER BY height;
+            FROM (
+                SELECT 
+                    height,
+                    FLOOR(temperature/10)*10 as temp_range,
+                    FLOOR(temperature/5)*5 as temp_group,
+                    calculation_time,
+                    result_value
+                FROM snaart.interpolation_results
+            ) AS r
+            GROUP BY GROUPING SETS ((height), (temp_range), (height, temp_group))
+            ORDER BY grouping_id, height, temp_range, temp_group;
         """)
-        height_stats = cursor.fetchall()
-        print(f"✓ Получена статистика для {len(height_stats)} высот")
 
-        # Статистика по температурам
-        print("Получение статистики по температурам...")
-        cursor.execute("""
-            SELECT 
-                FLOOR(temperature/10)*10 as temp_range,
-                COUNT(*) as count, 
-                AVG(calculation_time) as avg_time,
-                MIN(calculation_time) as min_time,
-                MAX(calculation_time) as max_time,
-                COUNT(*) FILTER (WHERE result_value IS NULL) as error_count
-            FROM snaart.interpolation_results
-            GROUP BY FLOOR(temperature/10)*10
-            ORDER BY temp_range;
-        """)
-        temp_stats = cursor.fetchall()
-        print(f"✓ Получена статистика для {len(temp_stats)} диапазонов температур")
+        # GROUPING() возвращает битовую маску столбцов, не входящих в группировку
+        height_stats = []
+        temp_stats = []
+        heatmap_data = []
+        for grouping_id, height, temp_range, temp_group, count, avg_time, min_time, max_time, error_count \
+                in cursor.fetchall():
+            if grouping_id == 0b011:
+                height_stats.append((height, count, avg_time, min_time, max_time, error_count))
+            elif grouping_id == 0b101:
+                temp_stats.append((temp_range, count, avg_time, min_time, max_time, error_count))
+            else:
+                heatmap_data.append((height, temp_group, avg_time, count))
 
-        # Данные для тепловой карты
-        print("Получение данных для тепловой карты...")
-        cursor.execute("""
-            SELECT 
-                height, 
-                FLOOR(temperature/5)*5 as temp_group,
-                AVG(calculation_time) as avg_time,
-                COUNT(*) as count
-            FROM snaart.interpolation_results
-            GROUP BY height, FLOOR(temperature/5)*5
-            ORDER BY height, temp_group;
-        """)
-        heatmap_data = cursor.fetchall()
+        print(f"✓ Получена статистика для {len(height_stats)} высот")
+        print(f"✓ Получена статистика для {len(temp_stats)} диапазонов температур")
         print(f"✓ Получены данные для тепловой карты ({len(heatmap_data)} точек)")
 
         cursor.close()
@@ -263,42 +1747,353 @@ def fetch_performance_metrics(conn):
         return None, None, None, None
 
 
-def create_performance_charts(metrics, height_stats, temp_stats, heatmap_data, output_dir="performance_results",
-                              dpi=300):
-    """Создание визуализаций производительности"""
-    if not metrics or not height_stats or not temp_stats:
-        print("✗ Недостаточно данных для создания визуализаций")
+def fetch_results_version(conn):
+    """
+    Ключ локального кеша результатов
+
+    Хеш параметров последнего запуска (запись interpolation_performance),
+    содержимого таблиц отклонений (их изменения пересчитывает команда watch)
+    и состояния interpolation_results по всем секциям: файлов секций
+    (меняются при пересоздании и TRUNCATE), максимального id и счетчиков
+    вставленных, измененных и удаленных строк из pg_stat_user_tables вместе
+    с незафиксированными изменениями текущей транзакции. Счетчики учитывают
+    запись в обход запусков - upsert команды watch и ручные UPDATE/DELETE;
+    другие соединения передают их в статистику после фиксации транзакции
+    с задержкой до нескольких секунд. Возвращает None, если запусков еще не было.
+    """
+    cursor = conn.cursor()
+    # Снимок статистики кешируется до конца транзакции, поэтому сбрасывается перед чтением счетчиков
+    cursor.execute("SELECT pg_stat_clear_snapshot()")
+    cursor.execute("""
+        WITH parts AS (
+            -- pg_partition_tree не возвращает строк для несекционированной таблицы
+            SELECT relid
+            FROM pg_partition_tree('snaart.interpolation_results')
+            WHERE isleaf
+            UNION
+            SELECT oid::REGCLASS
+            FROM pg_class
+            WHERE oid = 'snaart.interpolation_results'::REGCLASS AND relkind = 'r'
+        ),
+        results_state AS (
+            SELECT
+                string_agg(pg_relation_filenode(parts.relid)::TEXT, ',' ORDER BY parts.relid),
+                SUM(COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)
+                    + pg_stat_get_xact_tuples_inserted(parts.relid)
+                    + pg_stat_get_xact_tuples_updated(parts.relid)
+                    + pg_stat_get_xact_tuples_deleted(parts.relid))
+            FROM parts
+            LEFT JOIN pg_stat_user_tables AS s ON s.relid = parts.relid
+        )
+        SELECT
+            p.id,
+            p.created_at::TEXT,
+            p.parameters::TEXT,
+            (SELECT md5(COALESCE(string_agg(d::TEXT, '|' ORDER BY d.height), ''))
+             FROM snaart.temperature_deviations AS d),
+            (SELECT md5(COALESCE(string_agg(d::TEXT, '|' ORDER BY d.height), ''))
+             FROM snaart.temperature_deviations_plus AS d),
+            (SELECT row_to_json(results_state)::TEXT FROM results_state),
+            (SELECT MAX(id) FROM snaart.interpolation_results)
+        FROM snaart.interpolation_performance AS p
+        ORDER BY p.created_at DESC
+        LIMIT 1;
+    """)
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        return None
+    return hashlib.sha256(json.dumps(row).encode("utf-8")).hexdigest()[:32]
+
+
+def encode_cached_metrics(metrics, height_stats, temp_stats, heatmap_data):
+    """Метрики и статистика в виде JSON для кеша результатов (NUMERIC -> float, время - ISO)"""
+
+    def default(value):
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f"Значение {value!r} не сохраняется в JSON")
+
+    return json.loads(json.dumps({
+        "metrics": metrics,
+        "height_stats": height_stats,
+        "temp_stats": temp_stats,
+        "heatmap_data": heatmap_data
+    }, default=default))
+
+
+def decode_cached_metrics(meta):
+    """Метрики и статистика из кеша в формате fetch_performance_metrics"""
+    metrics = list(meta["metrics"])
+    metrics[8] = datetime.fromisoformat(metrics[8])
+    return (
+        tuple(metrics),
+        [tuple(row) for row in meta["height_stats"]],
+        [tuple(row) for row in meta["temp_stats"]],
+        [tuple(row) for row in meta["heatmap_data"]]
+    )
+
+
+def load_analysis_data(conn, args):
+    """
+    Метрики и статистика для анализа: из локального кеша или из базы данных
+
+    Кеш используется только с --result-cache: при промахе он требует
+    второго полного чтения interpolation_results и записи столбцов на диск,
+    что окупается лишь при повторном анализе тех же результатов.
+
+    При совпадении ключа (fetch_results_version) агрегаты читаются из
+    manifest.json, а результаты - из файлов столбцов через mmap. При промахе
+    агрегаты запрашиваются у базы данных, и вместе с результатами
+    (одним потоковым чтением interpolation_results) сохраняются в кеш.
+    Возвращает метрики и статистику (см. fetch_performance_metrics), запись
+    кеша (или None) и сведения о попадании для сводки.
+    """
+    if not args.result_cache:
+        return fetch_performance_metrics(conn) + (None, None)
+
+    from result_cache import ResultCache
+
+    cache = ResultCache(args.result_cache_dir, args.result_cache_size * 1024 * 1024)
+    start_time = time.perf_counter()
+    try:
+        key = fetch_results_version(conn)
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"✗ Не удалось определить версию результатов для кеша: {e}")
+        conn.rollback()
+        key = None
+    cache_info = {"hit": False, "key": key, "version_ms": (time.perf_counter() - start_time) * 1000}
+
+    if key:
+        start_time = time.perf_counter()
+        entry = cache.open(key)
+        if entry:
+            data = decode_cached_metrics(entry.meta)
+            cache_info.update(hit=True, load_ms=(time.perf_counter() - start_time) * 1000,
+                              rows=entry.rows, bytes=entry.size)
+            print_header("ПОЛУЧЕНИЕ МЕТРИК ПРОИЗВОДИТЕЛЬНОСТИ")
+            print(f"✓ Метрики и статистика загружены из локального кеша ({entry.directory})")
+            return data + (entry, cache_info)
+
+    start_time = time.perf_counter()
+    metrics, height_stats, temp_stats, heatmap_data = fetch_performance_metrics(conn)
+    cache_info["load_ms"] = (time.perf_counter() - start_time) * 1000
+    if not metrics or not key:
+        return metrics, height_stats, temp_stats, heatmap_data, None, cache_info
+
+    start_time = time.perf_counter()
+    try:
+        entry = cache.store(key, iter_interpolation_results(conn, chunk_size=args.chunk_size),
+                            {name: dtype for name, (_, dtype) in READER_COLUMNS.items()},
+                            encode_cached_metrics(metrics, height_stats, temp_stats, heatmap_data))
+        conn.commit()
+    except (psycopg2.Error, OSError, ValueError) as e:
+        print(f"✗ Не удалось сохранить результаты в кеш: {e}")
+        conn.rollback()
+        entry = None
+    cache_info["store_ms"] = (time.perf_counter() - start_time) * 1000
+    if entry:
+        cache_info.update(rows=entry.rows, bytes=entry.size)
+    return metrics, height_stats, temp_stats, heatmap_data, entry, cache_info
+
+
+def print_cache_info(cache_info, cache_size_mb):
+    """Вывод попадания в локальный кеш результатов и времени загрузки"""
+    print(f"\nЛокальный кеш результатов:")
+    if not cache_info["key"]:
+        print("- Не используется: нет версии результатов")
+        return
+
+    key = cache_info["key"][:12]
+    if cache_info["hit"]:
+        print(f"- Попадание (ключ {key}): загрузка {cache_info['load_ms']:.1f} мс, "
+              f"проверка версии {cache_info['version_ms']:.1f} мс")
+        print(f"- Результатов: {cache_info['rows']} строк, {cache_info['bytes'] / 1024 / 1024:.2f} МБ (mmap)")
+        return
+
+    print(f"- Промах (ключ {key}): загрузка из базы данных {cache_info['load_ms']:.1f} мс, "
+          f"проверка версии {cache_info['version_ms']:.1f} мс")
+    if "rows" in cache_info:
+        print(f"- Сохранено: {cache_info['rows']} строк, {cache_info['bytes'] / 1024 / 1024:.2f} МБ "
+              f"за {cache_info['store_ms']:.1f} мс")
+    elif "store_ms" in cache_info:
+        print(f"- Не сохранено: результаты больше ограничения кеша ({cache_size_mb} МБ)")
+
+
+def iter_interpolation_results(conn, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, where=None, params=None):
+    """
+    Потоковое чтение interpolation_results порциями массивов NumPy
+
+    Используется именованный (серверный) курсор: строки передаются с сервера
+    по chunk_size за раз, поэтому объем памяти не зависит от размера таблицы.
+    Каждая порция - словарь «столбец -> массив» (см. READER_COLUMNS),
+    числовые значения приводятся к float8 на сервере, без объектов Decimal.
+
+    where/params - необязательное условие отбора строк и его параметры.
+    """
+    import numpy as np
+
+    columns = columns or list(READER_COLUMNS)
+    expressions = ", ".join(READER_COLUMNS[name][0] for name in columns)
+    query = f"SELECT {expressions} FROM snaart.interpolation_results"
+    if where:
+        query += f" WHERE {where}"
+
+    cursor = conn.cursor(name="interpolation_results_reader")
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            # None в массиве float64 превращается в NaN
+            data = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns))
+            yield {
+                name: data[:, index].astype(READER_COLUMNS[name][1])
+                for index, name in enumerate(columns)
+            }
+    finally:
+        cursor.close()
+
+
+def compute_time_percentiles(conn, percentiles=None, chunk_size=DEFAULT_CHUNK_SIZE, cache_entry=None):
+    """
+    Точные перцентили времени расчета точки
+
+    calculation_time хранится как NUMERIC(10,3) в миллисекундах, то есть
+    целым числом микросекунд. Значения накапливаются в гистограмме с шагом
+    1 мкс (bincount), поэтому память зависит от максимального времени,
+    а не от количества строк. Перцентили считаются с линейной интерполяцией
+    между соседними рангами (как percentile_cont).
+    cache_entry - запись локального кеша: читается только столбец calculation_time.
+    Возвращает словарь {перцентиль: мс} и количество учтенных значений.
+    """
+    import numpy as np
+
+    percentiles = percentiles or TIME_PERCENTILES
+    counts = np.zeros(0, dtype=np.int64)
+
+    if cache_entry:
+        chunks = cache_entry.iter_chunks(["calculation_time"], chunk_size)
+    else:
+        chunks = iter_interpolation_results(conn, ["calculation_time"], chunk_size,
+                                            where="calculation_time IS NOT NULL")
+    for chunk in chunks:
+        times = chunk["calculation_time"]
+        micros = np.rint(times[~np.isnan(times)] * 1000).astype(np.int64)
+        chunk_counts = np.bincount(micros)
+        if len(chunk_counts) > len(counts):
+            counts = np.pad(counts, (0, len(chunk_counts) - len(counts)))
+        counts[:len(chunk_counts)] += chunk_counts
+
+    total = int(counts.sum())
+    if not total:
+        return {}, 0
+
+    cumulative = np.cumsum(counts)
+    result = {}
+    for percentile in percentiles:
+        rank = percentile / 100 * (total - 1)
+        lower = int(np.searchsorted(cumulative, np.floor(rank), side="right"))
+        upper = int(np.searchsorted(cumulative, np.ceil(rank), side="right"))
+        value = lower + (upper - lower) * (rank - np.floor(rank))
+        result[percentile] = value / 1000
+    return result, total
+
+
+def print_time_percentiles(percentiles, total):
+    """Вывод перцентилей времени расчета"""
+    print_header("ПЕРЦЕНТИЛИ ВРЕМЕНИ РАСЧЕТА")
+    if not total:
+        print("✗ Время расчета отдельных точек не сохранено (например, движок sql-set)")
+        return
+
+    print(f"Учтено значений: {total}")
+    for percentile, value in percentiles.items():
+        print(f"- p{percentile:g}: {value:.3f} мс")
+
+
+def export_results_csv(conn, path, chunk_size=DEFAULT_CHUNK_SIZE, cache_entry=None):
+    """
+    Потоковая выгрузка interpolation_results в CSV порциями (NULL - пустое значение)
+
+    cache_entry - запись локального кеша, из которой читаются результаты вместо базы данных.
+    """
+    import pandas as pd
+
+    print_header("ВЫГРУЗКА РЕЗУЛЬТАТОВ В CSV")
+
+    start_time = time.perf_counter()
+    rows = 0
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            chunks = (cache_entry.iter_chunks(list(READER_COLUMNS), chunk_size) if cache_entry
+                      else iter_interpolation_results(conn, chunk_size=chunk_size))
+            for chunk in chunks:
+                pd.DataFrame(chunk).to_csv(file, header=rows == 0, index=False, na_rep="",
+                                           float_format="%.10g")
+                rows += len(chunk["id"])
+        conn.commit()
+    except (psycopg2.Error, OSError) as e:
+        print(f"✗ Ошибка выгрузки результатов: {e}")
+        conn.rollback()
         return False
 
-    print_header("СОЗДАНИЕ ВИЗУАЛИЗАЦИЙ")
+    print(f"✓ Выгружено {rows} строк в {path} за {time.perf_counter() - start_time:.2f} секунд")
+    return True
 
-    # Создаем директорию для сохранения, если её нет
-    os.makedirs(output_dir, exist_ok=True)
 
-    # Метка времени для имени файлов
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+def _as_float(value):
+    """Преобразование значения из базы данных в float (NULL -> NaN)"""
+    return float('nan') if value is None else float(value)
+
+
+# Подписи графиков производительности: строки - высоты, столбцы - диапазоны температур по 10 °C
+INTERPOLATION_CHART_AXES = {
+    "title": "Анализ производительности расчета интерполяций",
+    "row_label": "Высота (м)",
+    "row_title": "по высотам",
+    "row_width": 100,
+    "column_label": "Диапазон температур (°C)",
+    "column_title": "по температурам",
+    "heatmap_label": "Температура (°C)"
+}
 
-    # Извлекаем параметры из JSON
-    params = json.loads(metrics[7]) if metrics[7] else {}
 
-    # 1. График по высотам
-    print("- Создание графика по высотам...")
+def _import_pyplot():
+    """Импорт matplotlib с принудительным выбором неинтерактивного бэкенда Agg"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render_height_chart(height_stats, path, dpi, axes=INTERPOLATION_CHART_AXES):
+    """График по высотам: среднее время расчета и количество ошибок"""
+    start_time = time.perf_counter()
+    plt = _import_pyplot()
+
     plt.figure(figsize=(12, 6))
 
     heights = [row[0] for row in height_stats]
-    avg_times = [row[2] for row in height_stats]
+    avg_times = [_as_float(row[2]) for row in height_stats]
     error_counts = [row[5] for row in height_stats]
 
     ax1 = plt.subplot(111)
-    ax1.bar(heights, avg_times, width=100, alpha=0.7, color='skyblue', label='Среднее время (мс)')
-    ax1.set_xlabel('Высота (м)', fontsize=12)
+    ax1.bar(heights, avg_times, width=axes["row_width"], alpha=0.7, color='skyblue', label='Среднее время (мс)')
+    ax1.set_xlabel(axes["row_label"], fontsize=12)
     ax1.set_ylabel('Среднее время расчета (мс)', color='blue', fontsize=12)
     ax1.tick_params(axis='y', labelcolor='blue')
     ax1.grid(axis='y', linestyle='--', alpha=0.3)
 
     # Добавляем линию с ошибками
     ax2 = ax1.twinx()
-    error_line = ax2.plot(heights, error_counts, 'r-', linewidth=2, label='Количество ошибок')
+    ax2.plot(heights, error_counts, 'r-', linewidth=2, label='Количество ошибок')
     ax2.set_ylabel('Количество ошибок', color='red', fontsize=12)
     ax2.tick_params(axis='y', labelcolor='red')
 
@@ -307,33 +2102,37 @@ def create_performance_charts(metrics, height_stats, temp_stats, heatmap_data, o
     lines2, labels2 = ax2.get_legend_handles_labels()
     ax1.legend(lines + lines2, labels + labels2, loc='upper right')
 
-    plt.title('Анализ производительности по высотам', fontsize=14)
+    plt.title(f'Анализ производительности {axes["row_title"]}', fontsize=14)
     plt.tight_layout()
 
-    height_chart = f"{output_dir}/height_performance_{timestamp}.png"
-    plt.savefig(height_chart, dpi=dpi)
+    plt.savefig(path, dpi=dpi)
     plt.close()
+    return path, time.perf_counter() - start_time
+
+
+def render_temperature_chart(temp_stats, path, dpi, axes=INTERPOLATION_CHART_AXES):
+    """График по диапазонам температур: среднее время расчета и количество ошибок"""
+    start_time = time.perf_counter()
+    plt = _import_pyplot()
 
-    # 2. График по температурам
-    print("- Создание графика по температурам...")
     plt.figure(figsize=(12, 6))
 
     temp_ranges = [f"{int(row[0])}..{int(row[0]) + 10}" for row in temp_stats]
-    temp_avg_times = [row[2] for row in temp_stats]
+    temp_avg_times = [_as_float(row[2]) for row in temp_stats]
     temp_error_counts = [row[5] for row in temp_stats]
 
     ax1 = plt.subplot(111)
     ax1.bar(range(len(temp_ranges)), temp_avg_times, alpha=0.7, color='lightgreen', label='Среднее время (мс)')
     ax1.set_xticks(range(len(temp_ranges)))
     ax1.set_xticklabels(temp_ranges, rotation=45)
-    ax1.set_xlabel('Диапазон температур (°C)', fontsize=12)
+    ax1.set_xlabel(axes["column_label"], fontsize=12)
     ax1.set_ylabel('Среднее время расчета (мс)', color='green', fontsize=12)
     ax1.tick_params(axis='y', labelcolor='green')
     ax1.grid(axis='y', linestyle='--', alpha=0.3)
 
     # Линия с ошибками
     ax2 = ax1.twinx()
-    error_line = ax2.plot(range(len(temp_ranges)), temp_error_counts, 'r-', linewidth=2, label='Количество ошибок')
+    ax2.plot(range(len(temp_ranges)), temp_error_counts, 'r-', linewidth=2, label='Количество ошибок')
     ax2.set_ylabel('Количество ошибок', color='red', fontsize=12)
     ax2.tick_params(axis='y', labelcolor='red')
 
@@ -342,164 +2141,1451 @@ def create_performance_charts(metrics, height_stats, temp_stats, heatmap_data, o
     lines2, labels2 = ax2.get_legend_handles_labels()
     ax1.legend(lines + lines2, labels + labels2, loc='upper right')
 
-    plt.title('Анализ производительности по температурам', fontsize=14)
+    plt.title(f'Анализ производительности {axes["column_title"]}', fontsize=14)
     plt.tight_layout()
 
-    temp_chart = f"{output_dir}/temperature_performance_{timestamp}.png"
-    plt.savefig(temp_chart, dpi=dpi)
+    plt.savefig(path, dpi=dpi)
     plt.close()
+    return path, time.perf_counter() - start_time
 
-    # 3. Тепловая карта
-    if heatmap_data:
-        print("- Создание тепловой карты...")
 
-        # Преобразуем данные для тепловой карты
-        df = pd.DataFrame(heatmap_data, columns=['height', 'temp_group', 'avg_time', 'count'])
-        pivot_df = df.pivot(index='height', columns='temp_group', values='avg_time')
+def render_heatmap(heatmap_data, path, dpi, axes=INTERPOLATION_CHART_AXES):
+    """Тепловая карта среднего времени расчета по высотам и температурам"""
+    start_time = time.perf_counter()
+    import pandas as pd
+    plt = _import_pyplot()
+
+    # Преобразуем данные для тепловой карты
+    df = pd.DataFrame(heatmap_data, columns=['height', 'temp_group', 'avg_time', 'count'])
+    pivot_df = df.pivot(index='height', columns='temp_group', values='avg_time')
+
+    plt.figure(figsize=(14, 8))
 
-        plt.figure(figsize=(14, 8))
+    # Создаем тепловую карту
+    ax = plt.subplot(111)
+    heatmap = ax.pcolormesh(pivot_df.columns, pivot_df.index, pivot_df.astype(float).values,
+                            cmap='viridis', shading='auto')
 
-        # Создаем тепловую карту
-        ax = plt.subplot(111)
-        heatmap = ax.pcolormesh(pivot_df.columns, pivot_df.index, pivot_df.values,
-                                cmap='viridis', shading='auto')
+    # Цветовая шкала
+    cbar = plt.colorbar(heatmap)
+    cbar.set_label('Среднее время расчета (мс)', fontsize=12)
 
-        # Цветовая шкала
-        cbar = plt.colorbar(heatmap)
-        cbar.set_label('Среднее время расчета (мс)', fontsize=12)
+    plt.title('Тепловая карта времени расчета', fontsize=14)
+    plt.xlabel(axes["heatmap_label"], fontsize=12)
+    plt.ylabel(axes["row_label"], fontsize=12)
+    plt.tight_layout()
+
+    plt.savefig(path, dpi=dpi)
+    plt.close()
+    return path, time.perf_counter() - start_time
 
-        plt.title('Тепловая карта времени расчета', fontsize=14)
-        plt.xlabel('Температура (°C)', fontsize=12)
-        plt.ylabel('Высота (м)', fontsize=12)
-        plt.tight_layout()
 
-        heatmap_file = f"{output_dir}/heatmap_performance_{timestamp}.png"
-        plt.savefig(heatmap_file, dpi=dpi)
-        plt.close()
+def render_combined_chart(metrics, height_stats, temp_stats, path, dpi, axes=INTERPOLATION_CHART_AXES):
+    """Итоговый комбинированный график со сводной информацией"""
+    start_time = time.perf_counter()
+    plt = _import_pyplot()
+
+    # Извлекаем параметры из JSON
+    params = load_parameters(metrics[7])
+
+    heights = [row[0] for row in height_stats]
+    avg_times = [_as_float(row[2]) for row in height_stats]
+    temp_ranges = [f"{int(row[0])}..{int(row[0]) + 10}" for row in temp_stats]
+    temp_avg_times = [_as_float(row[2]) for row in temp_stats]
 
-    # 4. Итоговый комбинированный график
-    print("- Создание итогового графика...")
     plt.figure(figsize=(14, 10))
 
     # Статистические данные
     total_time = metrics[1]  # total_time_ms
     avg_time = metrics[4]  # avg_calculation_time_ms
-    min_time = metrics[5]  # min_calculation_time_ms
-    max_time = metrics[6]  # max_calculation_time_ms
+    time_stats = latency_statistics(metrics)
 
     # График 1: Высоты (верхний левый)
     plt.subplot(2, 2, 1)
-    plt.bar(heights, avg_times, width=100, alpha=0.7, color='skyblue')
-    plt.xlabel('Высота (м)')
+    plt.bar(heights, avg_times, width=axes["row_width"], alpha=0.7, color='skyblue')
+    plt.xlabel(axes["row_label"])
     plt.ylabel('Среднее время (мс)')
-    plt.title('Время расчета по высотам')
+    plt.title(f'Время расчета {axes["row_title"]}')
     plt.grid(axis='y', linestyle='--', alpha=0.3)
 
     # График 2: Температуры (верхний правый)
     plt.subplot(2, 2, 2)
     plt.bar(range(len(temp_ranges)), temp_avg_times, alpha=0.7, color='lightgreen')
     plt.xticks(range(len(temp_ranges)), temp_ranges, rotation=45)
-    plt.xlabel('Диапазон температур (°C)')
+    plt.xlabel(axes["column_label"])
     plt.ylabel('Среднее время (мс)')
-    plt.title('Время расчета по температурам')
+    plt.title(f'Время расчета {axes["column_title"]}')
     plt.grid(axis='y', linestyle='--', alpha=0.3)
 
     # График 3: Метрики времени (нижний левый)
     plt.subplot(2, 2, 3)
-    stat_values = [avg_time, min_time, max_time]
-    stat_labels = ['Среднее', 'Минимальное', 'Максимальное']
-    colors = ['#3498db', '#2ecc71', '#e74c3c']
-
-    bars = plt.bar(stat_labels, stat_values, alpha=0.7, color=colors)
-
-    # Добавляем значения над столбцами
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width() / 2., height + 0.02,
-                 f'{height:.4f}', ha='center', va='bottom', fontsize=9)
-
-    plt.ylabel('Время (мс)')
-    plt.title('Метрики времени выполнения')
-    plt.grid(axis='y', linestyle='--', alpha=0.3)
+    if time_stats:
+        stat_values = [_as_float(value) for _, value in time_stats]
+        stat_labels = [label for label, _ in time_stats]
+        colors = ['#2ecc71', '#3498db', '#f39c12', '#e74c3c'][:len(time_stats)]
+
+        bars = plt.bar(stat_labels, stat_values, alpha=0.7, color=colors)
+
+        # Добавляем значения над столбцами
+        for bar in bars:
+            height = bar.get_height()
+            plt.text(bar.get_x() + bar.get_width() / 2., height + 0.02,
+                     f'{height:.4f}', ha='center', va='bottom', fontsize=9)
+
+        plt.ylabel('Время (мс)')
+        plt.grid(axis='y', linestyle='--', alpha=0.3)
+    else:
+        plt.axis('off')
+        plt.text(0.5, 0.5, f"Не измеряется\n(движок {params.get('engine')}, только среднее время)",
+                 ha='center', va='center', fontsize=11)
+    plt.title('Время расчета точки')
 
     # График 4: Текстовая информация (нижний правый)
     plt.subplot(2, 2, 4)
     plt.axis('off')
 
-    total_calcs = metrics[2]
-    successful_calcs = metrics[3]
-
     info_text = (
         f"Анализ производительности расчетов\n"
         f"Дата и время: {metrics[8].strftime('%Y-%m-%d %H:%M:%S')}\n\n"
         f"Параметры расчета:\n"
-        f"- Диапазон температур: от {params.get('min_temperature', 'н/д')} до {params.get('max_temperature', 'н/д')} °C\n"
-        f"- Шаг расчета: {params.get('temperature_step', 'н/д')} °C\n"
-        f"- Количество высот: {params.get('heights_count', 'н/д')}\n\n"
+        + "".join(f"{line}\n" for line in describe_parameters(params)) + "\n"
         f"Результаты расчетов:\n"
-        f"- Всего расчетов: {total_calcs}\n"
-        f"- Успешных расчетов: {successful_calcs}\n"
-        f"- Процент успешных: {successful_calcs / total_calcs * 100:.2f}%\n\n"
+        + "".join(f"{line}\n" for line in describe_results(metrics, params)) + "\n"
         f"Время выполнения:\n"
         f"- Общее время: {total_time:.2f} мс ({total_time / 1000:.2f} с)\n"
-        f"- Среднее время: {avg_time:.4f} мс\n"
-        f"- Минимальное время: {min_time:.4f} мс\n"
-        f"- Максимальное время: {max_time:.4f} мс"
+        + (f"- Среднее время: {avg_time:.4f} мс\n" if avg_time is not None else "")
+        + ("\n".join(f"- {label}: {_as_float(value):.4f} мс" for label, value in time_stats)
+           or "- Время точки: не измеряется")
     )
 
     plt.text(0.05, 0.95, info_text, fontsize=10, verticalalignment='top')
     plt.title('Сводная информация')
 
     plt.tight_layout()
-    plt.suptitle('Анализ производительности расчета интерполяций', fontsize=16, y=1.02)
+    plt.suptitle(axes["title"], fontsize=16, y=1.02)
 
-    combined_file = f"{output_dir}/combined_performance_{timestamp}.png"
-    plt.savefig(combined_file, bbox_inches='tight', dpi=dpi)
+    plt.savefig(path, bbox_inches='tight', dpi=dpi)
     plt.close()
+    return path, time.perf_counter() - start_time
 
-    print("\n✓ Графики успешно созданы и сохранены:")
-    print(f"1. {height_chart}")
-    print(f"2. {temp_chart}")
 
+def create_performance_charts(metrics, height_stats, temp_stats, heatmap_data, output_dir="performance_results",
+                              dpi=300, axes=INTERPOLATION_CHART_AXES):
+    """
+    Создание визуализаций производительности
+
+    Каждый график строится независимой задачей в отдельном процессе,
+    поэтому графики по высотам, температурам, тепловая карта и итоговый
+    график отрисовываются одновременно. Число процессов ограничено числом
+    процессоров; на одном процессоре графики строятся последовательно
+    в текущем процессе. axes - подписи осей и заголовков (см. INTERPOLATION_CHART_AXES).
+    """
+    if not metrics or not height_stats or not temp_stats:
+        print("✗ Недостаточно данных для создания визуализаций")
+        return False
+
+    print_header("СОЗДАНИЕ ВИЗУАЛИЗАЦИЙ")
+
+    # Создаем директорию для сохранения, если её нет
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Метка времени для имени файлов
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # Задачи построения графиков: название, функция и аргументы
+    jobs = [
+        ("График по высотам", render_height_chart,
+         (height_stats, f"{output_dir}/height_performance_{timestamp}.png", dpi, axes)),
+        ("График по температурам", render_temperature_chart,
+         (temp_stats, f"{output_dir}/temperature_performance_{timestamp}.png", dpi, axes)),
+    ]
     if heatmap_data:
-        print(f"3. {heatmap_file}")
+        jobs.append(("Тепловая карта", render_heatmap,
+                     (heatmap_data, f"{output_dir}/heatmap_performance_{timestamp}.png", dpi, axes)))
+    jobs.append(("Итоговый график", render_combined_chart,
+                 (metrics, height_stats, temp_stats, f"{output_dir}/combined_performance_{timestamp}.png", dpi,
+                  axes)))
+
+    workers = min(len(jobs), os.cpu_count() or 1)
+    start_time = time.perf_counter()
+    if workers > 1:
+        print(f"- Построение {len(jobs)} графиков в {workers} параллельных процессах...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(function, *arguments) for _, function, arguments in jobs]
+            results = [future.result() for future in futures]
+    else:
+        print(f"- Построение {len(jobs)} графиков...")
+        results = [function(*arguments) for _, function, arguments in jobs]
+    total_time = time.perf_counter() - start_time
+
+    for (title, _, _), (_, elapsed) in zip(jobs, results):
+        print(f"  {title}: {elapsed:.2f} с")
+    print(f"  Всего: {total_time:.2f} с")
 
-    print(f"4. {combined_file} (итоговый)")
+    print("\n✓ Графики успешно созданы и сохранены:")
+    for index, (path, _) in enumerate(results, 1):
+        suffix = " (итоговый)" if index == len(results) else ""
+        print(f"{index}. {path}{suffix}")
 
+    combined_file = results[-1][0]
     return combined_file
 
 
-def display_summary(metrics):
-    """Вывод сводной информации по расчетам"""
+def latency_statistics(metrics):
+    """
+    Показатели времени расчета точки для сводки: перцентили по гистограмме
+    latency_histogram или, для записей без гистограммы, минимум и максимум.
+    Для движков UNTIMED_ENGINES время точки не измеряется - список пуст.
+    """
+    if load_parameters(metrics[7]).get('engine') in UNTIMED_ENGINES:
+        return []
+    percentiles, _ = histogram_percentiles(metrics[9])
+    if percentiles:
+        return [(f"p{percentile:g}", value) for percentile, value in percentiles.items()]
+    return [("Минимальное", metrics[5]), ("Максимальное", metrics[6])]
+
+
+def describe_parameters(params):
+    """
+    Строки описания параметров расчета для сводки и итогового графика
+
+    Для перебора параметров процедур поправок (sweep.py) в параметрах
+    хранится сетка grid: {параметр: {min, max, count}}.
+    """
+    if "grid" in params:
+        lines = [f"- Процедура: {params.get('procedure', 'н/д')} ({params.get('engine', 'н/д')})"]
+        lines += [f"- {name}: от {grid['min']} до {grid['max']}, значений: {grid['count']}"
+                  for name, grid in params["grid"].items()]
+        if "cache_hits" in params:
+            lines.append(f"- Из кеша: {params['cache_hits']} вызовов")
+        return lines
+    return [
+        f"- Диапазон температур: от {params.get('min_temperature', 'н/д')} до {params.get('max_temperature', 'н/д')} °C",
+        f"- Шаг расчета: {params.get('temperature_step', 'н/д')} °C",
+        f"- Количество высот: {params.get('heights_count', 'н/д')}"
+    ]
+
+
+def describe_results(metrics, params):
+    """
+    Строки результатов расчета для сводки и итогового графика
+
+    Повторный запуск --resume с теми же параметрами не рассчитывает ни одной
+    точки - вместо процента успешных выводится число пропущенных точек.
+    """
+    total_calcs = metrics[2]
+    successful_calcs = metrics[3]
+    lines = [
+        f"- Всего расчетов: {total_calcs}",
+        f"- Успешных расчетов: {successful_calcs}"
+    ]
+    if total_calcs:
+        lines.append(f"- Процент успешных: {successful_calcs / total_calcs * 100:.2f}%")
+    else:
+        lines.append("- Процент успешных: — (новых точек не рассчитано)")
+    if params.get('skipped_calculations'):
+        lines.append(f"- Пропущено уже рассчитанных точек: {params['skipped_calculations']}")
+    return lines
+
+
+def describe_timing_mode(params):
+    """Описание режима замера времени расчета точки"""
+    mode = params.get('timing_mode', 'point')
+    if mode == 'sample':
+        return f"каждая {params.get('sample_rate')}-я точка"
+    if mode == 'batch':
+        return "среднее время точки по пакетам"
+    return "каждая точка"
+
+
+def display_summary(metrics, cache_info=None, cache_size_mb=DEFAULT_RESULT_CACHE_SIZE_MB):
+    """Вывод сводной информации по расчетам (cache_info - попадание в локальный кеш результатов)"""
     if not metrics:
         return
 
     print_header("СВОДНАЯ ИНФОРМАЦИЯ ПО РАСЧЕТАМ")
 
-    params = json.loads(metrics[7]) if metrics[7] else {}
+    params = load_parameters(metrics[7])
     total_time = metrics[1]
-    total_calcs = metrics[2]
-    successful_calcs = metrics[3]
     avg_time = metrics[4]
-    min_time = metrics[5]
-    max_time = metrics[6]
 
     print(f"Параметры расчета:")
-    print(
-        f"- Диапазон температур: от {params.get('min_temperature', 'н/д')} до {params.get('max_temperature', 'н/д')} °C")
-    print(f"- Шаг расчета: {params.get('temperature_step', 'н/д')} °C")
-    print(f"- Количество высот: {params.get('heights_count', 'н/д')}")
+    for line in describe_parameters(params):
+        print(line)
 
     print(f"\nРезультаты расчетов:")
-    print(f"- Всего расчетов: {total_calcs}")
-    print(f"- Успешных расчетов: {successful_calcs}")
-    print(f"- Процент успешных: {successful_calcs / total_calcs * 100:.2f}%")
+    for line in describe_results(metrics, params):
+        print(line)
 
     print(f"\nВремя выполнения:")
     print(f"- Общее время: {total_time:.2f} мс ({total_time / 1000:.2f} с)")
-    print(f"- Среднее время: {avg_time:.4f} мс")
-    print(f"- Минимальное время: {min_time:.4f} мс")
-    print(f"- Максимальное время: {max_time:.4f} мс")
+    if avg_time is not None:
+        print(f"- Среднее время: {avg_time:.4f} мс")
+
+    time_stats = latency_statistics(metrics)
+    _, counted = histogram_percentiles(metrics[9])
+    if not time_stats:
+        print(f"\nВремя расчета точки: не измеряется (движок {params.get('engine')}, только среднее время)")
+    elif counted:
+        print(f"\nВремя расчета точки (замер: {describe_timing_mode(params)}, учтено точек: {counted}):")
+    for label, value in time_stats:
+        print(f"- {label}: {_as_float(value):.4f} мс")
+
+    if params.get('instrumentation'):
+        print_instrumentation(params['instrumentation'], float(total_time))
+
+    if params.get('storage'):
+        print_storage_metrics(params['storage'], float(total_time))
+
+    if cache_info:
+        print_cache_info(cache_info, cache_size_mb)
+
+
+def get_git_revision():
+    """Ревизия git каталога приложения (с пометкой -dirty при незафиксированных изменениях)"""
+    import subprocess
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        revision = subprocess.run(["git", "-C", directory, "rev-parse", "--short", "HEAD"],
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "-C", directory, "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{revision}-dirty" if status else revision
+
+
+def record_run_history(conn):
+    """
+    Запись последнего запуска в историю interpolation_run_history
+
+    Копируются метрики последней записи interpolation_performance, к ним
+    добавляются ревизия git, версия сервера и основные настройки сервера.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO snaart.interpolation_run_history (
+            engine,
+            min_temperature,
+            max_temperature,
+            temperature_step,
+            heights_count,
+            timing_mode,
+            workers,
+            total_time_ms,
+            total_calculations,
+            successful_calculations,
+            points_per_second,
+            latency_histogram,
+            parameters,
+            git_revision,
+            server_version,
+            server_settings
+        )
+        SELECT
+            COALESCE(p.parameters->>'engine', 'procedure'),
+            (p.parameters->>'min_temperature')::NUMERIC,
+            (p.parameters->>'max_temperature')::NUMERIC,
+            (p.parameters->>'temperature_step')::NUMERIC,
+            (p.parameters->>'heights_count')::INTEGER,
+            COALESCE(p.parameters->>'timing_mode', 'point'),
+            COALESCE((p.parameters->>'workers')::INTEGER, 1),
+            p.total_time_ms,
+            p.total_calculations,
+            p.successful_calculations,
+            p.total_calculations / NULLIF(p.total_time_ms, 0) * 1000,
+            p.latency_histogram,
+            p.parameters,
+            %s,
+            current_setting('server_version'),
+            (SELECT jsonb_object_agg(name, current_setting(name)) FROM pg_settings WHERE name = ANY(%s))
+        FROM snaart.interpolation_performance AS p
+        ORDER BY p.id DESC
+        LIMIT 1
+        RETURNING id;
+        """,
+        (get_git_revision(), HISTORY_SERVER_SETTINGS)
+    )
+    row = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    return row[0] if row else None
+
+
+def fetch_run_history(conn, limit=DEFAULT_HISTORY_LIMIT):
+    """Последние запуски из истории в порядке времени записи"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT *
+        FROM (
+            SELECT
+                id,
+                recorded_at,
+                engine,
+                min_temperature,
+                max_temperature,
+                temperature_step,
+                heights_count,
+                timing_mode,
+                workers,
+                COALESCE((parameters->>'resume')::BOOLEAN, FALSE) AS resume,
+                COALESCE(parameters->>'storage_mode', 'default') AS storage_mode,
+                parameters->'storage' AS storage,
+                total_time_ms,
+                total_calculations,
+                points_per_second,
+                latency_histogram,
+                git_revision,
+                server_version
+            FROM snaart.interpolation_run_history
+            ORDER BY id DESC
+            LIMIT %s
+        ) AS h
+        ORDER BY id;
+        """,
+        (limit,)
+    )
+    columns = [description[0] for description in cursor.description]
+    runs = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    cursor.close()
+    return runs
+
+
+def comparable_key(run):
+    """Набор параметров, при совпадении которого запуски сравнимы между собой"""
+    return (
+        run['engine'],
+        _as_float(run['min_temperature']),
+        _as_float(run['max_temperature']),
+        _as_float(run['temperature_step']),
+        run['heights_count'],
+        run['timing_mode'],
+        run['workers'],
+        run['resume'],
+        run['storage_mode']
+    )
+
+
+def describe_comparable_key(key):
+    """Описание набора параметров для вывода"""
+    engine, min_temp, max_temp, step, heights_count, timing_mode, workers, resume, storage_mode = key
+    text = (f"{engine}: от {min_temp:g} до {max_temp:g} °C, шаг {step:g}, высот {heights_count}, "
+            f"замер {timing_mode}")
+    if workers and workers > 1:
+        text += f", соединений {workers}"
+    if resume:
+        text += ", продолжение"
+    if storage_mode != 'default':
+        text += f", хранение {storage_mode}"
+    return text
+
+
+def histogram_log_statistics(histogram):
+    """
+    Количество, среднее и дисперсия log2 времени расчета точки (мкс) по гистограмме
+
+    Значения корзины принимаются равными середине корзины в логарифмической
+    шкале; корзина «меньше 1 мкс» считается значением 0.5 мкс.
+    """
+    count = 0
+    total = 0.0
+    total_squares = 0.0
+    for bucket, bucket_count in enumerate(histogram or [], 1):
+        if not bucket_count:
+            continue
+        value = -1.0 if bucket == 1 else (bucket - 1.5) / LATENCY_BUCKETS_PER_OCTAVE
+        count += bucket_count
+        total += bucket_count * value
+        total_squares += bucket_count * value * value
+
+    if count < 2:
+        return count, None, None
+    mean = total / count
+    variance = max((total_squares - count * mean * mean) / (count - 1), 0.0)
+    return count, mean, variance
+
+
+def welch_slowdown_test(before, after):
+    """
+    Односторонний тест Уэлча на рост log2 времени расчета точки
+
+    Возвращает отношение геометрических средних времени (after / before)
+    и p-значение. Выборки - тысячи точек, поэтому распределение
+    t-статистики приближается нормальным. Если в одной из выборок все
+    значения попали в одну корзину (нулевая дисперсия, например среднее
+    время пакета), разброс неизвестен и тест не выполняется: (None, None).
+    """
+    import math
+
+    count_before, mean_before, variance_before = histogram_log_statistics(before)
+    count_after, mean_after, variance_after = histogram_log_statistics(after)
+    if mean_before is None or mean_after is None or not variance_before or not variance_after:
+        return None, None
+
+    ratio = 2 ** (mean_after - mean_before)
+    standard_error = math.sqrt(variance_before / count_before + variance_after / count_after)
+
+    t_statistic = (mean_after - mean_before) / standard_error
+    return ratio, 0.5 * math.erfc(t_statistic / math.sqrt(2))
+
+
+def analyze_run_history(runs, significance=DEFAULT_SIGNIFICANCE, min_slowdown=DEFAULT_MIN_SLOWDOWN):
+    """
+    Группировка запусков по сравнимым параметрам и поиск замедлений
+
+    Каждый запуск сравнивается с предыдущим запуском той же группы:
+    замедлением считается рост времени расчета точки не меньше min_slowdown,
+    значимый по тесту Уэлча на уровне significance, или падение пропускной
+    способности (точек в секунду) не меньше min_slowdown. Для движков
+    UNTIMED_ENGINES времени точки нет, и проверяется только пропускная
+    способность; запуски без рассчитанных точек в сравнение не попадают.
+    Возвращает словарь {набор параметров: список запусков}; у запусков
+    заполняются p99_ms, latency_ratio, p_value, throughput_ratio и slowdown.
+    """
+    groups = {}
+    for run in runs:
+        # Гистограммы движков без замера точек в ранних записях - одна корзина со средним временем
+        if run['engine'] in UNTIMED_ENGINES:
+            run['latency_histogram'] = None
+        percentiles, _ = histogram_percentiles(run['latency_histogram'], [50, 99])
+        run['p50_ms'] = percentiles.get(50)
+        run['p99_ms'] = percentiles.get(99)
+        run['latency_ratio'] = None
+        run['p_value'] = None
+        run['throughput_ratio'] = None
+        run['slowdown'] = False
+
+        group = groups.setdefault(comparable_key(run), [])
+        if group:
+            ratio, p_value = welch_slowdown_test(group[-1]['latency_histogram'], run['latency_histogram'])
+            run['latency_ratio'] = ratio
+            run['p_value'] = p_value
+            run['slowdown'] = ratio is not None and ratio - 1 >= min_slowdown and p_value < significance
+
+        # Пропускная способность - относительно последнего запуска группы, в котором были рассчитаны точки
+        throughput = _as_float(run['points_per_second'])
+        previous = [_as_float(other['points_per_second']) for other in group
+                    if _as_float(other['points_per_second']) > 0]
+        if throughput > 0 and previous:
+            run['throughput_ratio'] = throughput / previous[-1]
+            run['slowdown'] |= 1 - run['throughput_ratio'] >= min_slowdown
+        group.append(run)
+    return groups
+
+
+def render_history_chart(groups, path, dpi):
+    """График истории запусков: пропускная способность и p99 по времени, замедления отмечены"""
+    plt = _import_pyplot()
+
+    figure, (throughput_axis, latency_axis) = plt.subplots(2, 1, figsize=(14, 10), sharex=True)
+    for key, group in groups.items():
+        label = describe_comparable_key(key)
+        dates = [run['recorded_at'] for run in group]
+        throughput = [_as_float(run['points_per_second']) for run in group]
+        p99 = [_as_float(run['p99_ms']) for run in group]
+
+        line, = throughput_axis.plot(dates, throughput, marker='o', label=label)
+        latency_axis.plot(dates, p99, marker='o', color=line.get_color())
+
+        slow = [index for index, run in enumerate(group) if run['slowdown']]
+        if slow:
+            throughput_axis.scatter([dates[index] for index in slow], [throughput[index] for index in slow],
+                                    s=150, facecolors='none', edgecolors='red', linewidths=2, zorder=3)
+            latency_axis.scatter([dates[index] for index in slow], [p99[index] for index in slow],
+                                 s=150, facecolors='none', edgecolors='red', linewidths=2, zorder=3)
+
+    throughput_axis.set_ylabel('Точек в секунду')
+    throughput_axis.set_title('Пропускная способность (красным отмечены замедления)')
+    throughput_axis.grid(linestyle='--', alpha=0.3)
+    throughput_axis.legend(fontsize=8)
+
+    latency_axis.set_ylabel('p99 времени точки (мс)')
+    latency_axis.set_title('Время расчета точки p99 (красным отмечены значимые замедления)')
+    latency_axis.grid(linestyle='--', alpha=0.3)
+    latency_axis.set_xlabel('Дата запуска')
+
+    figure.autofmt_xdate()
+    plt.tight_layout()
+    plt.savefig(path, bbox_inches='tight', dpi=dpi)
+    plt.close(figure)
+    return path
+
+
+def run_history_command(conn, args):
+    """Команда history: история запусков, тренды и значимые замедления"""
+    print_header("ИСТОРИЯ ЗАПУСКОВ")
+
+    try:
+        runs = fetch_run_history(conn, args.history_limit)
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"✗ Не удалось прочитать историю запусков: {e}")
+        conn.rollback()
+        return False
+
+    if not runs:
+        print("✗ История запусков пуста")
+        return False
+
+    groups = analyze_run_history(runs, args.significance, args.min_slowdown)
+    print(f"Запусков: {len(runs)}, групп сравнимых параметров: {len(groups)}")
+    print(f"Замедление: рост времени точки от {args.min_slowdown * 100:g}% при p < {args.significance:g} "
+          f"или падение пропускной способности от {args.min_slowdown * 100:g}%")
+
+    slowdowns = 0
+    for key, group in groups.items():
+        print(f"\n{describe_comparable_key(key)}")
+        for run in group:
+            change = ""
+            if run['latency_ratio'] is not None or run['throughput_ratio'] is not None:
+                changes = []
+                if run['throughput_ratio'] is not None:
+                    changes.append(f"пропускная способность {(run['throughput_ratio'] - 1) * 100:+.1f}%")
+                if run['latency_ratio'] is not None:
+                    changes.append(f"время точки {(run['latency_ratio'] - 1) * 100:+.1f}% (p={run['p_value']:.2g})")
+                change = f" {'✗' if run['slowdown'] else '✓'} {', '.join(changes)}"
+            p99 = f"{run['p99_ms']:.4f} мс" if run['p99_ms'] is not None else "н/д"
+            storage = ""
+            if run['storage']:
+                size = (run['storage']['table_bytes'] + run['storage']['index_bytes']) / 1024 / 1024
+                storage = f", {size:.2f} МБ, запросы анализа {sum(run['storage']['queries'].values()):.2f} мс"
+            print(f"  #{run['id']} {run['recorded_at'].strftime('%Y-%m-%d %H:%M:%S')} "
+                  f"{run['git_revision'] or 'н/д'} PostgreSQL {run['server_version']}: "
+                  f"{_as_float(run['points_per_second']):.0f} точек/с, p99 {p99}{storage}{change}")
+            slowdowns += run['slowdown']
+
+    if slowdowns:
+        print(f"\n✗ Обнаружено значимых замедлений: {slowdowns}")
+    else:
+        print("\n✓ Значимых замедлений не обнаружено")
+
+    if not args.no_plots:
+        os.makedirs(args.output_dir, exist_ok=True)
+        path = f"{args.output_dir}/history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+        render_history_chart(groups, path, args.dpi)
+        print(f"✓ График истории сохранен: {path}")
+    return True
+
+
+def load_validation_ranges(conn):
+    """
+    Диапазоны проверки fn_check_input_params из measurment_settings
+
+    Границы приводятся к NUMERIC(8,2), как в функции, и возвращаются
+    в сотых долях; NULL в настройке считается '0'. Если одной из
+    настроек диапазона нет, проверка не проходит ни для одной строки (None).
+    """
+    keys = [key for _, min_key, max_key in REPORT_CHECKS for key in (min_key, max_key)]
+    cursor = conn.cursor()
+    cursor.execute("SELECT key, value FROM snaart.measurment_settings WHERE key = ANY(%s);", (keys,))
+    settings = dict(cursor.fetchall())
+    cursor.close()
+
+    ranges = {}
+    for column, min_key, max_key in REPORT_CHECKS:
+        if min_key not in settings or max_key not in settings:
+            ranges[column] = None
+            continue
+        ranges[column] = tuple(
+            float(Decimal(settings[key] if settings[key] is not None else '0').quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+            for key in (min_key, max_key)
+        )
+    return ranges
+
+
+def iter_measurements(conn, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Потоковое чтение измерений (measurment_input_params + measurment_baths) порциями
+
+    Возвращает пары (идентификаторы сотрудников, {столбец: массив значений
+    в сотых долях}); NULL превращается в NaN.
+    """
+    import numpy as np
+
+    columns = [column for column, _, _ in REPORT_CHECKS]
+    expressions = ", ".join(f"(t1.{column} * 100)::float8" for column in columns)
+    cursor = conn.cursor(name="measurements_reader")
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(f"""
+            SELECT t2.emploee_id, {expressions}
+            FROM snaart.measurment_input_params AS t1
+            INNER JOIN snaart.measurment_baths AS t2 ON t2.measurment_input_param_id = t1.id
+        """)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            data = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns) + 1)
+            yield data[:, 0].astype(np.int64), {column: data[:, index] for index, column in enumerate(columns, 1)}
+    finally:
+        cursor.close()
+
+
+def build_fails_reports(conn, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Отчеты vw_report_fails_statistics и vw_report_fails_height_statistics за один проход
+
+    Диапазоны проверки читаются один раз, измерения - порциями; проверка
+    fn_check_input_params выполняется сравнением целых столбцов. Ошибка
+    проверки температуры, как и в представлениях, прерывает построение отчета:
+    сообщение о ней в функции формируется строкой формата с '% ', и format()
+    завершается ошибкой.
+    Возвращает строки обоих отчетов в порядке сортировки представлений.
+    """
+    import numpy as np
+
+    ranges = load_validation_ranges(conn)
+    totals = {}  # emploee_id -> [количество, ошибок, мин. высота, макс. высота]
+
+    for employee_ids, columns in iter_measurements(conn, chunk_size):
+        passed = np.ones(len(employee_ids), dtype=bool)
+        for column, _, _ in REPORT_CHECKS:
+            bounds = ranges[column]
+            values = columns[column]
+            # NaN (NULL) не попадает в диапазон, как BETWEEN с NULL
+            in_range = (values >= bounds[0]) & (values <= bounds[1]) if bounds else np.zeros(len(values), dtype=bool)
+            if column == 'temperature' and not np.all(in_range):
+                raise ValueError(REPORT_CHECK_FORMAT_ERROR)
+            passed &= in_range
+
+        ids, inverse = np.unique(employee_ids, return_inverse=True)
+        quantity = np.bincount(inverse, minlength=len(ids))
+        fails = np.bincount(inverse, weights=~passed, minlength=len(ids))
+        # min/max по высоте пропускают NULL (fmin/fmax игнорируют NaN)
+        min_height = np.full(len(ids), np.nan)
+        max_height = np.full(len(ids), np.nan)
+        np.fmin.at(min_height, inverse, columns['height'])
+        np.fmax.at(max_height, inverse, columns['height'])
+
+        for employee_id, count, fail_count, low, high in zip(ids.tolist(), quantity.tolist(), fails.tolist(),
+                                                              min_height.tolist(), max_height.tolist()):
+            total = totals.setdefault(employee_id, [0, 0, float('nan'), float('nan')])
+            total[0] += count
+            total[1] += int(fail_count)
+            total[2] = float(np.fmin(total[2], low))
+            total[3] = float(np.fmax(total[3], high))
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT t1.id, t1.name, t2.description
+        FROM snaart.employees AS t1
+        INNER JOIN snaart.military_ranks AS t2 ON t1.military_rank_id = t2.id
+        ORDER BY t1.id;
+    """)
+    employees = cursor.fetchall()
+    cursor.close()
+
+    def height_value(value):
+        # coalesce(min(height), 0) над NUMERIC(8,2)
+        return Decimal(0) if value != value else Decimal(int(value)).scaleb(-2)
+
+    stats_rows = []
+    height_rows = []
+    for employee_id, user_name, position in employees:
+        quantity, fails, min_height, max_height = totals.get(employee_id, [0, 0, float('nan'), float('nan')])
+        stats_rows.append((user_name, position, quantity, fails))
+        height_rows.append((user_name, position, quantity, fails, height_value(min_height), height_value(max_height)))
+
+    stats_rows.sort(key=lambda row: -row[3])
+    height_rows.sort(key=lambda row: (row[3], row[4]))
+    return stats_rows, height_rows
+
+
+def fetch_report_view(conn, view):
+    """Строки представления отчета и время запроса (мс); при ошибке - текст ошибки вместо строк"""
+    cursor = conn.cursor()
+    start_time = time.perf_counter()
+    try:
+        cursor.execute(f"SELECT * FROM snaart.{view};")
+        rows = cursor.fetchall()
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        rows = e.diag.message_primary
+    finally:
+        cursor.close()
+    return rows, (time.perf_counter() - start_time) * 1000
+
+
+def reports_match(rows, view_rows, sort_key):
+    """
+    Совпадение отчета с представлением
+
+    Порядок строк с одинаковым ключом сортировки в представлении не определен,
+    поэтому сравниваются наборы строк и последовательность ключей сортировки.
+    """
+    if isinstance(rows, str) or isinstance(view_rows, str):
+        return rows == view_rows
+    return (sorted(rows, key=repr) == sorted(view_rows, key=repr)
+            and [sort_key(row) for row in rows] == [sort_key(row) for row in view_rows])
+
+
+def print_report_table(title, columns, rows):
+    """Вывод отчета таблицей"""
+    print(f"\n{title}")
+    if isinstance(rows, str):
+        print(f"  ✗ {rows}")
+        return
+    widths = [max([len(column)] + [len(str(row[index])) for row in rows]) for index, column in enumerate(columns)]
+    print("  " + " | ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    print("  " + "-+-".join("-" * width for width in widths))
+    for row in rows:
+        print("  " + " | ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+
+def run_report_command(conn, args):
+    """Команда report: отчеты об ошибках измерений и сравнение времени с представлениями"""
+    print_header("ОТЧЕТЫ ОБ ОШИБКАХ ИЗМЕРЕНИЙ")
+
+    start_time = time.perf_counter()
+    try:
+        stats_rows, height_rows = build_fails_reports(conn, args.chunk_size)
+        conn.commit()
+    except ValueError as e:
+        conn.rollback()
+        stats_rows = height_rows = str(e)
+    except psycopg2.Error as e:
+        print(f"✗ Не удалось построить отчеты: {e}")
+        conn.rollback()
+        return False
+    report_time_ms = (time.perf_counter() - start_time) * 1000
+
+    print_report_table("Статистика ошибок при проведении измерений",
+                       ["ФИО", "Должность", "Измерений", "Ошибок"], stats_rows)
+    print_report_table("Самая эффективная высота измерения",
+                       ["ФИО", "Должность", "Измерений", "Ошибок", "Мин. высота", "Макс. высота"], height_rows)
+
+    print_header("СРАВНЕНИЕ С ПРЕДСТАВЛЕНИЯМИ")
+    view_stats, stats_time_ms = fetch_report_view(conn, "vw_report_fails_statistics")
+    view_heights, heights_time_ms = fetch_report_view(conn, "vw_report_fails_height_statistics")
+    views_time_ms = stats_time_ms + heights_time_ms
+
+    identical = True
+    for view, rows, view_rows, sort_key in [
+        ("vw_report_fails_statistics", stats_rows, view_stats, lambda row: row[3]),
+        ("vw_report_fails_height_statistics", height_rows, view_heights, lambda row: (row[3], row[4]))
+    ]:
+        match = reports_match(rows, view_rows, sort_key)
+        identical &= match
+        print(f"{'✓' if match else '✗'} {view}: {'совпадает' if match else 'РАСХОДИТСЯ'}")
+
+    print(f"Оба отчета за один проход: {report_time_ms:.1f} мс")
+    print(f"Представления: {views_time_ms:.1f} мс "
+          f"(vw_report_fails_statistics {stats_time_ms:.1f} мс, "
+          f"vw_report_fails_height_statistics {heights_time_ms:.1f} мс)")
+    if report_time_ms > 0:
+        print(f"Ускорение: {views_time_ms / report_time_ms:.1f}x")
+    return identical
+
+
+def _lpad(texts, length):
+    """lpad(text, length, '0') PostgreSQL для массива строк: длинная строка обрезается справа"""
+    import numpy as np
+    return np.char.zfill(texts, length).astype(f"<U{length}")
+
+
+def _format_scaled(values):
+    """
+    Тексты значений NUMERIC(8,2), заданных в сотых долях (как приведение к text)
+
+    Различных значений в порции немного, поэтому форматируются только
+    уникальные, а результат раскладывается по строкам индексом.
+    """
+    import numpy as np
+    unique, inverse = np.unique(values, return_inverse=True)
+    magnitude = np.abs(unique)
+    texts = np.char.add(np.char.add(np.where(unique < 0, "-", ""), (magnitude // 100).astype(str)), ".")
+    return np.char.add(texts, np.char.zfill((magnitude % 100).astype(str), 2))[inverse]
+
+
+def header_period(moment):
+    """ДДЧЧМ, как fn_calc_header_period"""
+    minute = str(moment.minute)
+    return (f"{moment.day:02d}{moment.hour:02d}"
+            + ("0" if moment.minute < 10 else minute[0]))
+
+
+def load_header_settings(conn):
+    """
+    Табличные значения давления и температуры, как их читают
+    fn_calc_header_pressure и fn_calc_header_temperature (в сотых долях)
+
+    Давление: нет настройки - 750, NULL - результат NULL.
+    Температура: нет настройки - результат NULL (SELECT INTO без строк), NULL - 15.9.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT key, value FROM snaart.measurment_settings
+        WHERE key IN ('calc_table_pressure', 'calc_table_temperature');
+    """)
+    settings = dict(cursor.fetchall())
+    cursor.close()
+
+    def scaled(value):
+        return int(Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+    if 'calc_table_pressure' not in settings:
+        table_pressure = 75000
+    else:
+        table_pressure = None if settings['calc_table_pressure'] is None else scaled(settings['calc_table_pressure'])
+
+    if 'calc_table_temperature' not in settings:
+        table_temperature = None
+    else:
+        value = settings['calc_table_temperature']
+        table_temperature = 1590 if value is None else scaled(value)
+    return table_pressure, table_temperature
+
+
+def iter_input_params(conn, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Потоковое чтение measurment_input_params порциями в порядке id
+
+    Возвращает пары (id, {столбец: массив значений в сотых долях}); NULL - NaN.
+    """
+    import numpy as np
+
+    columns = [column for column, _, _ in REPORT_CHECKS]
+    expressions = ", ".join(f"({column} * 100)::float8" for column in columns)
+    cursor = conn.cursor(name="input_params_reader")
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(f"SELECT id, {expressions} FROM snaart.measurment_input_params ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            data = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns) + 1)
+            yield data[:, 0].astype(np.int64), {column: data[:, index] for index, column in enumerate(columns, 1)}
+    finally:
+        cursor.close()
+
+
+def compute_meteo_headers(ids, columns, ranges, table_pressure, table_temperature, knot_index, period):
+    """
+    Заголовки метео приближенного и отклонения для порции измерений
+
+    Повторяет fn_calc_header_pressure, fn_calc_header_temperature и
+    fn_calc_header_meteo_avg для каждой строки: расчеты и форматирование
+    выполняются над целыми столбцами в сотых долях. Там, где функция
+    завершилась бы ошибкой, значение - NULL, а текст ошибки записывается
+    в temperature_error / header_error. Возвращает столбцы HEADER_COLUMNS
+    после id парами (массив строк, маска NULL).
+    """
+    import numpy as np
+    from knot_index import _round_half_away
+
+    count = len(ids)
+    nulls = {column: np.isnan(values) for column, values in columns.items()}
+    scaled = {column: np.nan_to_num(values).astype(np.int64) for column, values in columns.items()}
+
+    # Отклонение наземного давления: pressure - табличное значение
+    pressure_null = nulls['pressure'] | (table_pressure is None)
+    pressure_deviation = scaled['pressure'] - (table_pressure or 0)
+
+    # Отклонение приземной виртуальной температуры: t + поправка(t) - табличное значение
+    temperature = scaled['temperature']
+    knots_x = knot_index.knots["x"]
+    interpolated = ~nulls['temperature'] & (temperature >= knots_x[0]) & (temperature <= knots_x[-1])
+    out_of_range = ~nulls['temperature'] & ~interpolated
+    correction = np.zeros(count, dtype=np.int64)
+    if np.any(interpolated):
+        correction[interpolated] = knot_index.evaluate_scaled(temperature[interpolated])
+    temperature_null = ~interpolated | (table_temperature is None)
+    temperature_deviation = temperature + correction - (table_temperature or 0)
+    range_error = None
+    if np.any(out_of_range):
+        try:
+            knot_index.evaluate_scaled(temperature[out_of_range][:1])
+        except ValueError as e:
+            range_error = str(e)
+
+    # Проверка параметров fn_check_input_params: ошибка температуры - ошибка format(),
+    # иначе сообщение последней не прошедшей проверки
+    passed = {}
+    for column, _, _ in REPORT_CHECKS:
+        bounds = ranges[column]
+        values = columns[column]
+        passed[column] = (values >= bounds[0]) & (values <= bounds[1]) if bounds else np.zeros(count, dtype=bool)
+    check_messages = [
+        ('pressure', 'Ошибка Давление {} не укладывает в диаппазон!'),
+        ('height', 'Ошибка Высота  {} не укладывает в диаппазон!'),
+        ('wind_direction', 'Ошибка Направление ветра {} не укладывает в диаппазон!')
+    ]
+
+    # БББ зависит только от знака и целой части давления.
+    # TT в результат fn_calc_header_meteo_avg не попадает: функция выбирает его отдельным
+    # столбцом, а SELECT ... INTO var_result берет только первый
+    pressure_int = np.abs(_round_half_away(scaled['pressure'], 100))
+    pressure_text = _lpad(np.char.add(np.where(scaled['pressure'] < 0, "5", ""),
+                                      _lpad(pressure_int.astype(str), 2)), 3)
+    prefix = period + "0340"  # lpad('340', 4, '0')
+
+    # Последняя не прошедшая проверка перекрывает предыдущие, ошибка температуры - все
+    header_error = np.full(count, "")
+    invalid = ~passed['temperature']
+    for column, message in check_messages:
+        failed = ~passed[column]
+        invalid |= failed
+        if np.any(failed):
+            before, after = message.split("{}")
+            values = np.where(nulls[column], "", _format_scaled(scaled[column]))
+            header_error = np.where(failed, np.char.add(np.char.add(before, values), after), header_error)
+    header_error = np.where(passed['temperature'], header_error, REPORT_CHECK_FORMAT_ERROR)
+
+    return [
+        (_format_scaled(pressure_deviation), pressure_null),
+        (_format_scaled(temperature_deviation), temperature_null),
+        (np.char.add(prefix, pressure_text), invalid),
+        (np.full(count, range_error or ""), ~out_of_range | (range_error is None)),
+        (header_error, ~invalid)
+    ]
+
+
+def fetch_sql_headers(conn, row_ids):
+    """
+    Те же значения, рассчитанные функциями fn_calc_header_* (для сверки)
+
+    Каждая строка считается в своей точке сохранения, чтобы ошибку функции
+    можно было сравнить с текстом ошибки пакетного расчета.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SET LOCAL client_min_messages = warning;")
+    results = {}
+
+    def call(expression, row_id):
+        cursor.execute("SAVEPOINT header_check;")
+        try:
+            cursor.execute(f"SELECT {expression} FROM snaart.measurment_input_params AS t WHERE id = %s;", (row_id,))
+            value = cursor.fetchone()[0]
+            cursor.execute("RELEASE SAVEPOINT header_check;")
+            return value, None
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT header_check;")
+            return None, e.diag.message_primary
+
+    for row_id in row_ids:
+        pressure, _ = call("snaart.fn_calc_header_pressure(t.pressure)", row_id)
+        temperature, temperature_error = call("snaart.fn_calc_header_temperature(t.temperature)", row_id)
+        header, header_error = call(
+            "snaart.fn_calc_header_meteo_avg((t.height, t.temperature, t.pressure, t.wind_direction, "
+            "t.wind_speed, t.bullet_demolition_range)::snaart.input_params)", row_id)
+        results[row_id] = (
+            row_id,
+            None if pressure is None else f"{pressure:.2f}",
+            None if temperature is None else f"{temperature:.2f}",
+            header, temperature_error, header_error
+        )
+    cursor.close()
+    return results
+
+
+def header_row(ids, columns, index):
+    """Строка результата compute_meteo_headers в виде кортежа (NULL - None)"""
+    return (int(ids[index]),) + tuple(None if null[index] else str(texts[index]) for texts, null in columns)
+
+
+def encode_headers_csv(ids, columns):
+    """
+    Кодирование порции заголовков в CSV по столбцам
+
+    NULL - пустое значение без кавычек; значения с запятой, кавычкой или
+    переводом строки берутся в кавычки, как в csv.writer. Значения готовятся
+    операциями над массивами, а строки собираются одним join на порцию.
+    """
+    import numpy as np
+
+    if not len(ids):
+        return b""
+    fields = [map(str, ids.tolist())]
+    for texts, null in columns:
+        texts = np.where(null, "", texts)
+        present = np.flatnonzero(~null)
+        values = texts[present]
+        special = np.zeros(len(values), dtype=bool)
+        for char in ',"\n\r':
+            special |= np.char.find(values, char) >= 0
+        if np.any(special):
+            texts = texts.astype(object)
+            quoted = values[special]
+            texts[present[special]] = np.char.add(np.char.add('"', np.char.replace(quoted, '"', '""')), '"')
+        fields.append(texts.tolist())
+    return ("\n".join(map(",".join, zip(*fields))) + "\n").encode("utf-8")
+
+
+def run_headers_command(conn, db_config, args):
+    """
+    Команда headers: пакетный расчет заголовков метео приближенного по всем измерениям
+
+    Измерения читаются отдельным соединением: пока идет COPY ... FROM STDIN,
+    основное соединение не может выполнять FETCH именованного курсора.
+    """
+    import numpy as np
+    from knot_index import KnotIndex
+
+    print_header("ПАКЕТНЫЙ РАСЧЕТ ЗАГОЛОВКОВ МЕТЕО ПРИБЛИЖЕННОГО")
+
+    stats = {"rows": 0}
+    reader = None
+    try:
+        reader = psycopg2.connect(**db_config)
+        # Настройки, таблица поправок и момент формирования читаются один раз;
+        # now() в SQL-функциях - время начала транзакции, поэтому сверка в той же
+        # транзакции получает тот же ДДЧЧМ
+        cursor = conn.cursor()
+        cursor.execute("SELECT now();")
+        period = header_period(cursor.fetchone()[0])
+        ranges = load_validation_ranges(conn)
+        table_pressure, table_temperature = load_header_settings(conn)
+        knot_index = KnotIndex.from_connection(conn)
+
+        sample_ids = set()
+        if args.headers_verify > 0:
+            # Выборка для сверки делается на сервере, клиенту передаются только ее id
+            cursor.execute("SELECT id FROM snaart.measurment_input_params ORDER BY random() LIMIT %s;",
+                           (args.headers_verify,))
+            sample_ids = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        sample_ids_array = np.array(sorted(sample_ids), dtype=np.int64)
+        sample_rows = {}
+
+        def encoded_chunks():
+            if args.headers_file:
+                yield (",".join(name for name, _ in HEADER_COLUMNS) + "\n").encode("utf-8")
+            for ids, columns in iter_input_params(reader, args.chunk_size):
+                headers = compute_meteo_headers(ids, columns, ranges, table_pressure, table_temperature,
+                                                knot_index, period)
+                stats["rows"] += len(ids)
+                for index in np.flatnonzero(np.isin(ids, sample_ids_array)):
+                    row = header_row(ids, headers, index)
+                    sample_rows[row[0]] = row
+                yield encode_headers_csv(ids, headers)
+
+        start_time = time.perf_counter()
+        stream = CopyStream(encoded_chunks())
+        if args.headers_file:
+            with open(args.headers_file, "wb") as file:
+                while True:
+                    data = stream.read(1 << 16)
+                    if not data:
+                        break
+                    file.write(data)
+            target = args.headers_file
+        else:
+            cursor = conn.cursor()
+            definition = ", ".join(f"{name} {kind}" for name, kind in HEADER_COLUMNS)
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {args.headers_table} ({definition});")
+            if not args.keep_previous:
+                cursor.execute(f"TRUNCATE {args.headers_table};")
+            columns = ", ".join(name for name, _ in HEADER_COLUMNS)
+            cursor.copy_expert(f"COPY {args.headers_table} ({columns}) FROM STDIN WITH (FORMAT csv)",
+                               stream, size=1 << 16)
+            cursor.close()
+            target = args.headers_table
+        elapsed = time.perf_counter() - start_time
+
+        print(f"✓ Рассчитано {stats['rows']} заголовков ({period}...), записано в {target}")
+        print(f"  Время: {elapsed:.2f} с, строк в секунду: {stats['rows'] / elapsed if elapsed > 0 else 0:.0f}, "
+              f"объем: {stream.bytes_written / 1024 / 1024:.1f} МБ")
+
+        if sample_ids:
+            start_time = time.perf_counter()
+            expected = fetch_sql_headers(conn, sorted(sample_ids))
+            sql_elapsed = time.perf_counter() - start_time
+            mismatches = [row_id for row_id in sorted(sample_ids) if expected[row_id] != sample_rows.get(row_id)]
+            mark = "✓" if not mismatches else "✗"
+            print(f"{mark} Сверка с fn_calc_header_*: расхождений {len(mismatches)} из {len(sample_ids)}")
+            for row_id in mismatches[:3]:
+                print(f"  id {row_id}: пакет {sample_rows.get(row_id)}, функции {expected[row_id]}")
+            print(f"  SQL-функции: {len(sample_ids) / sql_elapsed:.0f} строк в секунду")
+        conn.commit()
+    except (psycopg2.Error, OSError, ValueError) as e:
+        print(f"✗ Ошибка расчета заголовков: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if reader:
+            reader.close()
+    return True
+
+
+def parse_watch_event(payload):
+    """
+    Затронутые ячейки по уведомлению триггера notify_temperature_deviation_change
+
+    Возвращает (высоты для удаления, {высота: {сторона: столбцы}}), где сторона -
+    True для положительных температур (temperature_deviations_plus) и False для
+    отрицательных; столбцы - множество номеров dev_N или None (все ячейки стороны).
+    Высоту None (TRUNCATE) нужно раскрыть во все высоты результатов.
+    """
+    event = json.loads(payload)
+    base_table = event["table"] == "temperature_deviations"
+    positive = not base_table
+    deleted = set()
+    changes = {}
+
+    def touch(height, sides, columns=None):
+        for side in sides:
+            changes.setdefault(height, {})[side] = columns
+
+    if event["op"] == "TRUNCATE":
+        if base_table:
+            deleted.add(None)
+        else:
+            touch(None, [True])
+    elif event["op"] == "UPDATE" and event["old_height"] == event["new_height"]:
+        columns = {int(name[len("dev_"):]) for name in event["columns"] or []}
+        if positive:
+            # get_temperature_deviation_value не читает dev_40 и dev_50 для положительных температур
+            columns -= {40, 50}
+        if columns:
+            touch(event["new_height"], [positive], columns)
+    else:
+        # Вставка, удаление или смена высоты: высота целиком появляется или исчезает
+        if event["old_height"] is not None:
+            if base_table:
+                deleted.add(event["old_height"])
+            else:
+                touch(event["old_height"], [True])
+        if event["new_height"] is not None:
+            touch(event["new_height"], [False, True] if base_table else [True])
+    return deleted, changes
+
+
+def merge_watch_changes(events):
+    """Объединение изменений нескольких уведомлений (None - все ячейки стороны)"""
+    deleted = set()
+    changes = {}
+    for event_deleted, event_changes in events:
+        deleted |= event_deleted
+        for height, sides in event_changes.items():
+            merged = changes.setdefault(height, {})
+            for side, columns in sides.items():
+                previous = merged.get(side, set())
+                merged[side] = None if columns is None or previous is None else previous | columns
+    return deleted, changes
+
+
+def describe_temperature_intervals(temperatures, limit=3):
+    """Непрерывные отрезки сетки среди пересчитанных температур (в сотых долях)"""
+    if not len(temperatures):
+        return "нет"
+    intervals = []
+    start = previous = temperatures[0]
+    step = min((b - a for a, b in zip(temperatures, temperatures[1:])), default=1)
+    for value in temperatures[1:]:
+        if value - previous > step:
+            intervals.append((start, previous))
+            start = value
+        previous = value
+    intervals.append((start, previous))
+
+    text = ", ".join(f"{a / 100:g}..{b / 100:g}" if a != b else f"{a / 100:g}" for a, b in intervals[:limit])
+    if len(intervals) > limit:
+        text += f" и еще {len(intervals) - limit}"
+    return text
+
+
+def recompute_watch_changes(conn, deleted, changes):
+    """
+    Пересчет и запись только затронутых ячеек interpolation_results
+
+    Для каждой высоты читаются строки таблиц отклонений этой высоты и
+    сохраненные температуры; пересчитываются температуры выбранной стороны,
+    у которых десятки или единицы попадают в изменившиеся столбцы dev_N -
+    это отрезки сетки между соседними узлами таблицы. Новая высота получает
+    все температуры сетки, уже сохраненной для остальных высот.
+    Возвращает список {height, cells, intervals} по высотам.
+    """
+    import numpy as np
+
+    cursor = conn.cursor()
+    touched = []
+
+    if None in deleted:
+        cursor.execute("DELETE FROM snaart.interpolation_results;")
+        touched.append({"height": None, "cells": cursor.rowcount, "intervals": "все (удаление)"})
+        changes = {}
+    for height in sorted(height for height in deleted if height is not None):
+        cursor.execute("SELECT snaart.clear_interpolation_height(%s);", (height,))
+        touched.append({"height": height, "cells": cursor.fetchone()[0], "intervals": "все (удаление)"})
+
+    if None in changes:
+        cursor.execute("SELECT DISTINCT height FROM snaart.interpolation_results;")
+        for (height,) in cursor.fetchall():
+            for side, columns in changes[None].items():
+                changes.setdefault(height, {})[side] = None
+        del changes[None]
+
+    grid = None
+    for height in sorted(changes):
+        tables = load_deviation_tables(conn, [height])
+        if not len(tables["heights"]):
+            # Высоты нет в temperature_deviations - процедура ее не рассчитывает
+            cursor.execute("SELECT snaart.clear_interpolation_height(%s);", (height,))
+            cells = cursor.fetchone()[0]
+            if height not in deleted:
+                touched.append({"height": height, "cells": cells, "intervals": "все (удаление)"})
+            continue
+
+        cursor.execute("SELECT (temperature * 100)::BIGINT FROM snaart.interpolation_results "
+                       "WHERE height = %s ORDER BY temperature;", (height,))
+        temperatures = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        if not len(temperatures):
+            if grid is None:
+                cursor.execute("SELECT DISTINCT (temperature * 100)::BIGINT FROM snaart.interpolation_results "
+                               "ORDER BY 1;")
+                grid = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+            temperatures = grid
+
+        is_positive, tens, ones = split_temperatures(temperatures, 100)
+        affected = np.zeros(len(temperatures), dtype=bool)
+        for side, columns in changes[height].items():
+            side_mask = is_positive == side
+            if columns is not None:
+                wanted = np.asarray(sorted(columns), dtype=np.int64)
+                side_mask &= np.isin(tens, wanted) | np.isin(ones, wanted)
+            affected |= side_mask
+
+        selected = temperatures[affected]
+        if len(selected):
+            results = compute_temperature_deviations(tables, selected, 100)
+            # Неуспешный расчет записывается пустыми значениями, как в процедуре
+            values = [
+                [None if value != value else cast(value) for value in results[name][0].tolist()]
+                for name, cast in (("tens_value", int), ("ones_value", int), ("dev_tens", float),
+                                   ("dev_ones", float), ("result_value", float))
+            ]
+            rows = [
+                (height, Decimal(temperature).scaleb(-2)) + cells
+                for temperature, cells in zip(selected.tolist(), zip(*values))
+            ]
+            # Время пересчета не измеряется: время прежнего запуска к новым значениям
+            # не относится. Текст ошибки процедура для неуспешных точек не сохраняет
+            # (calculate_temperature_deviation перехватывает ошибки и возвращает NULL
+            # с предупреждением), поэтому error_message тоже пустой
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO snaart.interpolation_results
+                    (height, temperature, tens_value, ones_value, dev_tens, dev_ones, result_value)
+                VALUES %s
+                ON CONFLICT (height, temperature) DO UPDATE
+                SET tens_value = EXCLUDED.tens_value,
+                    ones_value = EXCLUDED.ones_value,
+                    dev_tens = EXCLUDED.dev_tens,
+                    dev_ones = EXCLUDED.dev_ones,
+                    result_value = EXCLUDED.result_value,
+                    calculation_time = NULL,
+                    error_message = NULL;
+            """, rows, page_size=10000)
+
+        touched.append({"height": height, "cells": int(len(selected)),
+                        "intervals": describe_temperature_intervals(selected.tolist())})
+
+    cursor.close()
+    return touched
+
+
+def run_watch_command(conn, db_config, args):
+    """
+    Команда watch: пересчет затронутых ячеек при изменении таблиц отклонений
+
+    Постоянное соединение слушает канал temperature_deviation_changes
+    (триггеры устанавливаются процедурой install_temperature_deviation_watch).
+    Уведомления, пришедшие вместе, обрабатываются одной транзакцией;
+    для каждой пачки выводится число ячеек и задержка от изменения строки
+    до фиксации пересчета (по часам сервера).
+    """
+    print_header("ОТСЛЕЖИВАНИЕ ИЗМЕНЕНИЙ ТАБЛИЦ ОТКЛОНЕНИЙ")
+
+    listener = None
+    log_file = open(args.progress_log, "a", encoding="utf-8") if args.progress_log else None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("CALL snaart.install_temperature_deviation_watch();")
+        conn.commit()
+        cursor.close()
+
+        listener = psycopg2.connect(**db_config)
+        listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        listener.cursor().execute(f"LISTEN {WATCH_CHANNEL};")
+        print(f"✓ Триггеры установлены, ожидание изменений (канал {WATCH_CHANNEL})")
+        if args.watch_duration:
+            print(f"  Отслеживание завершится через {args.watch_duration:g} с")
+
+        deadline = time.monotonic() + args.watch_duration if args.watch_duration else None
+        batches = 0
+        while deadline is None or time.monotonic() < deadline:
+            timeout = 1.0 if deadline is None else max(min(1.0, deadline - time.monotonic()), 0)
+            if select.select([listener], [], [], timeout) == ([], [], []):
+                continue
+
+            # Уведомления одной пачки изменений приходят почти одновременно - собираем их вместе
+            notifies = []
+            while True:
+                listener.poll()
+                notifies.extend(listener.notifies)
+                listener.notifies.clear()
+                if select.select([listener], [], [], WATCH_DEBOUNCE_SECONDS) == ([], [], []):
+                    break
+            if not notifies:
+                continue
+
+            events = [json.loads(notify.payload) for notify in notifies]
+            start_time = time.perf_counter()
+            try:
+                deleted, changes = merge_watch_changes(parse_watch_event(notify.payload) for notify in notifies)
+                touched = recompute_watch_changes(conn, deleted, changes)
+                conn.commit()
+            except (psycopg2.Error, ValueError) as e:
+                print(f"✗ Ошибка пересчета: {e}")
+                conn.rollback()
+                continue
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+            cursor = conn.cursor()
+            cursor.execute("SELECT EXTRACT(EPOCH FROM clock_timestamp() - MIN(sent_at)) * 1000 "
+                           "FROM unnest(%s::TIMESTAMPTZ[]) AS sent_at;", ([event["sent_at"] for event in events],))
+            latency_ms = float(cursor.fetchone()[0])
+            conn.commit()
+            cursor.close()
+
+            batches += 1
+            cells = sum(item["cells"] for item in touched)
+            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Изменений: {len(events)} "
+                  f"({', '.join(sorted({event['table'] + ' ' + event['op'] for event in events}))})")
+            for item in touched:
+                height = "все высоты" if item["height"] is None else f"высота {item['height']} м"
+                print(f"  {height}: ячеек {item['cells']}, температуры {item['intervals']}")
+            print(f"✓ Пересчитано ячеек: {cells} за {elapsed_ms:.1f} мс, "
+                  f"от изменения до записи результатов: {latency_ms:.1f} мс")
+
+            if log_file:
+                log_file.write(json.dumps({
+                    "time": datetime.now().isoformat(),
+                    "events": len(events),
+                    "cells": cells,
+                    "heights": touched,
+                    "recompute_ms": elapsed_ms,
+                    "latency_ms": latency_ms
+                }, ensure_ascii=False) + "\n")
+                log_file.flush()
+
+        print(f"\nОтслеживание завершено, обработано пачек изменений: {batches}")
+        return True
+    except psycopg2.Error as e:
+        print(f"✗ Ошибка отслеживания изменений: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if listener:
+            listener.close()
+        if log_file:
+            log_file.close()
 
 
 def main():
@@ -513,6 +3599,7 @@ def main():
     print_header("ПРИЛОЖЕНИЕ ДЛЯ АНАЛИЗА ИНТЕРПОЛЯЦИЙ")
     print("Это приложение выполняет расчет всех вариантов интерполяции")
     print("и анализирует производительность для включения в Pull Request")
+    print(f"Время запуска: {(time.perf_counter() - START_TIME) * 1000:.0f} мс")
 
     # Подключение к базе данных
     conn = connect_to_db(db_config)
@@ -520,25 +3607,85 @@ def main():
         return
 
     try:
+        if args.command == 'history':
+            run_history_command(conn, args)
+            return
+        if args.command == 'report':
+            run_report_command(conn, args)
+            return
+        if args.command == 'headers':
+            run_headers_command(conn, db_config, args)
+            return
+        if args.command == 'watch':
+            run_watch_command(conn, db_config, args)
+            return
+
         # Запуск хранимой процедуры, если не указано пропустить расчет
         if not args.skip_calculation:
-            success = run_interpolation_procedure(conn, calc_settings, args.verbose)
+            if calc_settings['instrument']:
+                snapshot_before = take_server_snapshot(conn)
+            if calc_settings['measure_storage']:
+                wal_start = current_wal_lsn(conn)
+
+            # Серверные процессы соединений расчета (их статистика сбрасывается при завершении)
+            backend_pids = []
+            if calc_settings['engine'] == 'numpy':
+                success = run_numpy_interpolation(conn, calc_settings, args.verbose, args.chunk_size)
+            elif calc_settings['engine'] == 'procedure' and calc_settings['workers'] > 1:
+                success = run_parallel_interpolation(conn, db_config, calc_settings, args.verbose, backend_pids)
+            else:
+                success = run_interpolation_procedure(db_config, calc_settings, args.verbose, args.progress_log,
+                                                      backend_pids)
             if not success:
                 print("✗ Не удалось выполнить процедуру интерполяции")
                 return
+
+            if calc_settings['instrument']:
+                wait_for_stats_flush(conn, backend_pids)
+                snapshot_after = take_server_snapshot(conn)
+                save_instrumentation(conn, diff_server_snapshots(snapshot_before, snapshot_after))
+                print("✓ Статистика сервера сохранена")
+
+            if calc_settings['measure_storage']:
+                try:
+                    save_storage_metrics(conn, measure_storage(conn, calc_settings, wal_start))
+                    print("✓ Размер таблицы и время запросов анализа сохранены")
+                except psycopg2.Error as e:
+                    print(f"✗ Не удалось замерить режим хранения: {e}")
+                    conn.rollback()
+
+            try:
+                run_id = record_run_history(conn)
+                print(f"✓ Запуск #{run_id} записан в историю")
+            except psycopg2.Error as e:
+                print(f"✗ Не удалось записать запуск в историю: {e}")
+                conn.rollback()
         else:
             print("\nРасчет интерполяций пропущен по запросу пользователя.")
             print("Будут использованы существующие результаты.")
 
-        # Получение метрик производительности
-        metrics, height_stats, temp_stats, heatmap_data = fetch_performance_metrics(conn)
+        # Получение метрик производительности (из локального кеша, если результаты не менялись)
+        metrics, height_stats, temp_stats, heatmap_data, cache_entry, cache_info = load_analysis_data(conn, args)
 
         if not metrics:
             print("✗ Не удалось получить метрики производительности")
             return
 
         # Вывод сводной информации
-        display_summary(metrics)
+        display_summary(metrics, cache_info, args.result_cache_size)
+
+        if args.percentiles:
+            try:
+                percentiles, total = compute_time_percentiles(conn, chunk_size=args.chunk_size,
+                                                              cache_entry=cache_entry)
+                conn.commit()
+                print_time_percentiles(percentiles, total)
+            except psycopg2.Error as e:
+                print(f"✗ Ошибка расчета перцентилей: {e}")
+                conn.rollback()
+
+        if args.export_csv:
+            export_results_csv(conn, args.export_csv, args.chunk_size, cache_entry)
 
         # Создание визуализаций
         if not args.no_plots:
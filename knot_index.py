@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import bisect
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import psycopg2
+
+from interpolatetion import DB_CONFIG, print_header
+
+# Таблица поправок, по которой считает fn_calc_temperature_interpolation
+DEFAULT_SOURCE_TABLE = "snaart.calc_temperature_correction"
+
+# Каталог индекса по умолчанию
+DEFAULT_INDEX_DIR = "knot_index"
+
+# Файл описания индекса: отпечаток таблицы и имя файла с узлами
+MANIFEST_NAME = "manifest.json"
+
+# Температуры и поправки хранятся в сотых долях (NUMERIC(8,2))
+SCALE = 100
+
+# Узлы индекса: x, y - координаты узла в сотых долях, dx, dy - приращения
+# до следующего узла (наклон отрезка dy / dx хранится точной дробью,
+# чтобы округление совпадало с арифметикой NUMERIC)
+KNOT_DTYPE = np.dtype([("x", "<i8"), ("y", "<i8"), ("dx", "<i8"), ("dy", "<i8")])
+
+
+def fetch_source_fingerprint(conn, table=DEFAULT_SOURCE_TABLE):
+    """Отпечаток (md5) содержимого таблицы поправок: меняется при любом изменении точек"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT md5(COALESCE(string_agg(temperature::TEXT || ':' || correction::TEXT, ',' ORDER BY temperature), ''))
+        FROM {table};
+    """)
+    fingerprint = cursor.fetchone()[0]
+    cursor.close()
+    return fingerprint
+
+
+def _round_half_away(numerator, denominator):
+    """Деление целых массивов с округлением половины от нуля (как приведение к NUMERIC)"""
+    magnitude = (2 * np.abs(numerator) + denominator) // (2 * denominator)
+    return np.sign(numerator) * magnitude
+
+
+def scale_temperatures(temperatures):
+    """
+    Температуры в сотых долях с округлением половины от нуля, как при передаче
+    значения в параметр NUMERIC(8,2)
+
+    Значения float сначала округляются до 6 знаков, чтобы двоичная погрешность
+    (например, 0.015 -> 0.01499...) не меняла результат округления.
+    """
+    values = np.round(np.asarray(temperatures, dtype=np.float64) * SCALE, 6)
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+class KnotIndex:
+    """
+    Компактный индекс кусочно-линейной функции поправки температуры
+
+    Узлы (отсортированные точки calc_temperature_correction) хранятся одним
+    непрерывным массивом KNOT_DTYPE; отрезок для температуры находится
+    бинарным поиском. Результат совпадает с fn_calc_temperature_interpolation:
+    температура округляется до сотых, точное совпадение с узлом возвращает
+    поправку узла, значение между узлами вычисляется в целых числах и
+    округляется до сотых, температура вне диапазона узлов - ошибка.
+
+    Индекс сохраняется в каталог (manifest.json и файл .npy с узлами) и
+    открывается через mmap, поэтому несколько процессов используют одну
+    копию в памяти без обращений к базе данных.
+    """
+
+    def __init__(self, knots, fingerprint=None, source_table=DEFAULT_SOURCE_TABLE):
+        self.knots = knots
+        self.fingerprint = fingerprint
+        self.source_table = source_table
+        # Копия узлов в списках Python для поиска одиночных значений без накладных расходов NumPy
+        self._scalar_knots = None
+
+    @classmethod
+    def from_points(cls, points, fingerprint=None, source_table=DEFAULT_SOURCE_TABLE):
+        """Построение индекса по парам (температура, поправка)"""
+        scaled = sorted((int(Decimal(str(x)) * SCALE), int(Decimal(str(y)) * SCALE)) for x, y in points)
+        if not scaled:
+            raise ValueError("Таблица поправок пуста")
+
+        knots = np.zeros(len(scaled), dtype=KNOT_DTYPE)
+        knots["x"] = [x for x, _ in scaled]
+        knots["y"] = [y for _, y in scaled]
+        knots["dx"][:-1] = np.diff(knots["x"])
+        knots["dy"][:-1] = np.diff(knots["y"])
+        # У последнего узла отрезка нет; dx = 1 исключает деление на нуль
+        knots["dx"][-1] = 1
+
+        if np.any(knots["dx"][:-1] == 0):
+            raise ValueError("Деление на нуль. Возможно, некорректные данные в таблице с поправками!")
+        return cls(knots, fingerprint, source_table)
+
+    @classmethod
+    def from_connection(cls, conn, table=DEFAULT_SOURCE_TABLE):
+        """Построение индекса по таблице поправок в базе данных"""
+        fingerprint = fetch_source_fingerprint(conn, table)
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT temperature, correction FROM {table} ORDER BY temperature;")
+        points = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        return cls.from_points(points, fingerprint, table)
+
+    @classmethod
+    def load(cls, directory=DEFAULT_INDEX_DIR):
+        """Открытие сохраненного индекса через mmap (без подключения к базе данных)"""
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as file:
+            manifest = json.load(file)
+
+        knots = np.load(os.path.join(directory, manifest["knots_file"]), mmap_mode="r")
+        if knots.dtype != KNOT_DTYPE:
+            raise ValueError(f"Неизвестный формат индекса: {knots.dtype}")
+        return cls(knots, manifest["fingerprint"], manifest["source_table"])
+
+    @classmethod
+    def open(cls, conn, directory=DEFAULT_INDEX_DIR, table=DEFAULT_SOURCE_TABLE):
+        """
+        Открытие индекса с проверкой актуальности
+
+        Если таблица поправок изменилась (отпечаток не совпадает с сохраненным)
+        или индекс еще не создан, индекс перестраивается и сохраняется.
+        """
+        fingerprint = fetch_source_fingerprint(conn, table)
+        try:
+            index = cls.load(directory)
+            if index.fingerprint == fingerprint and index.source_table == table:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+        index = cls.from_connection(conn, table)
+        index.save(directory)
+        return cls.load(directory)
+
+    def save(self, directory=DEFAULT_INDEX_DIR):
+        """
+        Сохранение индекса в каталог
+
+        Файл узлов называется по отпечатку, а manifest.json заменяется атомарно,
+        поэтому процессы, открывшие предыдущую версию, продолжают ее читать.
+        """
+        os.makedirs(directory, exist_ok=True)
+        knots_file = f"knots_{self.fingerprint or 'local'}.npy"
+
+        # Файл узлов записывается под временным именем и переименовывается целиком
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".npy")
+        with os.fdopen(fd, "wb") as file:
+            np.save(file, np.ascontiguousarray(self.knots))
+        os.replace(temp_path, os.path.join(directory, knots_file))
+
+        manifest = {
+            "fingerprint": self.fingerprint,
+            "source_table": self.source_table,
+            "knots_file": knots_file,
+            "knots": len(self.knots),
+            "min_temperature": self.min_temperature,
+            "max_temperature": self.max_temperature,
+            "built_at": datetime.now().isoformat()
+        }
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, os.path.join(directory, MANIFEST_NAME))
+
+        # Файлы узлов предыдущих версий больше не нужны
+        for name in os.listdir(directory):
+            if name.startswith("knots_") and name.endswith(".npy") and name != knots_file:
+                os.remove(os.path.join(directory, name))
+
+    @property
+    def min_temperature(self):
+        return float(self.knots["x"][0]) / SCALE
+
+    @property
+    def max_temperature(self):
+        return float(self.knots["x"][-1]) / SCALE
+
+    def evaluate_scaled(self, temperatures_scaled):
+        """Поправки в сотых долях для массива температур в сотых долях"""
+        t = np.asarray(temperatures_scaled, dtype=np.int64)
+        x = self.knots["x"]
+
+        outside = (t < x[0]) | (t > x[-1])
+        if np.any(outside):
+            raise ValueError(
+                "Некорректно передан параметр! Невозможно рассчитать поправку. "
+                f"Значение должно укладываться в диаппазон: {x[0] / SCALE:.2f}, {x[-1] / SCALE:.2f}"
+            )
+
+        # Последний узел с x <= t; для t в последнем узле отрезок не нужен
+        segment = np.searchsorted(x, t, side="right") - 1
+        dx = self.knots["dx"][segment]
+
+        numerator = self.knots["y"][segment] * dx + (t - x[segment]) * self.knots["dy"][segment]
+        return _round_half_away(numerator, dx)
+
+    def evaluate_many(self, temperatures):
+        """Поправки (float64) для массива температур"""
+        return self.evaluate_scaled(scale_temperatures(temperatures)) / SCALE
+
+    def evaluate(self, temperature):
+        """Поправка для одной температуры (Decimal с двумя знаками, как NUMERIC(8,2))"""
+        if self._scalar_knots is None:
+            self._scalar_knots = tuple(self.knots[name].tolist() for name in ("x", "y", "dx", "dy"))
+        x, y, dx, dy = self._scalar_knots
+
+        t = int(Decimal(str(temperature)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * SCALE)
+        if t < x[0] or t > x[-1]:
+            self.evaluate_scaled([t])  # ошибка с тем же сообщением, что и для массива
+
+        segment = bisect.bisect_right(x, t) - 1
+        numerator = y[segment] * dx[segment] + (t - x[segment]) * dy[segment]
+        value = (2 * abs(numerator) + dx[segment]) // (2 * dx[segment])
+        return Decimal(value if numerator >= 0 else -value).scaleb(-2)
+
+
+def verify_index(conn, index, step=0.01):
+    """
+    Сравнение индекса с fn_calc_temperature_interpolation на сетке температур
+
+    Возвращает количество проверенных точек и список расхождений.
+    """
+    temperatures = np.arange(round(index.min_temperature / step), round(index.max_temperature / step) + 1) * step
+    expected_scaled = scale_temperatures(temperatures)
+
+    cursor = conn.cursor()
+    cursor.execute("SET client_min_messages = warning")
+    cursor.execute(
+        """
+        SELECT t, (snaart.fn_calc_temperature_interpolation(t) * 100)::BIGINT
+        FROM unnest(%s::NUMERIC(8,2)[]) AS t
+        ORDER BY t;
+        """,
+        ([Decimal(int(value)).scaleb(-2) for value in expected_scaled],)
+    )
+    rows = cursor.fetchall()
+    conn.rollback()
+    cursor.close()
+
+    actual = index.evaluate_scaled(expected_scaled)
+    mismatches = [
+        (temperature, database_value, int(value))
+        for (temperature, database_value), value in zip(rows, actual)
+        if database_value != int(value)
+    ]
+    return len(rows), mismatches
+
+
+def parse_arguments():
+    """Обработка аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Индекс узлов кусочно-линейной поправки температуры')
+
+    # Параметры базы данных
+    db_group = parser.add_argument_group('Параметры базы данных')
+    db_group.add_argument('--dbname', help='Имя базы данных')
+    db_group.add_argument('--user', help='Имя пользователя')
+    db_group.add_argument('--password', help='Пароль')
+    db_group.add_argument('--host', help='Хост', default='localhost')
+    db_group.add_argument('--port', help='Порт', default='5432')
+
+    # Параметры индекса
+    index_group = parser.add_argument_group('Параметры индекса')
+    index_group.add_argument('--directory', default=DEFAULT_INDEX_DIR,
+                             help=f'Каталог индекса (по умолчанию: {DEFAULT_INDEX_DIR})')
+    index_group.add_argument('--table', default=DEFAULT_SOURCE_TABLE,
+                             help=f'Таблица поправок (по умолчанию: {DEFAULT_SOURCE_TABLE})')
+    index_group.add_argument('--verify', action='store_true',
+                             help='Сравнить индекс с fn_calc_temperature_interpolation на сетке с шагом 0.01')
+
+    return parser.parse_args()
+
+
+def main():
+    """Построение (при необходимости) и проверка индекса"""
+    args = parse_arguments()
+
+    db_config = DB_CONFIG.copy()
+    if args.dbname: db_config["dbname"] = args.dbname
+    if args.user: db_config["user"] = args.user
+    if args.password: db_config["password"] = args.password
+    if args.host: db_config["host"] = args.host
+    if args.port: db_config["port"] = args.port
+
+    print_header("ИНДЕКС УЗЛОВ ПОПРАВКИ ТЕМПЕРАТУРЫ")
+    try:
+        conn = psycopg2.connect(**db_config)
+    except psycopg2.Error as e:
+        print(f"✗ Ошибка подключения к базе данных: {e}")
+        return 1
+
+    try:
+        index = KnotIndex.open(conn, args.directory, args.table)
+        print(f"✓ Индекс {args.directory}: {len(index.knots)} узлов, "
+              f"от {index.min_temperature:g} до {index.max_temperature:g} °C, отпечаток {index.fingerprint}")
+
+        if args.verify:
+            checked, mismatches = verify_index(conn, index)
+            for temperature, database_value, value in mismatches[:10]:
+                print(f"  {temperature}: база данных {database_value / SCALE}, индекс {value / SCALE}")
+            if mismatches:
+                print(f"✗ Расхождений: {len(mismatches)} из {checked}")
+                return 1
+            print(f"✓ Проверено {checked} температур, расхождений нет")
+    except (psycopg2.Error, ValueError) as e:
+        print(f"✗ Ошибка индекса: {e}")
+        return 1
+    finally:
+        conn.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
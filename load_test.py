@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+import psycopg2
+import psycopg2.extras
+
+from interpolatetion import (
+    DB_CONFIG, LATENCY_HISTOGRAM_SIZE, TIME_PERCENTILES,
+    histogram_percentiles, latency_histogram_bucket, print_header
+)
+
+ENDPOINTS = ["interpolation", "temperature-deviation", "wind-deviation"]
+
+# Параметры нагрузки по умолчанию
+DEFAULT_LOAD = {
+    "url": "http://127.0.0.1:8080",
+    "concurrency": 32,
+    "db_connections": 8,
+    "duration": 5.0,
+    "batch_size": 1,
+    "verify": 200,
+    "seed": 1
+}
+
+# Диапазоны входных значений, для которых таблицы поправок дают результат
+TEMPERATURE_RANGE = (0.0, 40.0)
+TEMPERATURE_CORRECTION_RANGE = (-15.0, 15.0)
+BULLET_DEMOLITION_RANGE = (0.0, 150.0)
+
+
+def random_request(endpoint, rng):
+    """Случайные входные данные для одного расчета"""
+    if endpoint == "interpolation":
+        return round(rng.uniform(*TEMPERATURE_RANGE), 2)
+    if endpoint == "temperature-deviation":
+        return {"temperature_correction": round(rng.uniform(*TEMPERATURE_CORRECTION_RANGE), 2),
+                "measurement_type_id": rng.choice([1, 2])}
+    return {"bullet_demolition_range": round(rng.uniform(*BULLET_DEMOLITION_RANGE), 1),
+            "measurement_type_id": 2}
+
+
+def request_body(endpoint, values):
+    """Тело запроса к сервису: одиночный расчет или пакет"""
+    if endpoint == "interpolation":
+        return {"temperature": values[0]} if len(values) == 1 else {"temperatures": values}
+    return values[0] if len(values) == 1 else {"requests": values}
+
+
+def response_results(endpoint, status, payload, batched):
+    """Результаты ответа сервиса в виде списка (ошибка - строка с префиксом)"""
+    if batched:
+        results = payload["results"]
+    else:
+        results = [payload if status == 200 else {"error": payload.get("error")}]
+    normalized = []
+    for result in results:
+        if "error" in result:
+            normalized.append("ошибка: " + str(result["error"]))
+        elif endpoint == "interpolation":
+            normalized.append(Decimal(str(result["value"])).quantize(Decimal("0.01")))
+        else:
+            normalized.append([tuple(row.values()) for row in result["corrections"]])
+    return normalized
+
+
+class HttpClient:
+    """Клиент HTTP/1.1 с постоянным соединением"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def post(self, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        content = json.dumps(body).encode("utf-8")
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(content)}\r\n\r\n".encode("latin-1") + content
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        payload = json.loads(await self.reader.readexactly(int(headers.get("content-length", 0))))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def database_call(cursor, endpoint, value):
+    """Тот же расчет напрямую в PostgreSQL"""
+    try:
+        if endpoint == "interpolation":
+            cursor.execute("SELECT snaart.fn_calc_temperature_interpolation(%s);", (value,))
+            result = cursor.fetchone()[0]
+        elif endpoint == "temperature-deviation":
+            cursor.execute("CALL snaart.sp_calc_temperature_deviation(%s, %s, NULL);",
+                           (value["temperature_correction"], value["measurement_type_id"]))
+            result = [tuple(row) for row in cursor.fetchone()[0] or []]
+        else:
+            cursor.execute("CALL snaart.sp_calc_wind_speed_deviation(%s, %s, NULL);",
+                           (value["bullet_demolition_range"], value["measurement_type_id"]))
+            result = [tuple(row) for row in cursor.fetchone()[0] or []]
+        cursor.connection.commit()
+        return result
+    except psycopg2.Error as e:
+        cursor.connection.rollback()
+        return "ошибка: " + e.diag.message_primary
+
+
+def connect_database(db_config):
+    """Соединение для прямых вызовов: без NOTICE процедур и с разбором составных типов"""
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
+    cursor.execute("SET client_min_messages = warning;")
+    conn.commit()
+    psycopg2.extras.register_composite("temperature_correction", conn)
+    psycopg2.extras.register_composite("wind_direction_correction", conn)
+    return conn
+
+
+def verify_service(db_config, host, port, count, seed):
+    """Сравнение ответов сервиса с результатами функций и процедур PostgreSQL"""
+    rng = random.Random(seed)
+    conn = connect_database(db_config)
+    cursor = conn.cursor()
+
+    async def run():
+        client = HttpClient(host, port)
+        mismatches = {}
+        for endpoint in ENDPOINTS:
+            mismatches[endpoint] = 0
+            for _ in range(count):
+                value = random_request(endpoint, rng)
+                status, payload = await client.post(f"/api/{endpoint}", request_body(endpoint, [value]))
+                actual = response_results(endpoint, status, payload, False)[0]
+                expected = database_call(cursor, endpoint, value)
+                if actual != expected:
+                    if mismatches[endpoint] < 3:
+                        print(f"  ✗ {endpoint} {value}: сервис {actual}, БД {expected}")
+                    mismatches[endpoint] += 1
+        await client.close()
+        return mismatches
+
+    try:
+        return asyncio.run(run())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_service_load(host, port, endpoint, concurrency, duration, batch_size, seed):
+    """Нагрузка на сервис: concurrency клиентов с постоянными соединениями"""
+    histogram = [0] * LATENCY_HISTOGRAM_SIZE
+    counters = {"requests": 0, "calculations": 0, "errors": 0}
+
+    async def worker(index, deadline):
+        rng = random.Random(seed + index)
+        client = HttpClient(host, port)
+        while time.perf_counter() < deadline:
+            values = [random_request(endpoint, rng) for _ in range(batch_size)]
+            start_time = time.perf_counter()
+            status, _ = await client.post(f"/api/{endpoint}", request_body(endpoint, values))
+            histogram[latency_histogram_bucket((time.perf_counter() - start_time) * 1000) - 1] += 1
+            counters["requests"] += 1
+            counters["calculations"] += len(values)
+            if status != 200:
+                counters["errors"] += 1
+        await client.close()
+
+    async def run():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker(index, deadline) for index in range(concurrency)))
+
+    start_time = time.perf_counter()
+    asyncio.run(run())
+    return counters, histogram, time.perf_counter() - start_time
+
+
+def run_database_load(db_config, endpoint, connections, duration, seed):
+    """Те же расчеты напрямую в PostgreSQL: connections потоков со своими соединениями"""
+    histogram = [0] * LATENCY_HISTOGRAM_SIZE
+    counters = {"requests": 0, "calculations": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        conn = connect_database(db_config)
+        cursor = conn.cursor()
+        local_histogram = [0] * LATENCY_HISTOGRAM_SIZE
+        requests = errors = 0
+        while time.perf_counter() < deadline:
+            start_time = time.perf_counter()
+            result = database_call(cursor, endpoint, random_request(endpoint, rng))
+            local_histogram[latency_histogram_bucket((time.perf_counter() - start_time) * 1000) - 1] += 1
+            requests += 1
+            if isinstance(result, str):
+                errors += 1
+        cursor.close()
+        conn.close()
+        with lock:
+            for bucket, count in enumerate(local_histogram):
+                histogram[bucket] += count
+            counters["requests"] += requests
+            counters["calculations"] += requests
+            counters["errors"] += errors
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counters, histogram, time.perf_counter() - start_time
+
+
+def print_load_result(title, counters, histogram, elapsed):
+    """Вывод пропускной способности и перцентилей времени ответа"""
+    percentiles, _ = histogram_percentiles(histogram, TIME_PERCENTILES)
+    print(f"  {title}:")
+    print(f"    Запросов: {counters['requests']}, расчетов: {counters['calculations']}, "
+          f"ошибок: {counters['errors']}, время: {elapsed:.2f} с")
+    print(f"    Запросов в секунду: {counters['requests'] / elapsed:.1f}, "
+          f"расчетов в секунду: {counters['calculations'] / elapsed:.1f}")
+    print("    Время ответа: " + ", ".join(
+        f"p{percentile:g} = {value:.3f} мс" for percentile, value in percentiles.items() if value is not None
+    ))
+    return counters["calculations"] / elapsed
+
+
+def parse_arguments():
+    """Обработка аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Нагрузочный тест сервиса метеопоправок в сравнении с PostgreSQL')
+
+    # Параметры базы данных
+    db_group = parser.add_argument_group('Параметры базы данных')
+    db_group.add_argument('--dbname', help='Имя базы данных')
+    db_group.add_argument('--user', help='Имя пользователя')
+    db_group.add_argument('--password', help='Пароль')
+    db_group.add_argument('--host', help='Хост', default='localhost')
+    db_group.add_argument('--port', help='Порт', default='5432')
+
+    # Параметры нагрузки
+    load_group = parser.add_argument_group('Параметры нагрузки')
+    load_group.add_argument('--url', default=DEFAULT_LOAD["url"],
+                            help=f'Адрес сервиса (по умолчанию: {DEFAULT_LOAD["url"]})')
+    load_group.add_argument('--endpoint', choices=ENDPOINTS, action='append',
+                            help='Проверяемый расчет (можно указать несколько раз; по умолчанию все)')
+    load_group.add_argument('--concurrency', type=int, default=DEFAULT_LOAD["concurrency"],
+                            help=f'Одновременных клиентов сервиса (по умолчанию: {DEFAULT_LOAD["concurrency"]})')
+    load_group.add_argument('--db-connections', type=int, default=DEFAULT_LOAD["db_connections"],
+                            help='Соединений при прямых вызовах PostgreSQL '
+                                 f'(по умолчанию: {DEFAULT_LOAD["db_connections"]})')
+    load_group.add_argument('--duration', type=float, default=DEFAULT_LOAD["duration"],
+                            help=f'Длительность каждого замера, с (по умолчанию: {DEFAULT_LOAD["duration"]})')
+    load_group.add_argument('--batch-size', type=int, default=DEFAULT_LOAD["batch_size"],
+                            help='Расчетов в одном запросе к сервису '
+                                 f'(по умолчанию: {DEFAULT_LOAD["batch_size"]})')
+    load_group.add_argument('--verify', type=int, default=DEFAULT_LOAD["verify"],
+                            help='Случайных запросов для сверки с PostgreSQL на каждый расчет; 0 - без сверки '
+                                 f'(по умолчанию: {DEFAULT_LOAD["verify"]})')
+    load_group.add_argument('--skip-db', action='store_true',
+                            help='Не измерять прямые вызовы PostgreSQL')
+    load_group.add_argument('--seed', type=int, default=DEFAULT_LOAD["seed"],
+                            help=f'Начальное значение генератора (по умолчанию: {DEFAULT_LOAD["seed"]})')
+
+    return parser.parse_args()
+
+
+def main():
+    """Сверка и нагрузочный тест"""
+    args = parse_arguments()
+
+    db_config = DB_CONFIG.copy()
+    if args.dbname: db_config["dbname"] = args.dbname
+    if args.user: db_config["user"] = args.user
+    if args.password: db_config["password"] = args.password
+    if args.host: db_config["host"] = args.host
+    if args.port: db_config["port"] = args.port
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    endpoints = args.endpoint or ENDPOINTS
+
+    try:
+        if args.verify > 0:
+            print_header("СВЕРКА СЕРВИСА С POSTGRESQL")
+            mismatches = verify_service(db_config, host, port, args.verify, args.seed)
+            for endpoint, count in mismatches.items():
+                mark = "✓" if count == 0 else "✗"
+                print(f"{mark} {endpoint}: расхождений {count} из {args.verify}")
+            if any(mismatches.values()):
+                return 1
+
+        print_header("НАГРУЗОЧНЫЙ ТЕСТ")
+        print(f"Клиентов сервиса: {args.concurrency}, соединений PostgreSQL: {args.db_connections}, "
+              f"длительность: {args.duration} с, расчетов в запросе: {args.batch_size}")
+        for endpoint in endpoints:
+            print(f"\n{endpoint}")
+            service_rate = print_load_result(
+                "Сервис", *run_service_load(host, port, endpoint, args.concurrency, args.duration,
+                                            args.batch_size, args.seed))
+            if not args.skip_db:
+                db_rate = print_load_result(
+                    "PostgreSQL", *run_database_load(db_config, endpoint, args.db_connections,
+                                                     args.duration, args.seed))
+                print(f"  Ускорение: {service_rate / db_rate:.1f}x")
+    except (ConnectionError, OSError) as e:
+        print(f"✗ Сервис недоступен по адресу {args.url}: {e}")
+        return 1
+    except psycopg2.Error as e:
+        print(f"✗ Ошибка базы данных: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
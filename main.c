@@ -3,6 +3,7 @@
 #include <libpq-fe.h>
 #include <time.h>
 #include <math.h>
+#include <string.h>
 
 /* Структура для хранения одной точки интерполяции */
 typedef struct {
@@ -24,32 +25,88 @@ int compare_points(const void *a, const void *b) {
 
 /* Функция линейной интерполяции:
    Если t точно совпадает с одной из точек – возвращает её correction,
-   иначе находит две ближайшие точки и вычисляет значение по формуле */
+   иначе находит две ближайшие точки (бинарным поиском по отсортированному
+   массиву) и вычисляет значение по формуле */
 double interpolate(double t, CorrectionPoint *points, int n) {
     if(t <= points[0].temperature)
         return points[0].correction;
     if(t >= points[n-1].temperature)
         return points[n-1].correction;
 
-    for(int i = 0; i < n - 1; i++) {
-        if(t >= points[i].temperature && t <= points[i+1].temperature) {
-            double x0 = points[i].temperature;
-            double x1 = points[i+1].temperature;
-            double y0 = points[i].correction;
-            double y1 = points[i+1].correction;
-            /* Защита от деления на 0 */
-            if(fabs(x1 - x0) < 1e-9)
-                return y0;
-            return y0 + (y1 - y0) * (t - x0) / (x1 - x0);
-        }
+    /* Последняя точка с temperature <= t: points[lo].temperature <= t < points[hi].temperature */
+    int lo = 0;
+    int hi = n - 1;
+    while(hi - lo > 1) {
+        int mid = lo + (hi - lo) / 2;
+        if(points[mid].temperature <= t)
+            lo = mid;
+        else
+            hi = mid;
     }
-    return 0.0; // В теории сюда не дойдём
+
+    double x0 = points[lo].temperature;
+    double x1 = points[hi].temperature;
+    double y0 = points[lo].correction;
+    double y1 = points[hi].correction;
+    /* Защита от деления на 0 */
+    if(fabs(x1 - x0) < 1e-9)
+        return y0;
+    return y0 + (y1 - y0) * (t - x0) / (x1 - x0);
+}
+
+/* Функция сравнения для сортировки времени расчета точек */
+int compare_doubles(const void *a, const void *b) {
+    double da = *(const double*) a;
+    double db = *(const double*) b;
+    return (da > db) - (da < db);
+}
+
+/* Текущее время в наносекундах (монотонные часы) */
+double now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (double) ts.tv_sec * 1e9 + (double) ts.tv_nsec;
 }
 
-int main() {
+/* Перцентиль отсортированного массива с линейной интерполяцией между рангами */
+double percentile(const double *sorted, int n, double p) {
+    double rank = p / 100.0 * (n - 1);
+    int lower = (int) floor(rank);
+    int upper = (int) ceil(rank);
+    return sorted[lower] + (sorted[upper] - sorted[lower]) * (rank - lower);
+}
+
+/* Использование:
+   myapp [строка_подключения [мин_температура макс_температура шаг [повторы [таблица]]]]
+   Повторы - сколько раз рассчитывается вся сетка температур (например, по числу высот). */
+int main(int argc, char **argv) {
     /* Параметры подключения к БД.
-       Отредактируйте строку подключения в соответствии с вашими настройками. */
+       Отредактируйте строку подключения в соответствии с вашими настройками
+       или передайте ее первым аргументом. */
     const char *conninfo = "dbname=mydb user=myuser password=12345 host=localhost port=5432";
+    double min_temperature = 0.0;
+    double max_temperature = 40.0;
+    double step = 0.01;
+    int repeat = 1;
+    const char *table = "public.calc_temperatures_correction";
+
+    if(argc > 1)
+        conninfo = argv[1];
+    if(argc > 4) {
+        min_temperature = atof(argv[2]);
+        max_temperature = atof(argv[3]);
+        step = atof(argv[4]);
+    }
+    if(argc > 5)
+        repeat = atoi(argv[5]);
+    if(argc > 6)
+        table = argv[6];
+
+    if(step <= 0.0 || repeat < 1 || max_temperature < min_temperature) {
+        fprintf(stderr, "Некорректные параметры расчета\n");
+        return EXIT_FAILURE;
+    }
+
     PGconn *conn = PQconnectdb(conninfo);
     if(PQstatus(conn) != CONNECTION_OK) {
         fprintf(stderr, "Ошибка подключения: %s\n", PQerrorMessage(conn));
@@ -58,7 +115,9 @@ int main() {
     }
 
     /* Запрос данных из таблицы calc_temperatures_correction */
-    PGresult *res = PQexec(conn, "SELECT temperature, correction FROM public.calc_temperatures_correction ORDER BY temperature ASC");
+    char query[512];
+    snprintf(query, sizeof(query), "SELECT temperature, correction FROM %s ORDER BY temperature ASC", table);
+    PGresult *res = PQexec(conn, query);
     if(PQresultStatus(res) != PGRES_TUPLES_OK) {
         fprintf(stderr, "Ошибка запроса: %s\n", PQerrorMessage(conn));
         PQclear(res);
@@ -85,31 +144,67 @@ int main() {
 
     PQclear(res);
 
+    /* Температура вычисляется по номеру точки, без накопления ошибки при сложении шага */
+    int n_temperatures = (int) floor((max_temperature - min_temperature) / step + 1e-9) + 1;
+    int total = n_temperatures * repeat;
+
     /* Начало замера времени расчета */
     clock_t start = clock();
+    double start_ns = now_ns();
 
     /* Переменные для проверки (например, суммирование результатов) */
     double sum = 0.0;
     int count = 0;
 
-    /* Расчет интерполяции от 0 до 40 градусов с шагом 0.01.
+    /* Расчет интерполяции в заданном диапазоне с заданным шагом.
        Для каждого значения температура вычисляется "на лету" без кеширования. */
-    for(double t = 0.0; t <= 40.0; t += 0.01) {
-        double corr = interpolate(t, points, n_points);
-        sum += corr;  // суммирование для проверки корректности работы алгоритма
-        count++;
-        /* Раскомментируйте следующую строку для вывода каждого результата (замедлит расчет) */
-        // printf("t = %.2f, correction = %.4f\n", t, corr);
+    for(int r = 0; r < repeat; r++) {
+        for(int i = 0; i < n_temperatures; i++) {
+            double t = min_temperature + i * step;
+            double corr = interpolate(t, points, n_points);
+            sum += corr;  // суммирование для проверки корректности работы алгоритма
+            count++;
+            /* Раскомментируйте следующую строку для вывода каждого результата (замедлит расчет) */
+            // printf("t = %.2f, correction = %.4f\n", t, corr);
+        }
     }
 
     clock_t end = clock();
     double elapsed = (double)(end - start) / CLOCKS_PER_SEC;
+    double wall_seconds = (now_ns() - start_ns) / 1e9;
+
+    /* Отдельный проход с замером времени каждой точки для перцентилей
+       (замер добавляет накладные расходы, поэтому не входит в общее время) */
+    double *latencies = malloc(total * sizeof(double));
+    if(latencies == NULL) {
+        fprintf(stderr, "Ошибка выделения памяти\n");
+        free(points);
+        PQfinish(conn);
+        return EXIT_FAILURE;
+    }
+    double check = 0.0;
+    for(int r = 0; r < repeat; r++) {
+        for(int i = 0; i < n_temperatures; i++) {
+            double t = min_temperature + i * step;
+            double point_start = now_ns();
+            check += interpolate(t, points, n_points);
+            latencies[r * n_temperatures + i] = now_ns() - point_start;
+        }
+    }
+    qsort(latencies, total, sizeof(double), compare_doubles);
 
     /* Вывод результатов */
     printf("Выполнено %d интерполяционных вычислений.\n", count);
     printf("Общая сумма коррекций (для проверки): %.4f\n", sum);
     printf("Время расчета: %.6f секунд.\n", elapsed);
+    printf("Время расчета точки: p50 = %.1f нс, p99 = %.1f нс\n",
+           percentile(latencies, total, 50.0), percentile(latencies, total, 99.0));
+
+    /* Строка для разбора скриптом benchmark.py */
+    printf("BENCH count=%d sum=%.4f seconds=%.9f p50_ns=%.1f p99_ns=%.1f check=%.4f\n",
+           count, sum, wall_seconds, percentile(latencies, total, 50.0), percentile(latencies, total, 99.0), check);
 
+    free(latencies);
     free(points);
     PQfinish(conn);
 
@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from urllib.parse import urlsplit
+
+import numpy as np
+import psycopg2
+
+from interpolatetion import (
+    DB_CONFIG, LATENCY_HISTOGRAM_SIZE, TIME_PERCENTILES,
+    histogram_percentiles, latency_histogram_bucket, print_header
+)
+from knot_index import KnotIndex, SCALE, scale_temperatures
+
+# Параметры сервиса по умолчанию
+DEFAULT_SERVICE = {
+    "host": "127.0.0.1",
+    "port": 8080,
+    "batch_window_ms": 0.0,
+    "max_batch": 4096,
+    "refresh_interval": 5.0
+}
+
+# Прототип интерфейса, который отдает сервис
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+# Таблицы, из которых строится кэш; при изменении любой из них кэш перезагружается
+SOURCE_TABLES = [
+    "snaart.calc_temperature_correction",
+    "snaart.calc_header_correction",
+    "snaart.calc_height_correction",
+    "snaart.calc_temperature_height_correction",
+    "snaart.calc_wind_speed_height_correction"
+]
+
+# Окно расчета количества запросов в секунду
+RATE_WINDOW_SECONDS = 10
+
+# Максимальный размер тела запроса
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def fetch_tables_fingerprint(conn):
+    """Общий отпечаток (md5) содержимого таблиц кэша"""
+    parts = " UNION ALL ".join(
+        f"SELECT {index} AS position, md5(COALESCE(string_agg(t::TEXT, ',' ORDER BY t::TEXT), '')) AS hash "
+        f"FROM {table} AS t"
+        for index, table in enumerate(SOURCE_TABLES)
+    )
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT md5(string_agg(hash, '|' ORDER BY position)) FROM ({parts}) AS h;")
+    fingerprint = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return fingerprint
+
+
+def _array_item(values, index):
+    """Элемент массива PostgreSQL по индексу с 1; вне границ или при NULL - None"""
+    if values is None or index is None or index < 1 or index > len(values):
+        return None
+    return values[index - 1]
+
+
+def _to_integer(value):
+    """Приведение NUMERIC к INTEGER (округление половины от нуля)"""
+    return int(Decimal(value).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class CorrectionCache:
+    """
+    Таблицы поправок в памяти сервиса
+
+    Расчеты повторяют fn_calc_temperature_interpolation (через KnotIndex),
+    sp_calc_temperature_deviation и sp_calc_wind_speed_deviation, включая
+    сообщения об ошибках и значения NULL для индексов вне заголовков таблиц.
+    """
+
+    def __init__(self, knot_index, temperature_rows, wind_headers, wind_rows, height_types, fingerprint,
+                 memoize=True):
+        self.knot_index = knot_index
+        self.temperature_rows = temperature_rows
+        self.wind_headers = wind_headers
+        self.wind_rows = wind_rows
+        self.height_types = height_types
+        self.fingerprint = fingerprint
+        self.loaded_at = datetime.now()
+        # Результаты поправок зависят только от целого индекса, знака и типа устройства
+        self.memoize = memoize
+        self._temperature_memo = {}
+        self._wind_memo = {}
+
+    @classmethod
+    def load(cls, conn, memoize=True):
+        """Загрузка таблиц поправок одним соединением (memoize - запоминать рассчитанные поправки)"""
+        fingerprint = fetch_tables_fingerprint(conn)
+        knot_index = KnotIndex.from_connection(conn)
+
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t1.measurment_type_id, t2.calc_height_id, t1.height,
+                   t2.positive_values, t2.negative_values, h.values
+            FROM snaart.calc_height_correction AS t1
+            INNER JOIN snaart.calc_temperature_height_correction AS t2
+                ON t2.calc_height_id = t1.id
+            LEFT JOIN snaart.calc_header_correction AS h
+                ON h.id = t2.calc_temperature_header_id AND h.header = 'table2'
+            ORDER BY t1.height, t2.id;
+        """)
+        temperature_rows = {}
+        for type_id, height_id, height, positive, negative, header in cursor.fetchall():
+            temperature_rows.setdefault(type_id, []).append({
+                "calc_height_id": height_id,
+                "height": height,
+                "positive_values": positive,
+                "negative_values": negative,
+                "header": header
+            })
+
+        cursor.execute("SELECT measurment_type_id, values FROM snaart.calc_header_correction WHERE header = 'table3';")
+        wind_headers = dict(cursor.fetchall())
+
+        cursor.execute("""
+            SELECT t1.measurment_type_id, t2.calc_height_id, t1.height, t2.values, t2.delta
+            FROM snaart.calc_height_correction AS t1
+            INNER JOIN snaart.calc_wind_speed_height_correction AS t2
+                ON t2.calc_height_id = t1.id
+            ORDER BY t1.height, t2.id;
+        """)
+        wind_rows = {}
+        for type_id, height_id, height, values, delta in cursor.fetchall():
+            wind_rows.setdefault(type_id, []).append({
+                "calc_height_id": height_id,
+                "height": height,
+                "values": values,
+                "delta": delta
+            })
+
+        cursor.execute("SELECT DISTINCT measurment_type_id FROM snaart.calc_height_correction;")
+        height_types = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+        cursor.close()
+
+        return cls(knot_index, temperature_rows, wind_headers, wind_rows, height_types, fingerprint, memoize)
+
+    def interpolate_batch(self, temperatures):
+        """
+        Поправки fn_calc_temperature_interpolation для списка температур
+
+        Все корректные значения считаются одним векторным вызовом KnotIndex;
+        для значений вне диапазона или не являющихся числами возвращается ValueError.
+        """
+        results = [None] * len(temperatures)
+        valid = []
+        for position, value in enumerate(temperatures):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                results[position] = ValueError(f"Некорректное значение температуры: {value!r}")
+            else:
+                valid.append(position)
+
+        if valid:
+            scaled = scale_temperatures([temperatures[position] for position in valid])
+            knots_x = self.knot_index.knots["x"]
+            inside = (scaled >= knots_x[0]) & (scaled <= knots_x[-1])
+            values = np.zeros(len(scaled), dtype=np.int64)
+            if np.any(inside):
+                values[inside] = self.knot_index.evaluate_scaled(scaled[inside])
+            out_of_range = None
+            for position, is_inside, value, scaled_value in zip(valid, inside.tolist(), values.tolist(),
+                                                                scaled.tolist()):
+                if is_inside:
+                    results[position] = value / SCALE
+                    continue
+                if out_of_range is None:
+                    # Сообщение об ошибке берется из KnotIndex, как для одиночного расчета
+                    try:
+                        self.knot_index.evaluate_scaled([scaled_value])
+                    except ValueError as e:
+                        out_of_range = e
+                results[position] = out_of_range
+        return results
+
+    def temperature_deviation(self, temperature_correction, measurement_type_id):
+        """Поправки к температуре по высотам, как sp_calc_temperature_deviation"""
+        rows = self.temperature_rows.get(measurement_type_id)
+        if not rows:
+            raise ValueError("Для расчета поправок к температуре не хватает данных!")
+
+        # Параметр процедуры - NUMERIC(8,2), индекс - его приведение к INTEGER
+        value = Decimal(str(temperature_correction)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        index = _to_integer(value)
+        key = (measurement_type_id, index, value < 0)
+        if self.memoize and key in self._temperature_memo:
+            return self._temperature_memo[key]
+
+        corrections = []
+        for row in rows:
+            header = row["header"]
+            if header and len(header) < index:
+                raise ValueError(f"Невозможно произвести расчет по высоте {row['height']} "
+                                 f"Некорректные исходные данные или настройки")
+
+            right_index = abs(index) % 10
+            header_index = abs(index) - right_index
+            if header_index == 0:
+                header_index = 1
+
+            left_index = _array_item(header, header_index)
+            if left_index == 0:
+                left_index = 1
+
+            table = row["positive_values"] if value >= 0 else row["negative_values"]
+            left = _array_item(table, left_index)
+            right = _array_item(table, right_index)
+            deviation = _to_integer(left + right) if left is not None and right is not None else None
+
+            corrections.append({
+                "calc_height_id": row["calc_height_id"],
+                "height": row["height"],
+                "temperature_deviation": deviation
+            })
+
+        if self.memoize:
+            self._temperature_memo[key] = corrections
+        return corrections
+
+    def wind_deviation(self, bullet_demolition_range, measurement_type_id):
+        """Поправки скорости и направления среднего ветра по высотам, как sp_calc_wind_speed_deviation"""
+        if bullet_demolition_range is None or Decimal(str(bullet_demolition_range)) < 0:
+            raise ValueError(f"Некорректно переданы параметры! Значение par_bullet_demolition_range "
+                             f"{bullet_demolition_range}")
+        if measurement_type_id not in self.height_types:
+            raise ValueError(f"Для устройства с кодом {measurement_type_id} не найдены значения высот "
+                             f"в таблице calc_height_correction!")
+
+        index = _to_integer(Decimal(str(bullet_demolition_range)) / 10) - 4
+        if index < 0:
+            index = 1
+        key = (measurement_type_id, index)
+        if self.memoize and key in self._wind_memo:
+            return self._wind_memo[key]
+
+        header = self.wind_headers.get(measurement_type_id)
+        if header and len(header) < index:
+            raise ValueError("Невозможно произвести расчет по высоте. Некорректные исходные данные или настройки")
+
+        corrections = [
+            {
+                "calc_height_id": row["calc_height_id"],
+                "height": row["height"],
+                "wind_speed_deviation": _array_item(row["values"], index % 10),
+                "wind_deviation": row["delta"]
+            }
+            for row in self.wind_rows.get(measurement_type_id, [])
+        ]
+        if self.memoize:
+            self._wind_memo[key] = corrections
+        return corrections
+
+
+class MicroBatcher:
+    """
+    Объединение одновременно пришедших запросов в один расчет
+
+    Запросы складываются в очередь; обработчик забирает все, что накопилось
+    за один проход цикла событий (и дополнительно за window_ms, если задано),
+    но не больше max_batch значений, и считает их одним вызовом evaluate.
+    evaluate получает плоский список значений и возвращает список результатов
+    той же длины (ошибка отдельного значения - экземпляр исключения).
+    """
+
+    def __init__(self, evaluate, window_ms=0.0, max_batch=DEFAULT_SERVICE["max_batch"]):
+        self.evaluate = evaluate
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, values):
+        """Расчет списка значений в составе общего пакета"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((values, future))
+        return await future
+
+    async def run(self):
+        """Цикл обработки очереди"""
+        while True:
+            batch = [await self.queue.get()]
+            # Даем выполниться остальным готовым обработчикам запросов
+            await asyncio.sleep(self.window)
+            size = len(batch[0][0])
+            while size < self.max_batch and not self.queue.empty():
+                entry = self.queue.get_nowait()
+                batch.append(entry)
+                size += len(entry[0])
+
+            values = [value for entry_values, _ in batch for value in entry_values]
+            try:
+                results = self.evaluate(values)
+            except Exception as e:  # ошибка всего пакета передается каждому запросу
+                results = [e] * len(values)
+
+            offset = 0
+            for entry_values, future in batch:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(entry_values)])
+                offset += len(entry_values)
+
+            self.batches += 1
+            self.items += len(values)
+            self.largest_batch = max(self.largest_batch, len(values))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else None,
+            "max_batch": self.largest_batch
+        }
+
+
+class ServiceMetrics:
+    """Счетчики запросов, запросы в секунду и гистограмма времени ответа"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.endpoints = {}
+        self.histogram = [0] * LATENCY_HISTOGRAM_SIZE
+        # Количество запросов по секундам за последние RATE_WINDOW_SECONDS
+        self.per_second = deque(maxlen=RATE_WINDOW_SECONDS + 1)
+
+    def record(self, endpoint, elapsed_ms, status):
+        self.requests += 1
+        if status >= 400:
+            self.errors += 1
+        self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+        self.histogram[latency_histogram_bucket(elapsed_ms) - 1] += 1
+
+        second = int(time.time())
+        if self.per_second and self.per_second[-1][0] == second:
+            self.per_second[-1][1] += 1
+        else:
+            self.per_second.append([second, 1])
+
+    def requests_per_second(self):
+        """Среднее количество запросов в секунду за завершенные секунды окна"""
+        current = int(time.time())
+        counts = [count for second, count in self.per_second if current - RATE_WINDOW_SECONDS <= second < current]
+        window = min(RATE_WINDOW_SECONDS, max(current - int(self.started), 1))
+        return sum(counts) / window
+
+    def snapshot(self):
+        percentiles, _ = histogram_percentiles(self.histogram, TIME_PERCENTILES)
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "requests": self.requests,
+            "errors": self.errors,
+            "requests_per_second": self.requests_per_second(),
+            "endpoints": self.endpoints,
+            "latency_ms": {f"p{percentile:g}": value for percentile, value in percentiles.items()},
+            "latency_histogram": self.histogram
+        }
+
+
+class MeteoService:
+    """HTTP-сервис расчета поправок по кэшу таблиц"""
+
+    def __init__(self, db_config, batch_window_ms, max_batch, refresh_interval):
+        self.db_config = db_config
+        self.refresh_interval = refresh_interval
+        self.cache = None
+        self.reloads = 0
+        self.metrics = ServiceMetrics()
+        self.batchers = {
+            "interpolation": MicroBatcher(lambda values: self.cache.interpolate_batch(values),
+                                          batch_window_ms, max_batch),
+            "temperature-deviation": MicroBatcher(
+                lambda values: self._evaluate_each(self.cache.temperature_deviation, values,
+                                                   "temperature_correction"),
+                batch_window_ms, max_batch),
+            "wind-deviation": MicroBatcher(
+                lambda values: self._evaluate_each(self.cache.wind_deviation, values,
+                                                   "bullet_demolition_range"),
+                batch_window_ms, max_batch)
+        }
+        with open(TEMPLATE_PATH, "rb") as file:
+            self.index_html = file.read()
+
+    @staticmethod
+    def _evaluate_each(function, requests, value_key):
+        """Расчет поправок по высотам для каждого запроса пакета"""
+        results = []
+        for request in requests:
+            try:
+                if not isinstance(request, dict):
+                    raise ValueError("Запрос должен быть объектом JSON")
+                results.append({"corrections": function(request.get(value_key),
+                                                        int(request.get("measurement_type_id", 1)))})
+            except (ValueError, TypeError, InvalidOperation) as e:
+                results.append(ValueError(str(e)) if not isinstance(e, ValueError) else e)
+        return results
+
+    def load_cache(self):
+        """Загрузка кэша (выполняется вне цикла событий)"""
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            return CorrectionCache.load(conn)
+        finally:
+            conn.close()
+
+    def current_fingerprint(self):
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            return fetch_tables_fingerprint(conn)
+        finally:
+            conn.close()
+
+    async def refresh_loop(self):
+        """Периодическая проверка отпечатка таблиц и перезагрузка кэша при изменениях"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                fingerprint = await loop.run_in_executor(None, self.current_fingerprint)
+                if fingerprint != self.cache.fingerprint:
+                    self.cache = await loop.run_in_executor(None, self.load_cache)
+                    self.reloads += 1
+                    print(f"✓ Таблицы поправок изменились, кэш перезагружен ({self.cache.fingerprint})")
+            except psycopg2.Error as e:
+                print(f"✗ Ошибка проверки таблиц поправок: {e}")
+
+    async def dispatch(self, method, path, body):
+        """Обработка запроса: (код ответа, тип содержимого, тело)"""
+        if path in ("/", "/index.html"):
+            if method != "GET":
+                return 405, "application/json", {"error": "Метод не поддерживается"}
+            return 200, "text/html; charset=utf-8", self.index_html
+
+        if path == "/health":
+            return 200, "application/json", {"status": "ok", "fingerprint": self.cache.fingerprint}
+
+        if path == "/metrics":
+            metrics = self.metrics.snapshot()
+            metrics["batching"] = {name: batcher.stats() for name, batcher in self.batchers.items()}
+            metrics["cache"] = {
+                "fingerprint": self.cache.fingerprint,
+                "loaded_at": self.cache.loaded_at.isoformat(),
+                "reloads": self.reloads
+            }
+            return 200, "application/json", metrics
+
+        endpoint = path[len("/api/"):] if path.startswith("/api/") else None
+        if endpoint not in self.batchers:
+            return 404, "application/json", {"error": f"Неизвестный адрес: {path}"}
+        if method != "POST":
+            return 405, "application/json", {"error": "Метод не поддерживается"}
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return 400, "application/json", {"error": "Некорректный JSON"}
+
+        # Одиночный запрос или пакет: {"temperature": t} / {"temperatures": [...]},
+        # {"temperature_correction": ..., "measurement_type_id": ...} / {"requests": [...]}
+        if endpoint == "interpolation":
+            batched = isinstance(payload, dict) and "temperatures" in payload
+            values = payload.get("temperatures") if batched else [payload.get("temperature")] \
+                if isinstance(payload, dict) else None
+        else:
+            batched = isinstance(payload, dict) and "requests" in payload
+            values = payload.get("requests") if batched else [payload]
+        if not isinstance(values, list):
+            return 400, "application/json", {"error": "Ожидается список значений"}
+
+        results = await self.batchers[endpoint].submit(values)
+        if not batched:
+            result = results[0]
+            if isinstance(result, Exception):
+                return 400, "application/json", {"error": str(result)}
+            return 200, "application/json", {"value": result} if endpoint == "interpolation" else result
+
+        return 200, "application/json", {"results": [
+            {"error": str(result)} if isinstance(result, Exception)
+            else {"value": result} if endpoint == "interpolation" else result
+            for result in results
+        ]}
+
+    async def handle_connection(self, reader, writer):
+        """Соединение HTTP/1.1 с поддержкой keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start_time = time.perf_counter()
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_SIZE:
+                    status, content_type, content = 413, "application/json", {"error": "Слишком большой запрос"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    path = urlsplit(target).path
+                    try:
+                        status, content_type, content = await self.dispatch(method, path, body)
+                    except Exception as e:
+                        status, content_type, content = 500, "application/json", {"error": str(e)}
+
+                if not isinstance(content, bytes):
+                    content = json.dumps(content, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + content
+                )
+                await writer.drain()
+
+                self.metrics.record(urlsplit(target).path, (time.perf_counter() - start_time) * 1000, status)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        """Загрузка кэша и запуск сервера"""
+        loop = asyncio.get_running_loop()
+        self.cache = await loop.run_in_executor(None, self.load_cache)
+        print(f"✓ Кэш таблиц поправок загружен ({self.cache.fingerprint})")
+
+        for batcher in self.batchers.values():
+            asyncio.create_task(batcher.run())
+        if self.refresh_interval > 0:
+            asyncio.create_task(self.refresh_loop())
+
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"✓ Сервис доступен по адресу http://{host}:{port}/")
+        async with server:
+            await server.serve_forever()
+
+
+def parse_arguments():
+    """Обработка аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Локальный сервис расчета метеопоправок по кэшу таблиц')
+
+    # Параметры базы данных
+    db_group = parser.add_argument_group('Параметры базы данных')
+    db_group.add_argument('--dbname', help='Имя базы данных')
+    db_group.add_argument('--user', help='Имя пользователя')
+    db_group.add_argument('--password', help='Пароль')
+    db_group.add_argument('--host', help='Хост', default='localhost')
+    db_group.add_argument('--port', help='Порт', default='5432')
+
+    # Параметры сервиса
+    service_group = parser.add_argument_group('Параметры сервиса')
+    service_group.add_argument('--listen', default=DEFAULT_SERVICE["host"],
+                               help=f'Адрес сервиса (по умолчанию: {DEFAULT_SERVICE["host"]})')
+    service_group.add_argument('--http-port', type=int, default=DEFAULT_SERVICE["port"],
+                               help=f'Порт сервиса (по умолчанию: {DEFAULT_SERVICE["port"]})')
+    service_group.add_argument('--batch-window-ms', type=float, default=DEFAULT_SERVICE["batch_window_ms"],
+                               help='Дополнительное ожидание запросов для пакета, мс '
+                                    f'(по умолчанию: {DEFAULT_SERVICE["batch_window_ms"]})')
+    service_group.add_argument('--max-batch', type=int, default=DEFAULT_SERVICE["max_batch"],
+                               help=f'Максимальный размер пакета (по умолчанию: {DEFAULT_SERVICE["max_batch"]})')
+    service_group.add_argument('--refresh-interval', type=float, default=DEFAULT_SERVICE["refresh_interval"],
+                               help='Период проверки изменений таблиц, с; 0 - не проверять '
+                                    f'(по умолчанию: {DEFAULT_SERVICE["refresh_interval"]})')
+
+    return parser.parse_args()
+
+
+def main():
+    """Запуск сервиса"""
+    args = parse_arguments()
+
+    db_config = DB_CONFIG.copy()
+    if args.dbname: db_config["dbname"] = args.dbname
+    if args.user: db_config["user"] = args.user
+    if args.password: db_config["password"] = args.password
+    if args.host: db_config["host"] = args.host
+    if args.port: db_config["port"] = args.port
+
+    print_header("СЕРВИС РАСЧЕТА МЕТЕОПОПРАВОК")
+    service = MeteoService(db_config, args.batch_window_ms, args.max_batch, args.refresh_interval)
+    try:
+        asyncio.run(service.serve(args.listen, args.http_port))
+    except psycopg2.Error as e:
+        print(f"✗ Ошибка загрузки таблиц поправок: {e}")
+        return 1
+    except KeyboardInterrupt:
+        print("\nСервис остановлен")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
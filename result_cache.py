@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+# Файл описания записи кеша: ключ, число строк, файлы столбцов и агрегаты
+MANIFEST_NAME = "manifest.json"
+
+# Префикс каталогов записей, которые еще пишутся
+TEMP_PREFIX = ".tmp-"
+
+
+def _write_manifest(directory, manifest):
+    """Атомарная запись manifest.json (временный файл и переименование)"""
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, os.path.join(directory, MANIFEST_NAME))
+
+
+def _npy_header(dtype, rows):
+    """Заголовок .npy для одномерного массива из rows элементов"""
+    return {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": (rows,)}
+
+
+class ResultCacheEntry:
+    """
+    Запись кеша: столбцы результатов через mmap и сохраненные агрегаты
+
+    Файл столбца открывается при первом обращении к нему, поэтому анализ,
+    которому нужен один столбец, не читает остальные.
+    """
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.key = manifest["key"]
+        self.rows = manifest["rows"]
+        self.meta = manifest["meta"]
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return list(self.manifest["columns"])
+
+    @property
+    def size(self):
+        return self.manifest["bytes"]
+
+    def column(self, name):
+        """Массив столбца (mmap, только чтение)"""
+        if name not in self._columns:
+            path = os.path.join(self.directory, self.manifest["columns"][name])
+            # Пустой файл нельзя отобразить в память
+            self._columns[name] = np.load(path, mmap_mode="r" if self.rows else None)
+        return self._columns[name]
+
+    def iter_chunks(self, columns=None, chunk_size=100000):
+        """Порции «столбец -> массив», как при потоковом чтении из базы данных"""
+        columns = columns or self.columns
+        arrays = [self.column(name) for name in columns]
+        for offset in range(0, self.rows, chunk_size):
+            yield {name: np.asarray(array[offset:offset + chunk_size]) for name, array in zip(columns, arrays)}
+
+
+class ResultCache:
+    """
+    Локальный кеш результатов расчета со столбцовым хранением
+
+    Каждая запись - каталог с именем ключа: по файлу .npy на столбец и
+    manifest.json с числом строк, агрегатами и временем последнего
+    использования. Запись создается во временном каталоге и переименовывается
+    целиком, поэтому прерванное сохранение не оставляет неполной записи.
+    При превышении max_bytes удаляются давно не использованные записи (LRU).
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def open(self, key):
+        """Открытие записи по ключу с отметкой использования; None, если записи нет"""
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as file:
+                manifest = json.load(file)
+            if manifest.get("key") != key:
+                return None
+            manifest["last_used"] = datetime.now().isoformat()
+            _write_manifest(path, manifest)
+        except (OSError, ValueError, KeyError):
+            return None
+        return ResultCacheEntry(path, manifest)
+
+    def store(self, key, chunks, columns, meta):
+        """
+        Сохранение результатов порциями
+
+        chunks - порции «столбец -> массив», columns - {столбец: тип NumPy},
+        meta - агрегаты (JSON). Столбцы дописываются в файлы .npy по мере
+        чтения порций, заголовок с числом строк записывается в конце.
+        Возвращает открытую запись или None, если она больше лимита кеша.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX, dir=self.directory)
+        files = {}
+        try:
+            files = {name: open(os.path.join(temp_dir, f"{name}.npy"), "wb") for name in columns}
+            data_offsets = {}
+            for name, file in files.items():
+                np.lib.format.write_array_header_1_0(file, _npy_header(columns[name], 0))
+                data_offsets[name] = file.tell()
+
+            rows = 0
+            size = 0
+            for chunk in chunks:
+                for name, file in files.items():
+                    data = np.ascontiguousarray(chunk[name], dtype=columns[name])
+                    file.write(data.tobytes())
+                    size += data.nbytes
+                rows += len(chunk[next(iter(columns))])
+                if size > self.max_bytes:
+                    return None
+
+            # Заголовок .npy выравнивается до 64 байт, поэтому его длина не зависит от числа строк
+            for name, file in files.items():
+                file.seek(0)
+                np.lib.format.write_array_header_1_0(file, _npy_header(columns[name], rows))
+                if file.tell() != data_offsets[name]:
+                    raise ValueError(f"Заголовок столбца {name} изменил длину")
+                file.close()
+
+            now = datetime.now().isoformat()
+            manifest = {
+                "key": key,
+                "rows": rows,
+                "bytes": sum(os.path.getsize(os.path.join(temp_dir, f"{name}.npy")) for name in columns),
+                "columns": {name: f"{name}.npy" for name in columns},
+                "meta": meta,
+                "created_at": now,
+                "last_used": now
+            }
+            _write_manifest(temp_dir, manifest)
+
+            path = os.path.join(self.directory, key)
+            if os.path.isdir(path):
+                # Запись с тем же ключом уже сохранена другим процессом
+                shutil.rmtree(temp_dir)
+            else:
+                os.replace(temp_dir, path)
+            self.evict(keep=key)
+            return self.open(key)
+        finally:
+            for file in files.values():
+                file.close()
+            if os.path.isdir(temp_dir):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def entries(self):
+        """Сохраненные записи: список (каталог, manifest)"""
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for name in os.listdir(self.directory):
+            if name.startswith(TEMP_PREFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as file:
+                    result.append((path, json.load(file)))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def evict(self, keep=None):
+        """Удаление давно не использованных записей до размера max_bytes; возвращает число удаленных"""
+        entries = sorted(self.entries(), key=lambda entry: entry[1].get("last_used", ""))
+        total = sum(manifest.get("bytes", 0) for _, manifest in entries)
+        removed = 0
+        for path, manifest in entries:
+            if total <= self.max_bytes:
+                break
+            if manifest.get("key") == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= manifest.get("bytes", 0)
+            removed += 1
+        return removed
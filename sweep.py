@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import psycopg2
+
+from interpolatetion import (
+    DB_CONFIG, LATENCY_HISTOGRAM_SIZE, CopyStream, create_performance_charts, display_summary,
+    latency_histogram_bucket, print_header
+)
+from meteo_service import CorrectionCache
+
+# Способы расчета: хранимая процедура (пакетами через sweep_correction_procedure)
+# или расчет в процессе по таблицам поправок в памяти (CorrectionCache)
+SWEEP_ENGINES = ["procedure", "python"]
+
+# Параметры перебора по умолчанию
+DEFAULT_SWEEP = {
+    "batch_size": 1000,
+    "chunk_size": 10000,
+    "output_dir": "performance_results",
+    "dpi": 300
+}
+
+# Точность параметра процедуры в sweep_results.parameter (NUMERIC(10,2))
+PARAMETER_EXPONENT = -2
+
+
+def temperature_cache_key(value, measurement_type_id):
+    """
+    Ключ кеша sp_calc_temperature_deviation
+
+    Процедура использует только целую часть поправки (приведение к INTEGER)
+    и ее знак, поэтому поправки 2.6 и 3.4 дают одинаковый результат.
+    """
+    return measurement_type_id, int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP)), value < 0
+
+
+def wind_cache_key(value, measurement_type_id):
+    """
+    Ключ кеша sp_calc_wind_speed_deviation
+
+    Результат зависит только от индекса (дальность / 10)::integer - 4;
+    отрицательная дальность - ошибка с самим значением в тексте, такие
+    вызовы не объединяются.
+    """
+    if value < 0:
+        return measurement_type_id, "negative", value
+    index = int((value / 10).quantize(Decimal(1), rounding=ROUND_HALF_UP)) - 4
+    if index < 0:
+        index = 1
+    return measurement_type_id, index
+
+
+def evaluate_temperature(cache, value, measurement_type_id):
+    """Поправки к температуре в процессе: (высоты, поправки, None)"""
+    corrections = cache.temperature_deviation(value, measurement_type_id)
+    return ([row["height"] for row in corrections],
+            [row["temperature_deviation"] for row in corrections],
+            None)
+
+
+def evaluate_wind(cache, value, measurement_type_id):
+    """Поправки ветра в процессе: (высоты, поправки скорости, приращения направления)"""
+    corrections = cache.wind_deviation(value, measurement_type_id)
+    return ([row["height"] for row in corrections],
+            [row["wind_speed_deviation"] for row in corrections],
+            [row["wind_deviation"] for row in corrections])
+
+
+# Процедуры перебора: имя параметра, сетка по умолчанию, ключ кеша повторяющихся
+# входных данных, расчет в процессе и подписи графиков (см. INTERPOLATION_CHART_AXES)
+SWEEP_TARGETS = {
+    "temperature": {
+        "procedure": "sp_calc_temperature_deviation",
+        "parameter": "par_temperature_correction",
+        "grid": "-50:50:0.1",
+        "key": temperature_cache_key,
+        "evaluate": evaluate_temperature,
+        "axes": {
+            "title": "Анализ производительности sp_calc_temperature_deviation",
+            "row_label": "Тип устройства",
+            "row_title": "по типам устройств",
+            "row_width": 0.6,
+            "column_label": "Поправка к температуре",
+            "column_title": "по поправкам к температуре",
+            "heatmap_label": "Поправка к температуре"
+        }
+    },
+    "wind": {
+        "procedure": "sp_calc_wind_speed_deviation",
+        "parameter": "par_bullet_demolition_range",
+        "grid": "0:200:0.1",
+        "key": wind_cache_key,
+        "evaluate": evaluate_wind,
+        "axes": {
+            "title": "Анализ производительности sp_calc_wind_speed_deviation",
+            "row_label": "Тип устройства",
+            "row_title": "по типам устройств",
+            "row_width": 0.6,
+            "column_label": "Дальность до разрыва",
+            "column_title": "по дальности до разрыва",
+            "heatmap_label": "Дальность до разрыва"
+        }
+    }
+}
+
+
+def parse_grid(text):
+    """
+    Разбор сетки значений параметра: «начало:конец:шаг» или список «a,b,c»
+
+    Значения вычисляются в Decimal, поэтому сетка не накапливает ошибку
+    шага; допускается не больше двух знаков после запятой.
+    """
+    try:
+        if ":" in text:
+            parts = [Decimal(part) for part in text.split(":")]
+            if len(parts) != 3:
+                raise argparse.ArgumentTypeError(f"ожидается начало:конец:шаг: {text}")
+            start, stop, step = parts
+            if step <= 0 or stop < start:
+                raise argparse.ArgumentTypeError(f"шаг должен быть положительным, конец - не меньше начала: {text}")
+            values = [start + step * index for index in range(int((stop - start) // step) + 1)]
+        else:
+            values = [Decimal(part) for part in text.split(",") if part.strip()]
+    except InvalidOperation:
+        raise argparse.ArgumentTypeError(f"значения сетки должны быть числами: {text}")
+
+    if not values:
+        raise argparse.ArgumentTypeError(f"пустая сетка: {text}")
+    if any(value.as_tuple().exponent < PARAMETER_EXPONENT for value in values):
+        raise argparse.ArgumentTypeError(f"допускается не больше двух знаков после запятой: {text}")
+    return values
+
+
+def parse_types(text):
+    """Разбор списка типов устройств «1,2»"""
+    try:
+        return [int(part) for part in text.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается список целых чисел: {text}")
+
+
+def sort_by_height(heights, deviations, wind_deviations):
+    """
+    Поправки в порядке возрастания высот
+
+    Процедуры возвращают высоты в порядке плана запроса, поэтому результаты
+    обоих способов расчета приводятся к одному порядку; пустой результат - NULL.
+    """
+    if not heights:
+        return None, None, None
+    order = sorted(range(len(heights)), key=heights.__getitem__)
+
+    def pick(values):
+        return None if values is None else [values[index] for index in order]
+
+    return pick(heights), pick(deviations), pick(wind_deviations)
+
+
+def evaluate_procedure(conn, target, values, type_ids, batch_size):
+    """
+    Расчет хранимой процедурой пакетами по batch_size вызовов
+
+    Возвращает список (поправки, время вызова в мс по часам сервера, ошибка).
+    """
+    results = []
+    cursor = conn.cursor()
+    for offset in range(0, len(values), batch_size):
+        cursor.execute("""
+            SELECT heights, deviations, wind_deviations, calculation_time, error_message
+            FROM snaart.sweep_correction_procedure(%s, %s::NUMERIC[], %s::INTEGER[])
+            ORDER BY ordinal;
+        """, (target, values[offset:offset + batch_size], type_ids[offset:offset + batch_size]))
+        for heights, deviations, wind_deviations, calculation_time, error_message in cursor.fetchall():
+            results.append((sort_by_height(heights, deviations, wind_deviations),
+                            float(calculation_time), error_message))
+    cursor.close()
+    return results
+
+
+def evaluate_python(cache, target, values, type_ids):
+    """
+    Расчет в процессе по таблицам поправок в памяти
+
+    Ошибки процедуры (RAISE EXCEPTION) воспроизводятся как ValueError
+    с тем же текстом. Возвращает тот же список, что evaluate_procedure.
+    """
+    evaluate = SWEEP_TARGETS[target]["evaluate"]
+    results = []
+    for value, type_id in zip(values, type_ids):
+        start_time = time.perf_counter()
+        try:
+            outputs = sort_by_height(*evaluate(cache, value, type_id))
+            error_message = None
+        except ValueError as e:
+            outputs = (None, None, None)
+            error_message = str(e)
+        results.append((outputs, (time.perf_counter() - start_time) * 1000, error_message))
+    return results
+
+
+def run_sweep(conn, cache, target, engine, values, type_ids, batch_size, use_cache=True):
+    """
+    Перебор всех пар (значение параметра, тип устройства)
+
+    Повторяющиеся входные данные (с одинаковым ключом кеша) рассчитываются
+    один раз, остальные вызовы получают результат из кеша и записываются
+    без времени расчета. Возвращает строки sweep_results (без sweep_id),
+    гистограмму времени рассчитанных вызовов, число попаданий в кеш и общее время (мс).
+    """
+    key = SWEEP_TARGETS[target]["key"]
+    start_time = time.perf_counter()
+
+    keys = [key(value, type_id) if use_cache else index
+            for index, (value, type_id) in enumerate(zip(values, type_ids))]
+    first_index = {}
+    for index, input_key in enumerate(keys):
+        first_index.setdefault(input_key, index)
+    unique = list(first_index.values())
+
+    unique_values = [values[index] for index in unique]
+    unique_types = [type_ids[index] for index in unique]
+    if engine == "procedure":
+        computed = evaluate_procedure(conn, target, unique_values, unique_types, batch_size)
+    else:
+        computed = evaluate_python(cache, target, unique_values, unique_types)
+    by_key = {keys[index]: result for index, result in zip(unique, computed)}
+
+    rows = []
+    for index, input_key in enumerate(keys):
+        (heights, deviations, wind_deviations), calculation_time, error_message = by_key[input_key]
+        cached = first_index[input_key] != index
+        rows.append((type_ids[index], values[index], heights, deviations, wind_deviations,
+                     None if cached else calculation_time, cached, error_message))
+    total_time_ms = (time.perf_counter() - start_time) * 1000
+
+    histogram = [0] * LATENCY_HISTOGRAM_SIZE
+    for _, calculation_time, _ in computed:
+        histogram[latency_histogram_bucket(calculation_time) - 1] += 1
+
+    return rows, histogram, len(values) - len(unique), total_time_ms
+
+
+def _copy_text_value(value):
+    """Значение в текстовом формате COPY (массивы - литералом {a,b,NULL})"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, list):
+        return "{" + ",".join("NULL" if item is None else str(item) for item in value) + "}"
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return str(value)
+
+
+def write_sweep_results(conn, sweep_id, rows, chunk_size):
+    """Запись результатов перебора одним текстовым COPY; возвращает (строк, байт, секунд)"""
+
+    def encoded_chunks():
+        for offset in range(0, len(rows), chunk_size):
+            yield "".join(
+                "\t".join(map(_copy_text_value, (sweep_id,) + row)) + "\n"
+                for row in rows[offset:offset + chunk_size]
+            ).encode("utf-8")
+
+    stream = CopyStream(encoded_chunks())
+    cursor = conn.cursor()
+    start_time = time.perf_counter()
+    cursor.copy_expert("COPY snaart.sweep_results (sweep_id, measurement_type_id, parameter, heights, deviations, "
+                       "wind_deviations, calculation_time, cached, error_message) FROM STDIN", stream, size=1 << 20)
+    elapsed = time.perf_counter() - start_time
+    cursor.close()
+    return len(rows), stream.bytes_written, elapsed
+
+
+def save_sweep_performance(cursor, sweep_id, total_time_ms, parameters, histogram):
+    """Метрики перебора в sweep_performance (агрегаты - по рассчитанным вызовам, без кеша)"""
+    cursor.execute("""
+        INSERT INTO snaart.sweep_performance (
+            id,
+            total_time_ms,
+            total_calculations,
+            successful_calculations,
+            avg_calculation_time_ms,
+            min_calculation_time_ms,
+            max_calculation_time_ms,
+            parameters,
+            latency_histogram
+        )
+        SELECT
+            %s, %s,
+            COUNT(*),
+            COUNT(*) FILTER (WHERE error_message IS NULL),
+            AVG(calculation_time),
+            MIN(calculation_time),
+            MAX(calculation_time),
+            %s::jsonb || jsonb_build_object('calculation_date', NOW()::TEXT),
+            %s
+        FROM snaart.sweep_results
+        WHERE sweep_id = %s;
+    """, (sweep_id, total_time_ms, json.dumps(parameters), histogram, sweep_id))
+
+
+def fetch_sweep_metrics(conn, sweep_id):
+    """
+    Метрики и статистика перебора в формате fetch_performance_metrics
+
+    Строки графиков - типы устройств, столбцы - диапазоны значений параметра
+    по 10, тепловая карта - по 5; время считается по рассчитанным вызовам.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, total_time_ms, total_calculations, successful_calculations,
+               avg_calculation_time_ms, min_calculation_time_ms, max_calculation_time_ms,
+               parameters, created_at, latency_histogram
+        FROM snaart.sweep_performance
+        WHERE id = %s;
+    """, (sweep_id,))
+    metrics = cursor.fetchone()
+
+    cursor.execute("""
+        SELECT
+            GROUPING(measurement_type_id, parameter_range, parameter_group) AS grouping_id,
+            measurement_type_id,
+            parameter_range,
+            parameter_group,
+            COUNT(*) AS count,
+            AVG(calculation_time) AS avg_time,
+            MIN(calculation_time) AS min_time,
+            MAX(calculation_time) AS max_time,
+            COUNT(*) FILTER (WHERE error_message IS NOT NULL) AS error_count
+        FROM (
+            SELECT
+                measurement_type_id,
+                FLOOR(parameter / 10) * 10 AS parameter_range,
+                FLOOR(parameter / 5) * 5 AS parameter_group,
+                calculation_time,
+                error_message
+            FROM snaart.sweep_results
+            WHERE sweep_id = %s
+        ) AS r
+        GROUP BY GROUPING SETS ((measurement_type_id), (parameter_range), (measurement_type_id, parameter_group))
+        ORDER BY grouping_id, measurement_type_id, parameter_range, parameter_group;
+    """, (sweep_id,))
+
+    type_stats = []
+    range_stats = []
+    heatmap_data = []
+    for grouping_id, type_id, parameter_range, parameter_group, count, avg_time, min_time, max_time, error_count \
+            in cursor.fetchall():
+        if grouping_id == 0b011:
+            type_stats.append((type_id, count, avg_time, min_time, max_time, error_count))
+        elif grouping_id == 0b101:
+            range_stats.append((parameter_range, count, avg_time, min_time, max_time, error_count))
+        else:
+            heatmap_data.append((type_id, parameter_group, avg_time, count))
+    cursor.close()
+    return metrics, type_stats, range_stats, heatmap_data
+
+
+def describe_grid(values):
+    """Описание сетки значений для параметров метрик"""
+    return {"min": str(min(values)), "max": str(max(values)), "count": len(set(values))}
+
+
+def compare_engines(results):
+    """
+    Сверка результатов способов расчета по каждому вызову
+
+    Сравниваются поправки и тексты ошибок; возвращает число расхождений
+    и первое из них.
+    """
+    (first_engine, first_rows), (second_engine, second_rows) = list(results.items())[:2]
+    mismatches = 0
+    example = None
+    for first, second in zip(first_rows, second_rows):
+        first_outputs = first[2:5] + first[7:]
+        second_outputs = second[2:5] + second[7:]
+        if first_outputs != second_outputs:
+            mismatches += 1
+            if example is None:
+                example = (first[0], first[1], first_engine, first_outputs, second_engine, second_outputs)
+    return mismatches, example
+
+
+def parse_arguments():
+    """Обработка аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Перебор параметров процедур поправок с анализом производительности')
+    parser.add_argument('target', choices=list(SWEEP_TARGETS),
+                        help='temperature - sp_calc_temperature_deviation, wind - sp_calc_wind_speed_deviation')
+
+    # Параметры базы данных
+    db_group = parser.add_argument_group('Параметры базы данных')
+    db_group.add_argument('--dbname', help='Имя базы данных')
+    db_group.add_argument('--user', help='Имя пользователя')
+    db_group.add_argument('--password', help='Пароль')
+    db_group.add_argument('--host', help='Хост', default='localhost')
+    db_group.add_argument('--port', help='Порт', default='5432')
+
+    # Параметры перебора
+    sweep_group = parser.add_argument_group('Параметры перебора')
+    sweep_group.add_argument('--grid', type=parse_grid,
+                             help='Значения параметра процедуры: начало:конец:шаг или список через запятую '
+                                  '(по умолчанию: ' + ', '.join(f'{target} - {spec["grid"]}'
+                                                                for target, spec in SWEEP_TARGETS.items()) + ')')
+    sweep_group.add_argument('--types', type=parse_types,
+                             help='Типы устройств через запятую (по умолчанию: все из calc_height_correction)')
+    sweep_group.add_argument('--engine', nargs='+', choices=SWEEP_ENGINES, default=SWEEP_ENGINES,
+                             help='Способы расчета; при двух способах результаты сверяются '
+                                  f'(по умолчанию: {" ".join(SWEEP_ENGINES)})')
+    sweep_group.add_argument('--batch-size', type=int, default=DEFAULT_SWEEP["batch_size"],
+                             help=f'Вызовов процедуры за один запрос (по умолчанию: {DEFAULT_SWEEP["batch_size"]})')
+    sweep_group.add_argument('--chunk-size', type=int, default=DEFAULT_SWEEP["chunk_size"],
+                             help=f'Строк в порции записи результатов (по умолчанию: {DEFAULT_SWEEP["chunk_size"]})')
+    sweep_group.add_argument('--no-cache', action='store_true',
+                             help='Рассчитывать каждый вызов, в том числе повторяющиеся входные данные')
+    sweep_group.add_argument('--keep-previous', action='store_true', help='Сохранять предыдущие результаты перебора')
+
+    # Параметры визуализации
+    vis_group = parser.add_argument_group('Параметры визуализации')
+    vis_group.add_argument('--output-dir', default=DEFAULT_SWEEP["output_dir"],
+                           help='Директория для сохранения результатов')
+    vis_group.add_argument('--dpi', type=int, default=DEFAULT_SWEEP["dpi"], help='DPI для сохранения графиков')
+    vis_group.add_argument('--skip-charts', action='store_true', help='Не строить графики')
+
+    return parser.parse_args()
+
+
+def main():
+    """Перебор параметров процедуры, запись результатов и анализ производительности"""
+    args = parse_arguments()
+
+    db_config = DB_CONFIG.copy()
+    if args.dbname: db_config["dbname"] = args.dbname
+    if args.user: db_config["user"] = args.user
+    if args.password: db_config["password"] = args.password
+    if args.host: db_config["host"] = args.host
+    if args.port: db_config["port"] = args.port
+
+    spec = SWEEP_TARGETS[args.target]
+    grid = args.grid or parse_grid(spec["grid"])
+    engines = list(dict.fromkeys(args.engine))
+
+    conn = None
+    try:
+        conn = psycopg2.connect(**db_config)
+        cursor = conn.cursor()
+        cursor.execute("CALL snaart.prepare_sweep_tables(%s);", (not args.keep_previous,))
+        type_ids = args.types
+        if not type_ids:
+            cursor.execute("SELECT DISTINCT measurment_type_id FROM snaart.calc_height_correction ORDER BY 1;")
+            type_ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+
+        print_header(f"ПЕРЕБОР ПАРАМЕТРОВ {spec['procedure'].upper()}")
+        values = [value for _ in type_ids for value in grid]
+        input_types = [type_id for type_id in type_ids for _ in grid]
+        print(f"{spec['parameter']}: от {min(grid)} до {max(grid)}, значений: {len(grid)}")
+        print(f"Типы устройств: {', '.join(map(str, type_ids))}")
+        print(f"Вызовов: {len(values)}, способы расчета: {', '.join(engines)}, "
+              f"кеш повторяющихся входных данных: {'нет' if args.no_cache else 'да'}")
+
+        cache = None
+        if "python" in engines:
+            load_start = time.perf_counter()
+            # Повторяющиеся входные данные объединяет run_sweep, собственный кеш CorrectionCache не нужен
+            cache = CorrectionCache.load(conn, memoize=False)
+            print(f"✓ Таблицы поправок загружены в память за {(time.perf_counter() - load_start) * 1000:.1f} мс")
+
+        results = {}
+        total_times = {}
+        for engine in engines:
+            print_header(f"РАСЧЕТ: {engine}")
+            rows, histogram, cache_hits, total_time_ms = run_sweep(
+                conn, cache, args.target, engine, values, input_types, max(args.batch_size, 1), not args.no_cache)
+            results[engine] = rows
+            total_times[engine] = total_time_ms
+            print(f"✓ Выполнено {len(rows)} вызовов за {total_time_ms:.2f} мс "
+                  f"({len(rows) / total_time_ms * 1000:.0f} вызовов/с), из кеша: {cache_hits}")
+
+            cursor.execute("SELECT nextval(pg_get_serial_sequence('snaart.sweep_performance', 'id'));")
+            sweep_id = cursor.fetchone()[0]
+            written, size, elapsed = write_sweep_results(conn, sweep_id, rows, max(args.chunk_size, 1))
+            print(f"✓ Записано {written} строк в sweep_results ({size / 1024 / 1024:.2f} МБ) за {elapsed * 1000:.2f} мс")
+
+            save_sweep_performance(cursor, sweep_id, total_time_ms, {
+                "target": args.target,
+                "procedure": spec["procedure"],
+                "engine": engine,
+                "grid": {spec["parameter"]: describe_grid(grid), "measurment_type_id": describe_grid(type_ids)},
+                "cache_hits": cache_hits,
+                "batch_size": args.batch_size if engine == "procedure" else None
+            }, histogram)
+            conn.commit()
+
+            metrics, type_stats, range_stats, heatmap_data = fetch_sweep_metrics(conn, sweep_id)
+            conn.commit()
+            display_summary(metrics)
+            if not args.skip_charts:
+                create_performance_charts(metrics, type_stats, range_stats, heatmap_data,
+                                          f"{args.output_dir}/sweep_{args.target}_{engine}", args.dpi, spec["axes"])
+
+        if len(results) > 1:
+            print_header("СРАВНЕНИЕ СПОСОБОВ РАСЧЕТА")
+            for engine, total_time_ms in total_times.items():
+                print(f"- {engine}: {total_time_ms:.2f} мс")
+            fastest = min(total_times, key=total_times.get)
+            slowest = max(total_times, key=total_times.get)
+            print(f"  {fastest} быстрее {slowest} в {total_times[slowest] / total_times[fastest]:.1f} раза")
+
+            mismatches, example = compare_engines(results)
+            if mismatches:
+                type_id, value, first_engine, first_outputs, second_engine, second_outputs = example
+                print(f"✗ Расхождений: {mismatches}, например тип {type_id}, {spec['parameter']} = {value}:")
+                print(f"  {first_engine}: {first_outputs}")
+                print(f"  {second_engine}: {second_outputs}")
+                return 1
+            print(f"✓ Результаты совпадают для всех {len(values)} вызовов")
+    except (psycopg2.Error, ValueError) as e:
+        print(f"✗ Ошибка перебора: {e}")
+        if conn:
+            conn.rollback()
+        return 1
+    finally:
+        if conn:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())